@@ -0,0 +1,70 @@
+"""
+Fetches a few hundred pages from a local fixture server and reports throughput, comparing
+a new httpx.AsyncClient per page (the old scraper behaviour) with the shared fetching client.
+
+    python -m benchmarks.fetch_throughput --pages 300 --latency 0.05 --max-connections 32
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from benchmarks.mock_server import MockServer
+from config_all.config_project import create_c
+from deep_research.utils.http_client import build_http_client, fetch, set_http_client
+
+c = create_c()
+
+PAGE = ("<html><head><title>Fixture</title></head><body>"
+        + "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>" * 200
+        + "</body></html>").encode()
+
+
+def make_handler(latency: float):
+    async def handler(method, path, headers, body):
+        await asyncio.sleep(latency)
+        return 200, {"Content-Type": "text/html"}, PAGE
+    return handler
+
+
+async def fetch_per_request_client(url: str):
+    async with httpx.AsyncClient(timeout=10) as client:
+        response = await client.get(url)
+        response.raise_for_status()
+
+
+async def fetch_shared_client(url: str):
+    response = await fetch("GET", url)
+    response.raise_for_status()
+
+
+async def measure(fetch_one, urls: list[str]) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[fetch_one(url) for url in urls])
+    return time.perf_counter() - start
+
+
+async def main(pages: int, latency: float, max_connections: int):
+    async with MockServer(make_handler(latency)) as server:
+        urls = [f"{server.base_url}/page/{i}" for i in range(pages)]
+        # The fixture is a single host, so lift the per-host cap to measure the pool itself.
+        client = build_http_client(max_connections=max_connections, max_per_host=pages)
+        set_http_client(client)
+
+        for name, fetch_one in (("per-request client", fetch_per_request_client),
+                                ("shared client", fetch_shared_client)):
+            server.connections = 0
+            elapsed = await measure(fetch_one, urls)
+            print(f"{name:>20}: {pages / elapsed:8.1f} pages/s, "
+                  f"{len(PAGE) * pages / elapsed / 1e6:6.1f} MB/s, {server.connections} TCP connections")
+
+        await client.aclose()
+        set_http_client(None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated server latency in seconds.")
+    parser.add_argument("--max-connections", type=int, default=c.fetch_max_connections)
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.latency, args.max_connections))
@@ -0,0 +1,125 @@
+"""
+Measures how many concurrent ApiClient.llm_complete calls one worker sustains against a local
+mock provider, for OpenAI (AsyncOpenAI) and Gemini (genai client.aio), next to the old transport
+of each SDK's sync client wrapped in run_in_executor. The google-genai release pinned in
+requirements.txt still runs client.aio requests on worker threads, so Gemini's two columns stay
+close until that SDK is upgraded.
+
+    python -m benchmarks.llm_concurrency --latency 0.5 --levels 16 64 256
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from google import genai
+from google.genai import types
+from openai import OpenAI, AsyncOpenAI
+from pydantic import BaseModel
+from benchmarks.mock_server import MockServer
+from config_all.config_project import create_c
+from deep_research.api_client import ApiClient
+from deep_research.utils.client_pool import client_registry
+from deep_research.utils.rate_limiter import rate_limiters
+
+c = create_c()
+
+OPENAI_COMPLETION = {
+    "id": "chatcmpl-mock",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "mock",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "{\"ok\": true}"}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}
+
+GEMINI_COMPLETION = {
+    "candidates": [{"index": 0, "finishReason": "STOP",
+                    "content": {"role": "model", "parts": [{"text": "{\"ok\": true}"}]}}],
+    "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 5, "totalTokenCount": 15},
+}
+
+
+class Ack(BaseModel):
+    ok: bool
+
+
+# Structured output, as every research call asks for.
+CONFIG = {"response_mime_type": "application/json", "response_schema": Ack}
+
+
+def make_handler(latency: float):
+    openai_body = json.dumps(OPENAI_COMPLETION).encode()
+    gemini_body = json.dumps(GEMINI_COMPLETION).encode()
+
+    async def handler(method, path, headers, request_body):
+        await asyncio.sleep(latency)
+        body = gemini_body if ":generateContent" in path else openai_body
+        return 200, {"Content-Type": "application/json"}, body
+    return handler
+
+
+def install_clients(base_url: str, limits: httpx.Limits):
+    """Point the shared provider clients used by ApiClient at the mock server."""
+    client_registry.set("openai", c.openai_model, AsyncOpenAI(
+        api_key="mock", base_url=f"{base_url}/v1", http_client=httpx.AsyncClient(limits=limits), max_retries=0))
+    client_registry.set("gemini", c.gemini_model, genai.Client(
+        api_key="mock", http_options=types.HttpOptions(base_url=f"{base_url}/")))
+
+
+async def run_executor(provider: str, base_url: str, n: int, limits: httpx.Limits) -> float:
+    if provider == "openai":
+        client = OpenAI(api_key="mock", base_url=f"{base_url}/v1", http_client=httpx.Client(limits=limits))
+
+        def call(i):
+            return client.chat.completions.create(model=c.openai_model,
+                                                  messages=[{"role": "user", "content": f"ping {i}"}])
+    else:
+        client = genai.Client(api_key="mock", http_options=types.HttpOptions(base_url=f"{base_url}/"))
+
+        def call(i):
+            return client.models.generate_content(model=c.gemini_model, contents=[f"ping {i}"])
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    await asyncio.gather(*[loop.run_in_executor(None, call, i) for i in range(n)])
+    elapsed = time.perf_counter() - start
+    if provider == "openai":
+        client.close()
+    return elapsed
+
+
+async def run_api_client(provider: str, n: int) -> float:
+    api_client = ApiClient(provider)
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        api_client.llm_complete(system_instruction="You answer in JSON.", prompt=f"ping {i}", config=CONFIG)
+        for i in range(n)
+    ])
+    return time.perf_counter() - start
+
+
+async def main(latency: float, levels: list[int], providers: list[str]):
+    # Generous pool limits and no rate limits, so the transport, not the pool or quotas, is what is measured.
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    rate_limiters.limits = {}
+    async with MockServer(make_handler(latency)) as server:
+        install_clients(server.base_url, limits)
+        print(f"Mock provider latency: {latency}s")
+        for provider in providers:
+            print(f"\n{provider}")
+            print(f"{'in flight':>10} {'executor/s':>12} {'ApiClient/s':>12} {'speedup':>9}")
+            for n in levels:
+                t_exec = await run_executor(provider, server.base_url, n, limits)
+                t_api = await run_api_client(provider, n)
+                print(f"{n:>10} {n / t_exec:>12.1f} {n / t_api:>12.1f} {t_exec / t_api:>8.1f}x")
+        await client_registry.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated provider latency in seconds.")
+    parser.add_argument("--levels", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--providers", nargs="+", choices=["openai", "gemini"], default=["openai", "gemini"])
+    args = parser.parse_args()
+    asyncio.run(main(args.latency, args.levels, args.providers))
@@ -0,0 +1,68 @@
+import asyncio
+from typing import Awaitable, Callable, Tuple
+
+# handler(method, path, headers, body) -> (status, headers, body)
+Handler = Callable[[str, str, dict, bytes], Awaitable[Tuple[int, dict, bytes]]]
+
+REASONS = {200: "OK", 304: "Not Modified", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class MockServer:
+    """
+    Minimal HTTP/1.1 keep-alive server on localhost, used by the benchmarks as a stand-in
+    for LLM providers and web pages.
+    """
+
+    def __init__(self, handler: Handler, host: str = "127.0.0.1", port: int = 0):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.server = None
+        self.requests = 0
+        self.connections = 0
+        self._writers = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+                self.requests += 1
+                status, resp_headers, resp_body = await self.handler(method, path, headers, body)
+                out = [f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}",
+                       f"Content-Length: {len(resp_body)}",
+                       "Connection: keep-alive"]
+                out += [f"{k}: {v}" for k, v in resp_headers.items()]
+                writer.write(("\r\n".join(out) + "\r\n\r\n").encode("latin-1") + resp_body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._serve, self.host, self.port, backlog=4096)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        # Drop idle keep-alive connections still held open by clients.
+        for writer in list(self._writers):
+            writer.close()
+        await self.server.wait_closed()
@@ -19,6 +19,175 @@ def llm(c):
     c.gemini_model = "models/gemini-2.0-flash"
     c.openai_model = "o3-mini"
     c.xai_model = "grok-2-1212"
+
+    # Input context windows per model, used for local prompt trimming.
+    # Gemini limits are refreshed from the API once at server startup.
+    c.context_windows = {
+        "models/gemini-2.0-flash": 1048576,
+        "o3-mini": 200000,
+        "grok-2-1212": 131072,
+    }
+    c.default_context_window = 128000
+    # Tokens kept free for the response and for estimation error
+    c.context_window_margin = 10000
+    # Number of fragment token counts kept in memory
+    c.token_memo_max_entries = 50000
+    return c
+
+def http(c):
+    # Keep-alive pool sizes for the shared LLM provider clients
+    c.llm_max_connections = 20
+    c.llm_max_keepalive_connections = 10
+    c.llm_keepalive_expiry = 30.0
+    c.llm_timeout = 600.0
+
+    # Shared client for outbound fetching (pages, search API)
+    c.fetch_max_connections = 32
+    c.fetch_max_keepalive_connections = 32
+    c.fetch_max_connections_per_host = 6
+    c.fetch_keepalive_expiry = 30.0
+    c.fetch_connect_timeout = 5.0
+    c.fetch_read_timeout = 10.0
+    c.fetch_total_timeout = 20.0
+    c.fetch_http2 = True
+    return c
+
+def rate_limits(c):
+    # Token buckets per key. Keys are matched exactly, then by dropping ":"-separated suffixes,
+    # e.g. "llm:gemini:models/gemini-2.0-flash" -> "llm:gemini" -> "llm".
+    # "llm-tokens" buckets are charged with estimated prompt tokens (tokens per minute).
+    c.rate_limits = {
+        "brave": {"per_minute": 60, "burst": 1},
+        "llm:gemini": {"per_minute": 1000, "burst": 20},
+        "llm:openai": {"per_minute": 500, "burst": 10},
+        "llm:xai": {"per_minute": 60, "burst": 5},
+        "llm-tokens:gemini": {"per_minute": 4000000, "burst": 1000000},
+        "llm-tokens:openai": {"per_minute": 200000, "burst": 100000},
+        "llm-tokens:xai": {"per_minute": 100000, "burst": 50000},
+        "domain": {"per_minute": 60, "burst": 4},
+    }
+    return c
+
+def resilience(c):
+    # Retries with exponential backoff and full jitter for transient errors (timeouts, 429, 5xx).
+    c.retry_max_attempts = 4
+    c.retry_base_delay = 0.5
+    c.retry_max_delay = 20.0
+    # Overall deadline per call, covering every attempt and backoff.
+    c.llm_call_deadline = 600.0
+    c.search_call_deadline = 30.0
+    # Consecutive transient failures before a provider's circuit opens, and how long it stays open.
+    c.breaker_failure_threshold = 5
+    c.breaker_reset_timeout = 30.0
+    return c
+
+def research(c):
+    # Page fetches allowed in flight per unit of research concurrency
+    c.fetches_per_query = 4
+    # Per query, pages flow through bounded queues: learnings are synthesised from the first
+    # pipeline_first_pages good pages while the rest are still fetched. Pipeline_straggler_deadline
+    # seconds after the first good page, the query goes on with the pages collected so far;
+    # pages arriving later are learned from in the background and added to the run's learnings.
+    c.pipeline_first_pages = 3
+    c.pipeline_straggler_deadline = 12.0
+    c.pipeline_queue_size = 4
+    # Learnings above these token budgets are condensed (map-reduce) instead of being cut off.
+    c.serp_learnings_token_budget = 8000
+    # Room left in the report model's context window for the prompt, earlier sections and instructions.
+    c.report_prompt_reserve_tokens = 30000
+    # Condensing: batch size, output size relative to input per batch, and reduce rounds.
+    c.condense_batch_tokens = 6000
+    c.condense_ratio = 0.3
+    c.condense_max_rounds = 4
+    c.condense_cache_entries = 2000
+    # Near-duplicate learnings: "hashing" or "sentence-transformers:<model>" (optional package),
+    # and the cosine similarity above which two learnings count as paraphrases.
+    c.dedup_embedder = "hashing"
+    c.dedup_hashing_dim = 512
+    c.dedup_similarity_threshold = 0.8
+    return c
+
+def scraping(c):
+    # Pages extracted locally with lower confidence than this go to the LLM extractor
+    c.extract_min_confidence = 0.5
+    c.extract_llm_fallback = True
+
+    # Headless browser pool for the Selenium fallback
+    c.browser_pool_size = 2
+    c.browser_pages_per_instance = 20
+    c.browser_page_timeout = 20.0
+
+    # Follow-up questions use the clarified query's first pages, waiting at most the deadline for them
+    c.follow_up_pages = 3
+    c.follow_up_scrape_deadline = 8.0
+    # Further clarified-query results scraped in the background for the coming research run (0 disables)
+    c.prefetch_results = 10
+    c.prefetch_concurrency = 4
+    c.prefetch_ttl = 30 * 60
+    c.prefetch_max_pages = 200
+    return c
+
+def cache(c):
+    # On-disk LLM response cache; disabled unless a path is set
+    c.llm_cache_path = os.environ.get("LLM_CACHE_PATH")
+    c.llm_cache_ttl = 7 * 24 * 3600
+    c.llm_cache_max_entries = 20000
+    c.llm_cache_max_bytes = 512 * 1024 * 1024
+
+    # On-disk page store for the scraper; disabled unless a path is set
+    c.page_cache_path = os.environ.get("PAGE_CACHE_PATH")
+    # Seconds a stored page is served without revalidation, per domain (subdomains included)
+    c.page_cache_freshness = {
+        "default": 24 * 3600,
+        "wikipedia.org": 7 * 24 * 3600,
+        "arxiv.org": 30 * 24 * 3600,
+        "reuters.com": 15 * 60,
+        "bbc.com": 15 * 60,
+        "news.ycombinator.com": 5 * 60,
+    }
+    c.page_cache_max_age = 30 * 24 * 3600
+
+    # Research checkpoints (one row per completed tree node), used to resume interrupted runs
+    c.checkpoint_path = os.environ.get("CHECKPOINT_PATH", "research_checkpoints.db")
+    # Completed runs are deleted checkpoint_retention seconds after they finished; failed and
+    # interrupted runs stay resumable for checkpoint_resumable_retention seconds after their last update
+    c.checkpoint_retention = 7 * 24 * 3600
+    c.checkpoint_resumable_retention = 30 * 24 * 3600
+    return c
+
+def jobs(c):
+    # Background research jobs: "memory" keeps the queue in this process, "redis" shares
+    # the queue, job records and events between API workers (needs the redis package)
+    c.job_backend = os.environ.get("JOB_BACKEND", "memory")
+    c.job_redis_url = os.environ.get("JOB_REDIS_URL", "redis://localhost:6379/0")
+    # Jobs run concurrently per API worker; submits beyond the queue limit are rejected
+    c.job_workers = 2
+    c.job_max_queued = 100
+    # Seconds finished jobs and their events are kept for polling and reattaching
+    c.job_retention = 24 * 3600
+
+    # Progress events kept per run for subscribers resuming with Last-Event-ID
+    c.progress_replay_events = 1000
+    # Seconds a finished run's events stay available to late subscribers
+    c.progress_bus_linger = 300
+    # Idle seconds before an SSE stream sends a keep-alive comment
+    c.sse_heartbeat_seconds = 15.0
+    return c
+
+def budget(c):
+    # USD per million input and output tokens, and per search call, for cost budgets
+    c.llm_prices = {
+        "models/gemini-2.0-flash": (0.10, 0.40),
+        "o3-mini": (1.10, 4.40),
+        "grok-2-1212": (2.00, 10.00),
+    }
+    c.search_price = 0.005
+    # Runs with a budget stop expanding branches whose share of new learnings and URLs is below
+    # planner_min_novelty, and research up to planner_max_extra_depth levels deeper than asked
+    # below branches at or above planner_deepen_novelty while the budget allows it
+    c.planner_min_novelty = 0.2
+    c.planner_deepen_novelty = 0.8
+    c.planner_max_extra_depth = 1
     return c
 
 def db(c):
@@ -31,6 +200,14 @@ def make_c():
     functions = [
         api_keys,
         llm,
+        http,
+        rate_limits,
+        resilience,
+        research,
+        scraping,
+        cache,
+        jobs,
+        budget,
         db,
     ]
     for f in functions:
@@ -1,123 +1,257 @@
-import asyncio
-from openai import OpenAI
-from google import genai
-import google.generativeai as genai_old
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Tuple
 from google.genai import types
-import tiktoken
 from config_all.config_project import create_c
-import httpx
-from .utils.rate_limiter import global_rate_limiter
+from .utils.budget import charge_llm, charge_search
+from .utils.rate_limiter import error_status, rate_limiters, retry_after_seconds
+from .utils.client_pool import client_registry, model_name
+from .utils.llm_cache import llm_cache, make_key
+from .utils.http_client import fetch
+from .utils.resilience import RetryPolicy, resilience
+from .utils.scheduler import scheduled
+from .utils.tokens import context_window, estimate_tokens, get_encoder, token_budget, trim_to_tokens
 
 c = create_c()
 
 class ApiClient:
     def __init__(self, api_provider=c.llm_provider):
         self.api_provider = api_provider
-        self.openai_client = None
-        self.gemini_client = None
-        self.xai_client = None
 
-    async def check_and_trim_prompt(self, system_instruction: str, prompt: str, provider: str) -> str:
+    async def check_and_trim_prompt(self, system_instruction: str, prompt: str, provider: str, prompt_tokens: int = None) -> str:
+        """
+        Trim prompt so that it fits the model's context window together with the system instruction.
+        prompt_tokens may be passed by callers that assembled the prompt from already-counted fragments,
+        in which case the prompt is only tokenized when it actually needs trimming.
+        """
+        sys_count = token_budget.count(system_instruction, provider)
         if provider == "openai":
-            context_window = 190000
-            enc = tiktoken.encoding_for_model("o3-mini")
-            sys_tokens = enc.encode(system_instruction)
-            prompt_tokens = enc.encode(prompt)
-            total = len(sys_tokens) + len(prompt_tokens)
-            if total <= context_window:
+            allowed_prompt = context_window(c.openai_model) - sys_count
+            # A token always covers at least one byte, so short prompts never need encoding.
+            if prompt_tokens is not None and prompt_tokens <= allowed_prompt:
                 return prompt
-            allowed_prompt = context_window - len(sys_tokens)
-            trimmed_tokens = prompt_tokens[:allowed_prompt]
-            return enc.decode(trimmed_tokens)
-        elif provider == "gemini":
-            dummy_client = genai_old.configure(api_key=c.GEMINI_API_KEY)
-            model_info = genai_old.get_model(name=c.gemini_model, client=dummy_client)
-            context_window = model_info.input_token_limit
-            dummy_model = genai_old.GenerativeModel(c.gemini_model)
-            sys_count = int(str(dummy_model.count_tokens(system_instruction)).split(': ')[-1])
-            prompt_count = int(str(dummy_model.count_tokens(prompt)).split(': ')[-1])
-            total = sys_count + prompt_count
-            if total <= context_window:
+            if len(prompt.encode("utf-8", "surrogatepass")) <= allowed_prompt:
                 return prompt
-            allowed_prompt_tokens = context_window - sys_count
-            words = prompt.split()
-            trimmed = " ".join(words[:allowed_prompt_tokens])
-            return trimmed
-        elif provider == "xai":
-            context_window = 130000
-            sys_count = len(system_instruction.split())
-            prompt_count = len(prompt.split())
-            total = sys_count + prompt_count
-            if total <= context_window:
+            enc = get_encoder(c.openai_model)
+            encoded = enc.encode(prompt, disallowed_special=())
+            if len(encoded) <= allowed_prompt:
+                return prompt
+            print(f"Warning: prompt of {len(encoded)} tokens cut to {allowed_prompt} tokens to fit {c.openai_model}")
+            return enc.decode(encoded[:allowed_prompt])
+        elif provider in ("gemini", "xai"):
+            # Estimated locally: no tokenizer round-trips before each completion.
+            model = c.gemini_model if provider == "gemini" else c.xai_model
+            allowed_prompt = context_window(model) - sys_count
+            if prompt_tokens is not None and prompt_tokens <= allowed_prompt:
                 return prompt
-            allowed_prompt_tokens = context_window - sys_count
-            trimmed = " ".join(prompt.split()[:allowed_prompt_tokens])
+            trimmed = trim_to_tokens(prompt, allowed_prompt)
+            if len(trimmed) < len(prompt):
+                print(f"Warning: prompt cut from {len(prompt)} to {len(trimmed)} characters to fit {model}")
             return trimmed
         else:
             return prompt
 
-    async def llm_complete(self, *, system_instruction: str = "", prompt: str = "", config: dict = None, messages=None, response_format={"type": "json_object"}):
-        loop = asyncio.get_event_loop()
-        prompt = await self.check_and_trim_prompt(system_instruction, prompt, self.api_provider)
+    def _limiter_keys(self) -> Tuple[str, str]:
+        """Rate limiter keys for request rate and tokens per minute of the current provider/model."""
+        model = model_name(self.api_provider)
+        return f"llm:{self.api_provider}:{model}", f"llm-tokens:{self.api_provider}:{model}"
+
+    def _token_cost(self, system_instruction: str, prompt: str, messages, prompt_tokens: int = None) -> int:
+        if messages is not None:
+            return sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        return (prompt_tokens if prompt_tokens is not None else estimate_tokens(prompt)) \
+            + token_budget.count(system_instruction, self.api_provider)
+
+    def _on_error(self, e: Exception):
+        """Slow the provider's buckets down when it answered 429."""
+        if error_status(e) == 429:
+            retry_after = retry_after_seconds(e)
+            for key in self._limiter_keys():
+                rate_limiters.on_rate_limited(key, retry_after)
+
+    async def llm_complete(self, *, system_instruction: str = "", prompt: str = "", config: dict = None, messages=None, response_format={"type": "json_object"}, prompt_tokens: int = None):
+        schema = config.get("response_schema") if config else None
+        cache_key = None
+        if llm_cache.enabled:
+            cache_key = make_key(self.api_provider, model_name(self.api_provider), system_instruction, prompt, schema, messages)
+            cached = llm_cache.get(cache_key, schema)
+            if cached is not None:
+                return cached
+        request_key, tokens_key = self._limiter_keys()
+        token_cost = self._token_cost(system_instruction, prompt, messages, prompt_tokens)
+
+        @asynccontextmanager
+        async def queue():
+            async with scheduled("llm"):
+                await rate_limiters.acquire(request_key)
+                await rate_limiters.acquire(tokens_key, token_cost)
+                yield
+
+        async def attempt():
+            try:
+                response = await self._complete(system_instruction=system_instruction, prompt=prompt, config=config,
+                                                messages=messages, prompt_tokens=prompt_tokens)
+            except Exception as e:
+                self._on_error(e)
+                raise
+            rate_limiters.on_success(request_key)
+            rate_limiters.on_success(tokens_key)
+            output = getattr(response, "text", None) or getattr(response, "content", None) or ""
+            charge_llm(model_name(self.api_provider), token_cost, estimate_tokens(str(output)))
+            return response
+
+        response = await resilience.call(self.api_provider, attempt, RetryPolicy(deadline=c.llm_call_deadline), queue)
+        if cache_key is not None:
+            llm_cache.put(cache_key, response, schema)
+        return response
+
+    async def _complete(self, *, system_instruction: str, prompt: str, config: dict, messages, prompt_tokens: int):
+        prompt = await self.check_and_trim_prompt(system_instruction, prompt, self.api_provider, prompt_tokens=prompt_tokens)
         if messages is None:
             messages = [{"role": "system", "content": system_instruction},
                         {"role": "user", "content": prompt}]
         if self.api_provider == "openai":
-            self.openai_client = OpenAI(api_key=c.OPENAI_API_KEY)
-            completion = await loop.run_in_executor(
-                None,
-                lambda: self.openai_client.beta.chat.completions.parse(
-                    model=c.openai_model,
-                    messages=messages,
-                    response_format=config["response_schema"] if config and "response_schema" in config else None,
-                )
+            openai_client = client_registry.get("openai", c.openai_model)
+            completion = await openai_client.beta.chat.completions.parse(
+                model=c.openai_model,
+                messages=messages,
+                response_format=config["response_schema"] if config and "response_schema" in config else None,
             )
             return completion.choices[0].message
         elif self.api_provider == "gemini":
-            self.gemini_client = genai.Client(api_key=c.GEMINI_API_KEY)
+            gemini_client = client_registry.get("gemini", c.gemini_model)
             extra_config = config if config else {}
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.gemini_client.models.generate_content(
-                    model=c.gemini_model,
-                    config=types.GenerateContentConfig(system_instruction=system_instruction, **extra_config),
-                    contents=[prompt]
-                )
+            response = await gemini_client.aio.models.generate_content(
+                model=c.gemini_model,
+                config=types.GenerateContentConfig(system_instruction=system_instruction, **extra_config),
+                contents=[prompt]
             )
             return response
         elif self.api_provider == "xai":
-            self.xai_client = OpenAI(api_key=c.OPENAI_API_KEY, base_url="https://api.x.ai/v1")
-            completion = await loop.run_in_executor(
-                None,
-                lambda: self.xai_client.beta.chat.completions.parse(
-                    model=c.xai_model,
-                    messages=messages,
-                    response_format=config["response_schema"] if config and "response_schema" in config else None,
-                )
+            xai_client = client_registry.get("xai", c.xai_model)
+            completion = await xai_client.beta.chat.completions.parse(
+                model=c.xai_model,
+                messages=messages,
+                response_format=config["response_schema"] if config and "response_schema" in config else None,
             )
             return completion.choices[0].message
         else:
             raise ValueError(f"Unknown API provider: {self.api_provider}")
 
+    async def llm_stream(self, *, system_instruction: str = "", prompt: str = "", prompt_tokens: int = None,
+                         usage: dict = None) -> AsyncIterator[str]:
+        """
+        Stream a free-text (markdown) completion as text deltas.
+        Transient failures are retried until the first delta arrives; after that an error ends the stream.
+        Streamed completions are not cached. When a usage dict is passed, it is filled with the
+        provider-reported prompt_tokens, output_tokens and cached_tokens once the stream ends.
+        """
+        request_key, tokens_key = self._limiter_keys()
+        token_cost = self._token_cost(system_instruction, prompt, None, prompt_tokens)
+        prompt = await self.check_and_trim_prompt(system_instruction, prompt, self.api_provider, prompt_tokens=prompt_tokens)
+
+        @asynccontextmanager
+        async def queue():
+            await rate_limiters.acquire(request_key)
+            await rate_limiters.acquire(tokens_key, token_cost)
+            yield
+
+        async def open_stream():
+            deltas = self._stream(system_instruction, prompt, usage)
+            try:
+                first = await anext(deltas, None)
+            except Exception as e:
+                await deltas.aclose()
+                self._on_error(e)
+                raise
+            return first, deltas
+
+        async with scheduled("llm"):
+            first, deltas = await resilience.call(self.api_provider, open_stream,
+                                                  RetryPolicy(deadline=c.llm_call_deadline), queue)
+            rate_limiters.on_success(request_key)
+            rate_limiters.on_success(tokens_key)
+            output = []
+            try:
+                if first is not None:
+                    output.append(first)
+                    yield first
+                async for delta in deltas:
+                    output.append(delta)
+                    yield delta
+            finally:
+                await deltas.aclose()
+                reported = usage or {}
+                charge_llm(model_name(self.api_provider), reported.get("prompt_tokens") or token_cost,
+                           reported.get("output_tokens") or estimate_tokens("".join(output)))
+
+    async def _stream(self, system_instruction: str, prompt: str, usage: dict = None) -> AsyncIterator[str]:
+        if self.api_provider in ("openai", "xai"):
+            model = c.openai_model if self.api_provider == "openai" else c.xai_model
+            client = client_registry.get(self.api_provider, model)
+            extra = {"stream_options": {"include_usage": True}} if self.api_provider == "openai" and usage is not None else {}
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=[{"role": "system", "content": system_instruction},
+                          {"role": "user", "content": prompt}],
+                stream=True,
+                **extra,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if usage is not None and chunk.usage:
+                    details = chunk.usage.prompt_tokens_details
+                    usage.update(prompt_tokens=chunk.usage.prompt_tokens,
+                                 output_tokens=chunk.usage.completion_tokens,
+                                 cached_tokens=(details.cached_tokens or 0) if details else 0)
+        elif self.api_provider == "gemini":
+            gemini_client = client_registry.get("gemini", c.gemini_model)
+            stream = await gemini_client.aio.models.generate_content_stream(
+                model=c.gemini_model,
+                config=types.GenerateContentConfig(system_instruction=system_instruction),
+                contents=[prompt]
+            )
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+                if usage is not None and chunk.usage_metadata:
+                    metadata = chunk.usage_metadata
+                    usage.update(prompt_tokens=metadata.prompt_token_count,
+                                 output_tokens=metadata.candidates_token_count,
+                                 cached_tokens=metadata.cached_content_token_count or 0)
+        else:
+            raise ValueError(f"Unknown API provider: {self.api_provider}")
+
     async def brave_search(self, query: str, offset: int = 0, count: int = 10) -> dict:
         url = "https://api.search.brave.com/res/v1/web/search"
         headers = {
             "Accept": "application/json",
             "X-Subscription-Token": c.BRAVE_API_KEY
         }
-        for current_offset in range(offset, 10):
-            await global_rate_limiter.wait()
-            params = {
-                "q": query,
-                "safesearch": "off",
-                "offset": current_offset,
-                "count": count
-            }
-            try:
-                async with httpx.AsyncClient(timeout=10) as client:
-                    response = await client.get(url, params=params, headers=headers)
-                    response.raise_for_status()
-                    return response.json()  # Expected structure: { "web": { "results": [...] } }
-            except Exception as e:
-                print(f"Error with offset {current_offset} for query '{query}': {e}")
-        raise Exception(f"All offsets failed for query '{query}'")
+        params = {
+            "q": query,
+            "safesearch": "off",
+            "offset": offset,
+            "count": count
+        }
+
+        @asynccontextmanager
+        async def queue():
+            await rate_limiters.acquire("brave")
+            async with scheduled("search"):
+                yield
+
+        async def attempt():
+            response = await fetch("GET", url, params=params, headers=headers)
+            if response.status_code == 429:
+                rate_limiters.on_rate_limited("brave", retry_after_seconds(response))
+            response.raise_for_status()
+            rate_limiters.on_success("brave")
+            charge_search()
+            return response.json()  # Expected structure: { "web": { "results": [...] } }
+
+        try:
+            return await resilience.call("brave", attempt, RetryPolicy(deadline=c.search_call_deadline), queue)
+        except Exception as e:
+            print(f"Brave search failed for query '{query}': {e}")
+            raise
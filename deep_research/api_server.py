@@ -1,16 +1,45 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from deep_research.deep_research import deep_research
-from deep_research.report_writer import write_final_report
+from deep_research.report_writer import collect_final_report
 from deep_research.follow_up import generate_follow_up
+from deep_research.utils.client_pool import client_registry
+from deep_research.utils.tokens import load_context_windows, token_budget
+from deep_research.utils.llm_cache import llm_cache
+from deep_research.utils.page_cache import page_cache
+from deep_research.utils.http_client import close_http_client
+from deep_research.utils.browser_pool import close_browser_pool, get_browser_pool
+from deep_research.page_scraper import extraction_stats, page_prefetcher
+from deep_research.utils.rate_limiter import rate_limiters
+from deep_research.utils.resilience import resilience
+from deep_research.condenser import learning_condenser
+from deep_research.utils.checkpoint import RunInProgress, checkpoint_store, new_run_id
+from deep_research.jobs import JobQueueFull, job_manager, run_research
+from deep_research.utils.progress_bus import ProgressBus, format_sse, progress_buses
+from deep_research.utils.budget import ResearchBudget
+from contextlib import asynccontextmanager
 import logging
+from typing import Optional
 import traceback
 import asyncio
-import json
 from fastapi.responses import StreamingResponse
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await load_context_windows()
+    job_manager.start()
+    yield
+    await job_manager.close()
+    # Close the pooled provider clients so keep-alive connections are released cleanly.
+    await client_registry.close()
+    await close_http_client()
+    close_browser_pool()
+    llm_cache.close()
+    page_cache.close()
+    checkpoint_store.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,44 +49,176 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---------------------------
+# /api/metrics
+# ---------------------------
+@app.get("/api/metrics")
+async def metrics():
+    """
+    Exposes internal counters, such as LLM client pool sizes and connection reuse.
+    """
+    return {
+        "llm_clients": client_registry.get_stats(),
+        "token_memo": token_budget.get_stats(),
+        "llm_cache": llm_cache.get_stats(),
+        "page_cache": page_cache.get_stats(),
+        "extraction": extraction_stats.get_stats(),
+        "prefetch": page_prefetcher.get_stats(),
+        "browser_pool": get_browser_pool().get_stats(),
+        "rate_limits": rate_limiters.get_stats(),
+        "resilience": resilience.get_stats(),
+        "condenser": learning_condenser.get_stats(),
+        "jobs": job_manager.get_stats(),
+        "progress_buses": progress_buses.get_stats(),
+    }
+
+
 # ---------------------------
 # /api/research
 # ---------------------------
+class ResearchBudgetModel(BaseModel):
+    max_seconds: Optional[float] = None
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None
+    max_searches: Optional[int] = None
+
 class ResearchRequest(BaseModel):
-    query: str
+    query: str = ""
     breadth: int = 2
     depth: int = 1
     concurrency: int = 2
+    # Run ID of an interrupted run to resume; its saved query and parameters are used.
+    run_id: Optional[str] = None
+    # Limits the research tree is pruned, narrowed or deepened to fit; omitted means unlimited.
+    budget: Optional[ResearchBudgetModel] = None
+
+    @model_validator(mode="after")
+    def require_query_or_run_id(self):
+        if not self.query.strip() and not self.run_id:
+            raise ValueError("Either query or run_id (to resume a run) is required")
+        return self
 
 class ResearchResponse(BaseModel):
+    run_id: str
     learnings: list[str]
     visited_urls: list[str]
     final_report: str
+    report_accounting: dict = {}
+    # Budget usage, branch novelty and the branches pruned, narrowed or deepened, for budgeted runs.
+    planner: dict = {}
+
+def ensure_not_running(run_id: Optional[str]):
+    """409 when asked to resume a run that is still running, rather than running it twice."""
+    if run_id and (checkpoint_store.is_active(run_id) or progress_buses.is_open(run_id)):
+        raise HTTPException(status_code=409, detail=f"Research run {run_id} is still running; "
+                                                    f"attach to GET /api/runs/{run_id}/events instead")
 
 @app.post("/api/research", response_model=ResearchResponse)
 async def perform_research(req: ResearchRequest):
+    ensure_not_running(req.run_id)
     try:
         research_results = await deep_research(
             query=req.query,
             breadth=req.breadth,
             depth=req.depth,
             concurrency=req.concurrency,
+            run_id=req.run_id,
+            budget=ResearchBudget(**req.budget.model_dump()) if req.budget else None,
         )
-        final_report = await write_final_report(
-            prompt=req.query,
+        final_report, report_accounting = await collect_final_report(
+            prompt=research_results["query"],
             learnings=research_results.get("learnings", []),
             visited_urls=research_results.get("visited_urls", []),
+            learning_sources=research_results.get("learning_sources", {}),
         )
         return ResearchResponse(
+            run_id=research_results["run_id"],
             learnings=research_results.get("learnings", []),
             visited_urls=research_results.get("visited_urls", []),
             final_report=final_report,
+            report_accounting=report_accounting,
+            planner=research_results.get("planner", {}),
         )
+    except RunInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logging.error("Error in /api/research endpoint: %s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/runs/{run_id}")
+async def get_run(run_id: str):
+    """Status and parameters of a checkpointed research run, e.g. before resuming it."""
+    run = checkpoint_store.get_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Unknown run {run_id}")
+    return run
+
+
+@app.get("/api/runs/{run_id}/events")
+async def run_events(run_id: str, last_event_id: Optional[str] = Header(default=None)):
+    """
+    Attach another subscriber to a running or recently finished run's progress events,
+    or reattach after a dropped connection from after Last-Event-ID.
+    """
+    bus = progress_buses.get(run_id)
+    if bus is None:
+        raise HTTPException(status_code=404, detail=f"No progress events for run {run_id}")
+    return StreamingResponse((format_sse(item) async for item in bus.subscribe(after=last_event_id)),
+                             media_type="text/event-stream")
+
+
+# ---------------------------
+# Background research jobs
+# ---------------------------
+class JobResponse(BaseModel):
+    job_id: str
+    run_id: str
+    status: str
+
+@app.post("/api/jobs", response_model=JobResponse, status_code=202)
+async def submit_job(req: ResearchRequest):
+    """
+    Queues a research run and returns at once. Poll GET /api/jobs/{job_id}, or attach to
+    GET /api/jobs/{job_id}/events for the same events /api/research_stream sends.
+    """
+    ensure_not_running(req.run_id)
+    try:
+        record = await job_manager.submit(req.model_dump())
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return JobResponse(job_id=record.job_id, run_id=record.run_id, status=record.status)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, latest progress and, once completed, the result of a job."""
+    record = await job_manager.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return record.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, last_event_id: Optional[str] = Header(default=None)):
+    """
+    Server-sent events of a job, from its first event or, when reattaching, from after Last-Event-ID.
+    The stream ends with a 'final', 'error' or 'cancelled' event.
+    """
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+
+    async def event_generator():
+        async for event_id, event in job_manager.events(job_id, after=last_event_id):
+            yield format_sse((event_id, event))
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+@app.post("/api/jobs/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    record = await job_manager.cancel(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return JobResponse(job_id=record.job_id, run_id=record.run_id, status=record.status)
+
+
 # ---------------------------
 # /api/follow_up endpoint
 # ---------------------------
@@ -83,61 +244,50 @@ async def follow_up_endpoint(req: follow_upRequest):
 # ---------------------------
 # Streaming endpoints for progress updates
 # ---------------------------
+# Runs started by the streaming endpoints, referenced until they finish.
+running_streams = set()
+
 @app.post("/api/research_stream")
 async def perform_research_stream(req: ResearchRequest):
-    async def event_generator():
-        progress_queue = asyncio.Queue()
+    ensure_not_running(req.run_id)
+    run_id = req.run_id or new_run_id()
+    bus = progress_buses.create(run_id)
+    # Sent first, so a client that loses the stream can reattach to the run's events or resume it.
+    bus.publish("run", {"run_id": run_id})
 
-        def progress_callback(update: dict):
-            progress_queue.put_nowait(update)
-
-        research_task = asyncio.create_task(deep_research(
-            query=req.query,
-            breadth=req.breadth,
-            depth=req.depth,
-            concurrency=req.concurrency,
-            progress_callback=progress_callback
-        ))
-        while not research_task.done():
-            try:
-                update = await asyncio.wait_for(progress_queue.get(), timeout=1)
-                yield f"data: {json.dumps({'type': 'progress', 'data': update})}\n\n"
-            except asyncio.TimeoutError:
-                continue
+    async def research():
         try:
-            research_results = await research_task
-            final_report = await write_final_report(
-                prompt=req.query,
-                learnings=research_results.get("learnings", []),
-                visited_urls=research_results.get("visited_urls", []),
-            )
-            final_response = {
-                "learnings": research_results.get("learnings", []),
-                "visited_urls": research_results.get("visited_urls", []),
-                "final_report": final_report
-            }
-            yield f"data: {json.dumps({'type': 'final', 'data': final_response})}\n\n"
+            bus.publish("final", await run_research(req.model_dump(), run_id, bus))
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'data': str(e)})}\n\n"
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+            logging.error("Error in /api/research_stream endpoint: %s", traceback.format_exc())
+            bus.publish("error", str(e))
+
+    # The run does not depend on this connection: it keeps going, and the bus is closed once
+    # it ends, which also ends every subscriber's stream.
+    research_task = asyncio.create_task(research())
+    running_streams.add(research_task)
+    research_task.add_done_callback(running_streams.discard)
+    bus.close_when_done(research_task)
+    return StreamingResponse((format_sse(item) async for item in bus.subscribe()),
+                             media_type="text/event-stream")
 
 
 @app.post("/api/follow_up_stream")
 async def follow_up_stream(req: follow_upRequest):
-    async def event_generator():
-        # Simulate progress stages for follow-up generation.
-        progress_updates = [
-            {"stage": "clarify", "message": "Generating clarified query..."},
-            {"stage": "search", "message": "Fetching search results..."},
-            {"stage": "scrape", "message": "Retrieving pages..."},
-            {"stage": "questions", "message": "Generating follow-up questions..."}
-        ]
-        for update in progress_updates:
-            yield f"data: {json.dumps({'type': 'progress', 'data': update})}\n\n"
-            await asyncio.sleep(1)
+    bus = ProgressBus(new_run_id())
+
+    async def follow_up():
         try:
-            questions = await generate_follow_up(req.query)
-            yield f"data: {json.dumps({'type': 'final', 'data': {'questions': questions}})}\n\n"
+            questions = await generate_follow_up(req.query, progress_callback=lambda update: bus.publish("progress", update))
+            bus.publish("final", {"questions": questions})
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'data': str(e)})}\n\n"
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+            logging.error("Error in /api/follow_up_stream endpoint: %s", traceback.format_exc())
+            bus.publish("error", str(e))
+
+    # Stages are streamed as generate_follow_up reaches them.
+    follow_up_task = asyncio.create_task(follow_up())
+    running_streams.add(follow_up_task)
+    follow_up_task.add_done_callback(running_streams.discard)
+    bus.close_when_done(follow_up_task)
+    return StreamingResponse((format_sse(item) async for item in bus.subscribe()),
+                             media_type="text/event-stream")
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+from pydantic import BaseModel
+from config_all.config_project import create_c
+from deep_research.utils.prompt import system_prompt
+from deep_research.api_client import ApiClient
+from deep_research.utils.tokens import token_budget
+
+c = create_c()
+
+
+class CondensedLearningModel(BaseModel):
+    learning: str
+    sources: list[str]
+
+
+@dataclass(frozen=True)
+class SourcedLearning:
+    text: str
+    sources: Tuple[str, ...] = ()
+
+    def render(self) -> str:
+        if not self.sources:
+            return self.text
+        return f"{self.text}\nSources: {', '.join(self.sources)}"
+
+
+def with_sources(learnings: Sequence[str], learning_sources: Optional[Dict[str, List[str]]] = None) -> List[SourcedLearning]:
+    learning_sources = learning_sources or {}
+    return [SourcedLearning(text, tuple(learning_sources.get(text, ()))) for text in learnings]
+
+
+class LearningCondenser:
+    """
+    Hierarchical map-reduce over learnings: pack them into batches, condense the batches
+    in parallel and repeat on the results until they fit the token budget.
+
+    Batches are packed greedily in input order and condensed to a size that depends only
+    on their content, so a deeper research level whose learnings extend its parent's
+    reuses the parent's batch summaries from the cache. Identical batches condensed
+    concurrently by sibling branches share one LLM call.
+    """
+
+    def __init__(self, batch_tokens: int = c.condense_batch_tokens, ratio: float = c.condense_ratio,
+                 max_rounds: int = c.condense_max_rounds, max_cached: int = c.condense_cache_entries):
+        self.batch_tokens = batch_tokens
+        self.ratio = ratio
+        self.max_rounds = max_rounds
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self.stats = {"condensed": 0, "rounds": 0, "batches": 0, "cache_hits": 0, "dropped": 0}
+
+    def _tokens(self, items: Sequence[SourcedLearning]) -> int:
+        return token_budget.count_many(item.render() for item in items) + len(items)
+
+    def _batches(self, items: Sequence[SourcedLearning]) -> List[List[SourcedLearning]]:
+        batches, batch, batch_tokens = [], [], 0
+        for item in items:
+            tokens = token_budget.count(item.render()) + 1
+            if batch and batch_tokens + tokens > self.batch_tokens:
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(item)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _condense_batch(self, batch: List[SourcedLearning]) -> List[SourcedLearning]:
+        key = hashlib.blake2b("\x00".join(item.render() for item in batch).encode("utf-8", "surrogatepass"),
+                              digest_size=16).digest()
+        future = self._cache.get(key)
+        if future is not None:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._cache[key] = future
+        self.stats["batches"] += 1
+        try:
+            result = await self._summarise(batch)
+        except asyncio.CancelledError:
+            self._cache.pop(key, None)
+            future.cancel()
+            raise
+        except Exception as e:
+            # Leave the batch as it was; a later call may condense it.
+            print(f"Error condensing {len(batch)} learnings: {e}")
+            self._cache.pop(key, None)
+            future.set_result(batch)
+            return batch
+        future.set_result(result)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return result
+
+    async def _summarise(self, batch: List[SourcedLearning]) -> List[SourcedLearning]:
+        target_tokens = max(64, int(self._tokens(batch) * self.ratio))
+        known_sources = list(dict.fromkeys(source for item in batch for source in item.sources))
+        learnings_str = "\n".join(f"<learning>\n{item.render()}\n</learning>" for item in batch)
+        prompt_str = (
+            f"Condense the following research learnings into fewer, denser learnings of at most about {target_tokens} tokens in total. "
+            "Merge learnings that overlap, and keep every specific entity, number, date and metric. "
+            "For each condensed learning, list in 'sources' the source URLs of the learnings it was built from, "
+            "using only URLs given below. "
+            f"Return a JSON array of objects with the fields 'learning' and 'sources'.\n\n<learnings>\n{learnings_str}\n</learnings>"
+        )
+        response = await ApiClient().llm_complete(
+            system_instruction=system_prompt(with_time=False),
+            prompt=prompt_str,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": list[CondensedLearningModel],
+            }
+        )
+        condensed = []
+        for item in response.parsed:
+            sources = [source for source in item.sources if source in known_sources]
+            # Fall back to the whole batch's sources rather than losing provenance.
+            condensed.append(SourcedLearning(item.learning, tuple(sources or known_sources)))
+        if not condensed:
+            raise ValueError("empty condensation")
+        return condensed
+
+    async def condense(self, learnings: Sequence[SourcedLearning], budget: int) -> List[SourcedLearning]:
+        """Condense learnings until they fit budget tokens; learnings that already fit are returned unchanged."""
+        items = list(learnings)
+        total = self._tokens(items)
+        if total <= budget:
+            return items
+        self.stats["condensed"] += 1
+        original = total
+        for _ in range(self.max_rounds):
+            self.stats["rounds"] += 1
+            results = await asyncio.gather(*[self._condense_batch(batch) for batch in self._batches(items)])
+            condensed = [item for result in results for item in result]
+            condensed_tokens = self._tokens(condensed)
+            if condensed_tokens >= total:
+                break  # no progress
+            items, total = condensed, condensed_tokens
+            if total <= budget:
+                print(f"Condensed learnings from {original} to {total} tokens (budget {budget})")
+                return items
+
+        # Still over budget: keep the leading learnings that fit, and say what was dropped.
+        kept, used = [], 0
+        for item in items:
+            tokens = token_budget.count(item.render()) + 1
+            if used + tokens > budget:
+                break
+            kept.append(item)
+            used += tokens
+        self.stats["dropped"] += len(items) - len(kept)
+        print(f"Warning: learnings still exceed {budget} tokens after condensing; dropped {len(items) - len(kept)} of {len(items)}")
+        return kept
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "cached": len(self._cache)}
+
+
+learning_condenser = LearningCondenser()
@@ -1,11 +1,25 @@
 from typing import List, Dict, TypedDict, Optional, Callable
 import asyncio
+import time
+from dataclasses import asdict
 from deep_research.serp_generator import generate_serp_queries, SerpQuery
-from deep_research.serp_processor import process_serp_result
-from deep_research.page_scraper import scrape_and_extract
+from deep_research.query_pipeline import current_late_harvests, harvest_learnings, settle_late_harvests
 from pydantic import BaseModel
 from deep_research.api_client import ApiClient
-from deep_research.utils.progress_tracker import ProgressTracker
+from deep_research.utils.progress_tracker import ProgressTracker, current_tracker, track_step
+from deep_research.utils.scheduler import Branch, ResearchScheduler, current_branch, current_scheduler
+from deep_research.utils.url_registry import UrlRegistry, current_url_registry
+from deep_research.utils.dedup import dedupe_learnings
+from deep_research.utils.research_store import BranchView, ResearchStore, current_research_store
+from deep_research.utils.checkpoint import checkpoint_store, current_checkpoint, new_run_id
+from deep_research.utils.progress_bus import ProgressBus, current_progress_bus, publish_progress
+from deep_research.utils.budget import BudgetPlanner, ResearchBudget, current_planner
+from config_all.config_project import create_c
+
+c = create_c()
+
+# Checkpoint node holding what a budgeted run has spent, so a resume continues from it.
+PLANNER_KEY = "planner"
 
 class SearchResponse(TypedDict):
     data: List[Dict[str, str]]
@@ -13,6 +27,8 @@ class SearchResponse(TypedDict):
 class ResearchResult(TypedDict):
     learnings: List[str]
     visited_urls: List[str]
+    # Learning -> URLs of the pages it was learned from.
+    learning_sources: Dict[str, List[str]]
 
 class SerpQueryModel(BaseModel):
     query: str
@@ -22,18 +38,6 @@ class SerpResultResponse(BaseModel):
     learnings: list[str]
     followUpQuestions: list[str]
 
-def estimate_total_tasks(breadth: int, depth: int) -> int:
-    """
-    Roughly estimate the total number of tasks.
-    For each depth level, the number of queries decreases (using max(1, breadth//2)).
-    """
-    total = 0
-    while depth >= 0:
-        total += breadth
-        breadth = max(1, breadth // 2)
-        depth -= 1
-    return total
-
 async def deep_research(
     query: str,
     breadth: int,
@@ -41,79 +45,265 @@ async def deep_research(
     concurrency: int,
     learnings: List[str] = None,
     visited_urls: List[str] = None,
+    learning_sources: Dict[str, List[str]] = None,
     progress_callback: Optional[Callable[[dict], None]] = None,
-    tracker: Optional[ProgressTracker] = None
+    tracker: Optional[ProgressTracker] = None,
+    scheduler: Optional[ResearchScheduler] = None,
+    run_id: Optional[str] = None,
+    event_bus: Optional[ProgressBus] = None,
+    budget: Optional[ResearchBudget] = None
 ) -> Dict[str, List[str]]:
-    learnings = learnings or []
-    visited_urls = visited_urls or []
+    """
+    Research query as a tree of searches. Every completed node is checkpointed under run_id;
+    passing the run_id of an interrupted run resumes it with its original parameters,
+    re-running only the nodes that had not completed. A budget passed on resume applies only
+    when the original run had none.
+    Search, scrape, extract, learn, recurse and progress events are published to event_bus.
+    With a budget, branches are pruned, narrowed or deepened by how much new information they
+    find (see BudgetPlanner); the decisions are returned under "planner".
+    """
+    run_id = run_id or new_run_id()
+    saved_run = checkpoint_store.get_run(run_id)
+    if saved_run is not None:
+        params = saved_run["params"]
+        query, breadth, depth = params["query"], params["breadth"], params["depth"]
+        learnings, visited_urls = params.get("learnings"), params.get("visited_urls")
+        learning_sources = params.get("learning_sources")
+        if params.get("budget"):
+            if budget is not None and budget.limited and asdict(budget) != params["budget"]:
+                print(f"Keeping the budget run {run_id} was started with: {params['budget']}")
+            budget = ResearchBudget(**params["budget"])
+        print(f"Resuming research run {run_id} ({saved_run['nodes']} checkpointed nodes)")
+    checkpoint = checkpoint_store.start_run(run_id, {
+        "query": query, "breadth": breadth, "depth": depth, "concurrency": concurrency,
+        "learnings": learnings, "visited_urls": visited_urls, "learning_sources": learning_sources,
+        "budget": asdict(budget) if budget else None,
+    })
 
+    # One scheduler, URL registry and research store per run: search, fetch and LLM budgets,
+    # scraped URLs and the collected learnings are shared by the whole tree.
+    registry = UrlRegistry()
+    store = ResearchStore()
+    registry_token = current_url_registry.set(registry)
+    store_token = current_research_store.set(store)
+    checkpoint_token = current_checkpoint.set(checkpoint)
+    bus_token = current_progress_bus.set(event_bus or current_progress_bus.get())
+    scheduler_token = current_scheduler.set(
+        scheduler or current_scheduler.get() or ResearchScheduler.for_concurrency(concurrency, c.fetches_per_query)
+    )
     # Initialize progress tracker if needed.
-    if progress_callback and tracker is None:
-        total_tasks = estimate_total_tasks(breadth, depth)
-        tracker = ProgressTracker(total_tasks)
+    if (progress_callback or current_progress_bus.get()) and tracker is None:
+        tracker = ProgressTracker(breadth, depth)
+    tracker_token = current_tracker.set(tracker)
+    planner = BudgetPlanner(budget, depth) if budget and budget.limited else None
+    if planner and PLANNER_KEY in checkpoint.nodes:
+        planner.restore(checkpoint.nodes[PLANNER_KEY])
+        print(f"Budget already used by run {run_id}: {planner.usage}")
+    planner_token = current_planner.set(planner)
+    late_harvests = set()
+    late_token = current_late_harvests.set(late_harvests)
+    try:
+        await _research_level(
+            query=query,
+            breadth=breadth,
+            depth=depth,
+            view=store.root(learnings or [], visited_urls or [], learning_sources),
+            progress_callback=progress_callback,
+            tracker=tracker,
+        )
+        await settle_late_harvests(late_harvests)
+    except BaseException as e:
+        if planner:
+            checkpoint.save_node(PLANNER_KEY, Branch(), planner.snapshot())
+        checkpoint_store.finish_run(run_id, error=repr(e))
+        raise
+    finally:
+        for task in list(late_harvests):
+            task.cancel()
+        registry.cancel_pending()
+        current_late_harvests.reset(late_token)
+        current_url_registry.reset(registry_token)
+        current_research_store.reset(store_token)
+        current_checkpoint.reset(checkpoint_token)
+        current_progress_bus.reset(bus_token)
+        current_tracker.reset(tracker_token)
+        current_planner.reset(planner_token)
+        current_scheduler.reset(scheduler_token)
+
+    result = store.result()
+    # Paraphrased findings from different pages collapse into one learning carrying all their sources.
+    deduped = dedupe_learnings(result["learnings"], result["learning_sources"])
+    if deduped.merged:
+        print(f"Merged {sum(map(len, deduped.merged.values()))} near-duplicate learnings")
+    result["learnings"] = deduped.learnings
+    result["learning_sources"] = deduped.learning_sources
+    result["dedup"] = registry.get_stats()
+    print(f"URL deduplication: {result['dedup']}")
+    if planner:
+        result["planner"] = planner.report()
+        print(f"Budget used: {result['planner']['usage']}, {len(planner.decisions)} branch decisions")
+    checkpoint_store.finish_run(run_id, result=result)
+    result["run_id"] = run_id
+    # The query actually researched: a resumed run uses the one it was started with.
+    result["query"] = query
+    if checkpoint.replayed:
+        print(f"Replayed {checkpoint.replayed} checkpointed nodes of run {run_id}")
+    return result
+
+def _report_progress(tracker: Optional[ProgressTracker], progress_callback: Optional[Callable[[dict], None]],
+                     branch: Branch, replayed: bool = False):
+    if tracker is None:
+        return
+    tracker.node_finished(branch, replayed)
+    progress = tracker.get_progress()
+    if progress_callback:
+        progress_callback(progress)
+    publish_progress("progress", **progress)
+
+async def _research_level(
+    query: str,
+    breadth: int,
+    depth: int,
+    view: BranchView,
+    progress_callback: Optional[Callable[[dict], None]] = None,
+    tracker: Optional[ProgressTracker] = None,
+):
+    """
+    Research one level of the tree below view. Learnings and URLs are appended to the run's
+    store; each query passes its own branch view down instead of copying the lists.
+    """
+    store = current_research_store.get()
+    checkpoint = current_checkpoint.get()
+    planner = current_planner.get()
+    parent_branch = current_branch.get()
+
+    level_key = f"level:{parent_branch.path or 'root'}"
+    saved_level = checkpoint.get_node(level_key)
+    if saved_level is not None:
+        serp_queries = [SerpQuery(**q) for q in saved_level["queries"]]
+    else:
+        start = time.monotonic()
+        try:
+            # Paraphrases from different pages would only repeat themselves in the prompt.
+            learnings = dedupe_learnings(view.learnings()).learnings
+            serp_queries = await generate_serp_queries(query=query, num_queries=breadth, learnings=learnings)
+        except Exception:
+            if tracker:
+                tracker.branch_stopped(breadth, depth)
+            raise
+        track_step("plan", time.monotonic() - start)
+        checkpoint.save_node(level_key, parent_branch, {"query": query, "queries": [asdict(q) for q in serp_queries]})
 
-    serp_queries = await generate_serp_queries(query=query, num_queries=breadth, learnings=learnings)
-    semaphore = asyncio.Semaphore(concurrency)
+    if tracker:
+        tracker.level_planned(breadth, depth, len(serp_queries))
 
-    async def process_query(serp_query: SerpQuery) -> Dict[str, List[str]]:
-        async with semaphore:
-            try:
+    async def process_query(index: int, serp_query: SerpQuery):
+        # Runs in its own task, so the branch is only visible to this query's calls.
+        branch = parent_branch.child(index)
+        current_branch.set(branch)
+        query_key = f"query:{branch.path}"
+        node_done = False
+        new_breadth = max(1, breadth // 2)
+        new_depth = depth - 1
+        replayed = False
+        expanding = False
+        try:
+            saved = checkpoint.get_node(query_key)
+            if saved is not None:
+                new_urls, page_urls = saved["urls"], saved["page_urls"]
+                new_learnings = {"learnings": saved["learnings"], "followUpQuestions": saved["followUpQuestions"]}
+                current_url_registry.get().mark_scraped(new_urls)
+                replayed = True
+            elif planner and planner.skip(branch, serp_query.query):
+                print(f"Budget spent, skipping query: {serp_query.query}")
+                _report_progress(tracker, progress_callback, branch)
+                if tracker and new_depth > 0:
+                    tracker.branch_stopped(new_breadth, new_depth)
+                return
+            else:
                 print(f"Searching for query: {serp_query.query}")
                 api_client = ApiClient()
+                start = time.monotonic()
                 result = await api_client.brave_search(query=serp_query.query, offset=0)
+                track_step("search", time.monotonic() - start)
                 new_urls = [item.get("url") for item in result.get("web", {}).get("results", []) if item.get("url")]
+                publish_progress("search", query=serp_query.query, results=len(new_urls))
 
-                scrape_tasks = [scrape_and_extract(url) for url in new_urls]
-                scraped_results = await asyncio.gather(*scrape_tasks)
-                search_result = {"data": scraped_results}
-                new_breadth = max(1, breadth // 2)
-                new_depth = depth - 1
+                def absorb_late(late_learnings: List[str], late_page_urls: List[str]):
+                    # Pages past the straggler deadline: their learnings join the run after the fact.
+                    store.extend(view, branch, late_learnings, source_urls=late_page_urls)
+                    saved_node = checkpoint.nodes.get(query_key)
+                    if saved_node is not None and "error" not in saved_node:
+                        checkpoint.save_node(query_key, branch, {
+                            **saved_node,
+                            "learnings": saved_node["learnings"] + late_learnings,
+                            "page_urls": saved_node["page_urls"] + late_page_urls,
+                        })
+                    publish_progress("learn", query=serp_query.query, pages=len(late_page_urls),
+                                     learnings=len(late_learnings), follow_up_questions=0, late=True)
 
-                new_learnings = await process_serp_result(
+                # Learning starts from the first pages while the rest are still being scraped.
+                new_learnings, page_urls = await harvest_learnings(
                     query=serp_query.query,
-                    search_result=search_result,
-                    num_follow_up_questions=new_breadth
+                    urls=new_urls,
+                    num_follow_up_questions=new_breadth,
+                    on_late=absorb_late,
                 )
+                checkpoint.save_node(query_key, branch, {
+                    "query": serp_query.query, "urls": new_urls, "page_urls": page_urls, **new_learnings,
+                })
+                publish_progress("learn", query=serp_query.query, pages=len(page_urls),
+                                 learnings=len(new_learnings["learnings"]),
+                                 follow_up_questions=len(new_learnings["followUpQuestions"]))
+            node_done = True
+            branch_view = store.extend(view, branch, new_learnings["learnings"], new_urls, source_urls=page_urls)
+
+            if planner:
+                novelty = planner.observe(branch, new_learnings["learnings"], new_urls, replayed)
+                if not replayed:
+                    checkpoint.save_node(PLANNER_KEY, Branch(), planner.snapshot())
+                planned_breadth, planned_depth = planner.plan_expansion(
+                    branch, serp_query.query, novelty, new_breadth, new_depth)
+                if tracker and (planned_breadth, planned_depth) != (new_breadth, max(new_depth, 0)):
+                    if new_depth > 0:
+                        tracker.branch_stopped(new_breadth, new_depth)
+                    if planned_depth > 0:
+                        tracker.branch_added(planned_breadth, planned_depth)
+                new_breadth, new_depth = planned_breadth, planned_depth
+
+            # Update progress tracker after processing this query.
+            _report_progress(tracker, progress_callback, branch, replayed)
+
+            if new_depth > 0:
+                print(f"Researching deeper, breadth: {new_breadth}, depth: {new_depth}")
+                publish_progress("recurse", query=serp_query.query, breadth=new_breadth, depth=new_depth)
+                expanding = True
+                next_query = f"""
+                Previous research goal: {serp_query.research_goal}
+                Follow-up research directions: {" ".join(new_learnings["followUpQuestions"])}
+                """.strip()
+                await _research_level(
+                    query=next_query,
+                    breadth=new_breadth,
+                    depth=new_depth,
+                    view=branch_view,
+                    progress_callback=progress_callback,
+                    tracker=tracker
+                )
+                return
+            print("Deep research complete")
+
+        except Exception as e:
+            if not node_done:
+                checkpoint.save_node(query_key, branch, {"query": serp_query.query, "error": str(e)})
+            if "Timeout" in str(e):
+                print(f"Timeout error running query: {serp_query.query}: {e}")
+            else:
+                print(f"Error running query: {serp_query.query}: {e}")
+            # Even on error, update the tracker; the levels below this node will not be researched.
+            if not node_done:
+                _report_progress(tracker, progress_callback, branch)
+            if tracker and new_depth > 0 and not expanding:
+                tracker.branch_stopped(new_breadth, new_depth)
 
-                all_learnings = learnings + new_learnings["learnings"]
-                all_urls = visited_urls + new_urls
-
-                # Update progress tracker after processing this query.
-                if tracker and progress_callback:
-                    tracker.update()
-                    progress_callback(tracker.get_progress())
-
-                if new_depth > 0:
-                    print(f"Researching deeper, breadth: {new_breadth}, depth: {new_depth}")
-                    next_query = f"""
-                    Previous research goal: {serp_query.research_goal}
-                    Follow-up research directions: {" ".join(new_learnings["followUpQuestions"])}
-                    """.strip()
-                    return await deep_research(
-                        query=next_query,
-                        breadth=new_breadth,
-                        depth=new_depth,
-                        concurrency=concurrency,
-                        learnings=all_learnings,
-                        visited_urls=all_urls,
-                        progress_callback=progress_callback,
-                        tracker=tracker
-                    )
-                print("Deep research complete")
-                return {"learnings": all_learnings, "visited_urls": all_urls}
-
-            except Exception as e:
-                if "Timeout" in str(e):
-                    print(f"Timeout error running query: {serp_query.query}: {e}")
-                else:
-                    print(f"Error running query: {serp_query.query}: {e}")
-                # Even on error, update the tracker.
-                if tracker and progress_callback:
-                    tracker.update()
-                    progress_callback(tracker.get_progress())
-                return {"learnings": [], "visited_urls": []}
-
-    results = await asyncio.gather(*[process_query(q) for q in serp_queries])
-    all_learnings = list(set(learning for result in results for learning in result["learnings"]))
-    all_urls = list(set(url for result in results for url in result["visited_urls"]))
-    return {"learnings": all_learnings, "visited_urls": all_urls}
+    await asyncio.gather(*[process_query(i, q) for i, q in enumerate(serp_queries)])
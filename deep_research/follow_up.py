@@ -2,7 +2,10 @@ import asyncio
 from pydantic import BaseModel
 from .utils.prompt import system_prompt
 from .api_client import ApiClient
-from .page_scraper import scrape_and_extract
+from .page_scraper import page_prefetcher
+from config_all.config_project import create_c
+
+c = create_c()
 
 # New model for clarified SERP query
 class ClarifyResponse(BaseModel):
@@ -43,14 +46,23 @@ async def generate_follow_up(query: str, progress_callback: callable = None) ->
         clarified_query = query  # fallback to original query
 
     if progress_callback:
-        progress_callback({"stage": "search", "message": "Fetching search results..."})
-    search_result = await api_client.brave_search(query=clarified_query, offset=0, count=3)
+        progress_callback({"stage": "search", "message": f"Fetching search results for: {clarified_query}"})
+    search_result = await api_client.brave_search(query=clarified_query, offset=0,
+                                                  count=max(c.follow_up_pages, c.prefetch_results))
     new_urls = [item.get("url") for item in search_result.get("web", {}).get("results", []) if item.get("url")]
 
+    # Every result is scraped in the background, so the research run that follows the user's answers
+    # finds them ready; the questions only wait for the first few, and at most until the deadline.
+    prefetch_urls = new_urls if c.prefetch_results else new_urls[:c.follow_up_pages]
+    page_tasks = page_prefetcher.prefetch(prefetch_urls)[:c.follow_up_pages]
     if progress_callback:
-        progress_callback({"stage": "scrape", "message": "Retrieving pages..."})
-    scrape_tasks = [scrape_and_extract(url) for url in new_urls]
-    scraped_results = await asyncio.gather(*scrape_tasks)
+        progress_callback({"stage": "scrape", "message": f"Retrieving {len(page_tasks)} pages..."})
+    done = set()
+    if page_tasks:
+        done, _ = await asyncio.wait(page_tasks, timeout=c.follow_up_scrape_deadline)
+    scraped_results = [task.result() for task in page_tasks if task in done and task.result()]
+    if len(scraped_results) < len(page_tasks):
+        print(f"Using {len(scraped_results)} of {len(page_tasks)} pages for the follow-up questions")
     scraped_content = "\n".join(result.get("markdown", "") for result in scraped_results if result.get("markdown"))
 
     if progress_callback:
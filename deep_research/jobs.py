@@ -0,0 +1,407 @@
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from config_all.config_project import create_c
+from deep_research.deep_research import deep_research
+from deep_research.report_writer import stream_final_report
+from deep_research.utils.budget import ResearchBudget
+from deep_research.utils.checkpoint import new_run_id
+from deep_research.utils.progress_bus import ProgressBus, progress_buses
+
+c = create_c()
+
+QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED = "queued", "running", "completed", "failed", "cancelled"
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+# Event types that end a job's event stream.
+TERMINAL_EVENTS = ("final", "error", "cancelled")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class JobRecord:
+    job_id: str
+    params: dict
+    # Checkpointed research run; a failed or cancelled job can be resubmitted with it to resume.
+    run_id: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Optional[dict] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class InProcessJobBackend:
+    """Queue, records and events of jobs in this process's memory."""
+
+    shared = False
+
+    def __init__(self, retention: float = c.job_retention):
+        self.retention = retention
+        self._records: Dict[str, JobRecord] = {}
+        self._events: Dict[str, list] = {}
+        self._conditions: Dict[str, asyncio.Condition] = {}
+        self._queue = asyncio.Queue()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, record in self._records.items()
+                       if record.finished_at is not None and record.finished_at < cutoff]:
+            del self._records[job_id], self._events[job_id], self._conditions[job_id]
+
+    async def save(self, record: JobRecord):
+        if record.job_id not in self._records:
+            self._prune()
+            self._events[record.job_id] = []
+            self._conditions[record.job_id] = asyncio.Condition()
+        self._records[record.job_id] = record
+
+    async def load(self, job_id: str) -> Optional[JobRecord]:
+        return self._records.get(job_id)
+
+    async def push(self, job_id: str):
+        self._queue.put_nowait(job_id)
+
+    async def pop(self) -> Optional[str]:
+        return await self._queue.get()
+
+    async def queued(self) -> int:
+        return self._queue.qsize()
+
+    async def append_event(self, job_id: str, event: dict):
+        condition = self._conditions[job_id]
+        async with condition:
+            self._events[job_id].append(event)
+            condition.notify_all()
+
+    async def read_events(self, job_id: str, after: Optional[str] = None) -> AsyncIterator[Tuple[str, dict]]:
+        # Event IDs are 1-based positions in the job's event list.
+        index = int(after) if after and after.isdigit() else 0
+        events, condition = self._events.get(job_id), self._conditions.get(job_id)
+        if events is None:
+            return
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: len(events) > index)
+            while index < len(events):
+                event = events[index]
+                index += 1
+                yield str(index), event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+
+    async def publish_cancel(self, job_id: str):
+        # Every job of this backend runs in this process, so there is nobody else to tell.
+        pass
+
+    async def close(self):
+        pass
+
+
+class RedisJobBackend:
+    """
+    Queue, records and events of jobs in Redis, shared by every API worker: any worker may run
+    a submitted job, and clients can poll, attach to or cancel it through any other worker.
+    Events are a Redis stream per job, so attached clients block on XREAD instead of polling.
+    Takes any client with the redis.asyncio interface, e.g. a local stub in development.
+    """
+
+    shared = True
+
+    def __init__(self, client=None, url: str = c.job_redis_url, prefix: str = "deep_research:jobs",
+                 retention: float = c.job_retention):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url, decode_responses=True)
+        self.redis = client
+        self.prefix = prefix
+        self.retention = int(retention)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    async def save(self, record: JobRecord):
+        # Every key has a TTL, refreshed on each update, so jobs of a crashed worker expire too.
+        await self.redis.set(self._key("record", record.job_id), json.dumps(record.to_dict()), ex=self.retention)
+
+    async def load(self, job_id: str) -> Optional[JobRecord]:
+        raw = await self.redis.get(self._key("record", job_id))
+        return JobRecord(**json.loads(raw)) if raw else None
+
+    async def push(self, job_id: str):
+        await self.redis.lpush(self._key("queue"), job_id)
+
+    async def pop(self) -> Optional[str]:
+        item = await self.redis.brpop([self._key("queue")], timeout=5)
+        return item[1] if item else None
+
+    async def queued(self) -> int:
+        return await self.redis.llen(self._key("queue"))
+
+    async def append_event(self, job_id: str, event: dict):
+        key = self._key("events", job_id)
+        await self.redis.xadd(key, {"event": json.dumps(event)})
+        await self.redis.expire(key, self.retention)
+        await self.redis.expire(self._key("record", job_id), self.retention)
+
+    async def read_events(self, job_id: str, after: Optional[str] = None) -> AsyncIterator[Tuple[str, dict]]:
+        key, last_id = self._key("events", job_id), after or "0"
+        while True:
+            response = await self.redis.xread({key: last_id}, block=5000)
+            if not response:
+                if await self.load(job_id) is None:
+                    return  # expired
+                continue
+            for _, entries in response:
+                for event_id, fields in entries:
+                    last_id = event_id
+                    event = json.loads(fields["event"])
+                    yield event_id, event
+                    if event["type"] in TERMINAL_EVENTS:
+                        return
+
+    async def publish_cancel(self, job_id: str):
+        await self.redis.publish(self._key("cancel"), job_id)
+
+    async def cancellations(self) -> AsyncIterator[str]:
+        """IDs of jobs whose cancellation was requested through any worker."""
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self._key("cancel"))
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+        finally:
+            await pubsub.reset()
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def get_job_backend(name: str = c.job_backend):
+    """"memory", or "redis" when the redis package is installed."""
+    if name == "redis":
+        try:
+            return RedisJobBackend()
+        except ImportError:
+            print("redis is not installed; running background jobs in process")
+    return InProcessJobBackend()
+
+
+async def run_research(params: dict, run_id: str, bus: ProgressBus) -> dict:
+    """
+    The research run and report for a research request, publishing its research events and
+    report deltas to bus. Returns the final response; the caller publishes how it ended.
+    """
+    research_results = await deep_research(
+        query=params["query"],
+        breadth=params["breadth"],
+        depth=params["depth"],
+        concurrency=params["concurrency"],
+        run_id=run_id,
+        event_bus=bus,
+        budget=ResearchBudget(**params["budget"]) if params.get("budget") else None,
+    )
+    # A resumed run may be submitted without its query.
+    prompt = research_results["query"]
+    report_parts = []
+    report_accounting = {}
+    async for event in stream_final_report(
+        prompt=prompt,
+        learnings=research_results.get("learnings", []),
+        visited_urls=research_results.get("visited_urls", []),
+        learning_sources=research_results.get("learning_sources", {}),
+    ):
+        if event["stage"] == "accounting":
+            report_accounting = event["data"]
+            continue
+        report_parts.append(event["delta"])
+        bus.publish("report_delta", event)
+    return {
+        "run_id": run_id,
+        "learnings": research_results.get("learnings", []),
+        "visited_urls": research_results.get("visited_urls", []),
+        "final_report": "".join(report_parts),
+        "report_accounting": report_accounting,
+        "planner": research_results.get("planner", {}),
+    }
+
+
+async def run_research_job(record: JobRecord, emit: Callable[[str, object], None]) -> dict:
+    """A job's research run, forwarding its events to the job's own event stream."""
+    bus = progress_buses.create(record.run_id)
+    bus.add_listener(lambda event: emit(event["type"], event["data"]))
+    try:
+        return await run_research(record.params, record.run_id, bus)
+    finally:
+        bus.close()
+
+
+class JobManager:
+    """
+    Bounded pool of workers running research jobs from the backend's queue. Submitting returns
+    at once with a job ID; the job's record can be polled, its events attached to from any
+    point, and the job cancelled, independently of the request that submitted it.
+    """
+
+    def __init__(self, backend=None, workers: int = c.job_workers, max_queued: int = c.job_max_queued,
+                 runner=run_research_job):
+        self.backend = backend or get_job_backend()
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.runner = runner
+        self._tasks = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancel_requested = set()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+
+    def start(self):
+        """Start the workers; called at server startup, and again harmlessly on submit."""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.backend.shared:
+            self._tasks.append(asyncio.create_task(self._watch_cancellations()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.backend.close()
+
+    async def submit(self, params: dict) -> JobRecord:
+        self.start()
+        if await self.backend.queued() >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise JobQueueFull(f"{self.max_queued} research jobs are already queued")
+        record = JobRecord(job_id=uuid.uuid4().hex[:12], params=params, run_id=params.get("run_id") or new_run_id())
+        await self.backend.save(record)
+        await self.backend.push(record.job_id)
+        self.stats["submitted"] += 1
+        return record
+
+    async def get(self, job_id: str) -> Optional[JobRecord]:
+        return await self.backend.load(job_id)
+
+    def events(self, job_id: str, after: Optional[str] = None) -> AsyncIterator[Tuple[str, dict]]:
+        """(event ID, event) pairs of a job, starting after the event ID after and ending with its last event."""
+        return self.backend.read_events(job_id, after)
+
+    async def cancel(self, job_id: str) -> Optional[JobRecord]:
+        record = await self.backend.load(job_id)
+        if record is None or record.status in FINISHED:
+            return record
+        if record.status == QUEUED:
+            # Workers skip jobs that are no longer queued when they pop them.
+            record.status, record.finished_at = CANCELLED, time.time()
+            await self.backend.save(record)
+            await self.backend.append_event(job_id, {"type": "cancelled", "data": {"run_id": record.run_id}})
+            self.stats["cancelled"] += 1
+        elif not self._cancel_local(job_id):
+            await self.backend.publish_cancel(job_id)
+        return record
+
+    def _cancel_local(self, job_id: str) -> bool:
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        self._cancel_requested.add(job_id)
+        task.cancel()
+        return True
+
+    async def _watch_cancellations(self):
+        while True:
+            try:
+                async for job_id in self.backend.cancellations():
+                    self._cancel_local(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job cancellation listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+    async def _worker(self):
+        while True:
+            try:
+                job_id = await self.backend.pop()
+                record = await self.backend.load(job_id) if job_id else None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error reading the job queue: {e}")
+                await asyncio.sleep(1)
+                continue
+            if record is not None and record.status == QUEUED:
+                await self._run(record)
+
+    async def _pump(self, record: JobRecord, events: asyncio.Queue):
+        """Write a job's events to the backend in order, so a slow backend never blocks the research."""
+        while (event := await events.get()) is not None:
+            try:
+                await self.backend.append_event(record.job_id, event)
+                if event["type"] == "progress":
+                    await self.backend.save(record)
+            except Exception as e:
+                print(f"Error storing an event of job {record.job_id}: {e}")
+
+    async def _run(self, record: JobRecord):
+        record.status, record.started_at = RUNNING, time.time()
+        await self.backend.save(record)
+        events = asyncio.Queue()
+
+        def emit(event_type: str, data):
+            if event_type == "progress":
+                record.progress = data
+            events.put_nowait({"type": event_type, "data": data})
+
+        pump = asyncio.create_task(self._pump(record, events))
+        task = asyncio.create_task(self.runner(record, emit))
+        self._running[record.job_id] = task
+        shutting_down = False
+        try:
+            record.result = await task
+            record.status, terminal = COMPLETED, ("final", record.result)
+        except asyncio.CancelledError:
+            if record.job_id in self._cancel_requested:
+                record.status, terminal = CANCELLED, ("cancelled", {"run_id": record.run_id})
+            else:
+                # The worker itself is being stopped; the run can be resumed from its checkpoints.
+                shutting_down = True
+                task.cancel()
+                record.status, record.error = FAILED, "Interrupted by server shutdown"
+                terminal = ("error", record.error)
+        except Exception as e:
+            print(f"Research job {record.job_id} failed: {e}")
+            record.status, record.error = FAILED, str(e)
+            terminal = ("error", str(e))
+        finally:
+            self._running.pop(record.job_id, None)
+            self._cancel_requested.discard(record.job_id)
+
+        self.stats[record.status] += 1
+        record.finished_at = time.time()
+        # Saved before the terminal event, so a client that sees the stream end polls the final status.
+        await self.backend.save(record)
+        emit(*terminal)
+        events.put_nowait(None)
+        await pump
+        if shutting_down:
+            raise asyncio.CancelledError
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "workers": self.workers, "running": len(self._running),
+                "backend": type(self.backend).__name__}
+
+
+job_manager = JobManager()
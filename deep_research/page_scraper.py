@@ -1,12 +1,24 @@
-import httpx
+import asyncio
+import time
+from collections import OrderedDict
+from typing import List, Optional
 from pydantic import BaseModel
+from config_all.config_project import create_c
 from deep_research.api_client import ApiClient
+from deep_research.utils.html_extract import extract_main_content, strip_noise
+from deep_research.utils.tokens import estimate_tokens
+from deep_research.utils.page_cache import page_cache
+from deep_research.utils.http_client import fetch
+from deep_research.utils.browser_pool import get_browser_pool
+from deep_research.utils.scheduler import scheduled
+from deep_research.utils.rate_limiter import error_status, rate_limiters, retry_after_seconds
+from deep_research.utils.urls import normalize_url, url_domain
+from deep_research.utils.progress_bus import publish_progress
+from deep_research.utils.progress_tracker import track_step
 
-# Import for Selenium fallback
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import os
-from selenium.webdriver.chrome.service import Service
+c = create_c()
+
+EXTRACTOR_SYSTEM_PROMPT = "You are a webpage content extractor that reads the full HTML code of a webpage and returns the article heading and body in markdown format."
 
 headers = {
     "User-Agent": (
@@ -17,58 +29,216 @@ headers = {
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
 }
 
+# Statuses with which a site asks us to back off: the domain's rate limiter cools down and
+# the page is not retried through Selenium, which would hit the same site straight away.
+THROTTLED_STATUSES = (429, 503)
+
 class PageScrapeResponse(BaseModel):
     heading: str
     body: str
 
-async def scrape_and_extract(url: str) -> dict:
-    full_html = ""
+async def fetch_html(url: str) -> str:
+    """
+    Fetch url with httpx, serving it from the page cache while fresh and
+    revalidating stale copies with a conditional GET.
+    """
+    cached = page_cache.get(url)
+    if cached and page_cache.is_fresh(cached):
+        print(f"Served URL from page cache for {url}")
+        return page_cache.serve(cached)
+    request_headers = {**headers, **page_cache.conditional_headers(cached)}
+    limiter_key = f"domain:{url_domain(url)}"
+    await rate_limiters.acquire(limiter_key)
+    response = await fetch("GET", url, headers=request_headers)
+    if response.status_code in THROTTLED_STATUSES:
+        rate_limiters.on_rate_limited(limiter_key, retry_after_seconds(response))
+    else:
+        rate_limiters.on_success(limiter_key)
+    if response.status_code == 304 and cached:
+        print(f"Revalidated URL from page cache for {url}")
+        return page_cache.touch(cached)
+    response.raise_for_status()
+    if "no-store" not in response.headers.get("cache-control", ""):
+        page_cache.put(url, response.text, response.headers.get("etag"), response.headers.get("last-modified"))
+    print(f"Fetched URL with httpx for {url}")
+    return response.text
+
+class ExtractionStats:
+    """Tokens sent to the LLM and wall time per page, for local and LLM extraction."""
+
+    def __init__(self):
+        self.modes = {mode: {"pages": 0, "tokens_sent": 0, "html_tokens": 0, "seconds": 0.0}
+                      for mode in ("local", "llm")}
+
+    def record(self, mode: str, tokens_sent: int, html_tokens: int, seconds: float):
+        stats = self.modes[mode]
+        stats["pages"] += 1
+        stats["tokens_sent"] += tokens_sent
+        stats["html_tokens"] += html_tokens
+        stats["seconds"] += seconds
+
+    def get_stats(self) -> dict:
+        result = {}
+        for mode, stats in self.modes.items():
+            pages = max(1, stats["pages"])
+            result[mode] = {
+                **stats,
+                "avg_tokens_sent": round(stats["tokens_sent"] / pages, 1),
+                "avg_html_tokens": round(stats["html_tokens"] / pages, 1),
+                "avg_seconds": round(stats["seconds"] / pages, 4),
+            }
+        return result
+
+extraction_stats = ExtractionStats()
+
+async def fetch_page(url: str) -> str:
+    """Fetch the page HTML with httpx, falling back to Selenium. Returns "" if both fail."""
+    async with scheduled("fetch"):
+        start = time.perf_counter()
+        full_html = await _fetch_page(url)
+        track_step("fetch", time.perf_counter() - start)
+        publish_progress("scrape", url=url, ok=bool(full_html), seconds=round(time.perf_counter() - start, 3))
+        return full_html
+
+async def _fetch_page(url: str) -> str:
     # Attempt fetching with httpx
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            full_html = response.text
-            print(f"Fetched URL with httpx for {url}")
+        return await fetch_html(url)
     except Exception as e:
+        if error_status(e) in THROTTLED_STATUSES:
+            print(f"{url} answered {error_status(e)}, skipping Selenium fallback while its domain cools down")
+            return ""
         print(f"Error fetching URL with httpx for {url}, attempting Selenium fallback")
-        # Selenium fallback (synchronous, consider running in executor if needed)
+        # Selenium fallback, run on the browser pool's worker threads
         try:
-            options = Options()
-            # Set headless mode and mute logging
-            options.add_argument("--headless")
-            options.add_argument("--disable-gpu")
-            options.add_argument("--log-level=3")  # Added to minimize logging
-            service = Service(log_path=os.devnull)  # Mute ChromeDriver logs
-            driver = webdriver.Chrome(options=options, service=service)
-            driver.get(url)
-            full_html = driver.page_source
+            await rate_limiters.acquire(f"domain:{url_domain(url)}")
+            full_html = await get_browser_pool().fetch(url)
             print(f"Fetched URL with Selenium for {url}")
-            driver.quit()
+            return full_html
         except Exception as e2:
             print(f"Selenium fallback failed for {url}: {e2}")
-            full_html = "<html>Placeholder content: page could not be fetched.</html>"
+            return ""
+
+async def extract_page(url: str, full_html: str) -> dict:
+    """
+    Extract the article as markdown, locally first. The LLM extractor is only used
+    when the local extraction confidence is below c.extract_min_confidence.
+    """
+    if not full_html:
+        return {"markdown": ""}
+    start = time.perf_counter()
+    html_tokens = estimate_tokens(full_html)
+    extracted = extract_main_content(full_html)
+    if extracted.confidence >= c.extract_min_confidence or not c.extract_llm_fallback:
+        extraction_stats.record("local", 0, html_tokens, time.perf_counter() - start)
+        track_step("extract", time.perf_counter() - start)
+        print(f"Extracted {url} locally (confidence {extracted.confidence})")
+        publish_progress("extract", url=url, mode="local", chars=len(extracted.markdown))
+        if not extracted.markdown:
+            return {"markdown": ""}
+        return {"markdown": f"# {extracted.heading}\n\n{extracted.markdown}"}
 
     prompt_str = (
         f"Below is the complete HTML content of a webpage:\n\n"
-        f"<html>\n{full_html}\n</html>\n\n"
+        f"<html>\n{strip_noise(full_html)}\n</html>\n\n"
         "Extract the main article heading and body. Return a JSON object with the fields 'heading' and 'body' in markdown format. "
         "Make sure to output valid JSON."
     )
 
     api_client = ApiClient()
     response_llm = await api_client.llm_complete(
-        system_instruction="You are a webpage content extractor that reads the full HTML code of a webpage and returns the article heading and body in markdown format.",
+        system_instruction=EXTRACTOR_SYSTEM_PROMPT,
         prompt=prompt_str,
         config={
             "response_mime_type": "application/json",
             "response_schema": PageScrapeResponse,
         }
     )
+    extraction_stats.record("llm", estimate_tokens(prompt_str) + estimate_tokens(EXTRACTOR_SYSTEM_PROMPT),
+                            html_tokens, time.perf_counter() - start)
+    track_step("extract", time.perf_counter() - start)
     try:
         parsed = response_llm.parsed
         markdown = f"# {parsed.heading}\n\n{parsed.body}"
+        publish_progress("extract", url=url, mode="llm", chars=len(parsed.body))
         return {"markdown": markdown}
     except Exception as e:
         print(f"Error parsing page scrape response for {url}: {e}")
         return {"markdown": ""}
+
+async def _scrape_and_extract(url: str) -> dict:
+    full_html = await fetch_page(url)
+    return await extract_page(url, full_html)
+
+class PagePrefetcher:
+    """
+    Pages scraped ahead of a research run, e.g. the clarified query's results while the user
+    answers the follow-up questions. scrape_and_extract serves a prefetched page, or awaits
+    one still in flight, instead of fetching it again.
+    """
+
+    def __init__(self, ttl: float = c.prefetch_ttl, max_pages: int = c.prefetch_max_pages,
+                 concurrency: int = c.prefetch_concurrency):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._pages = OrderedDict()
+        # Scrapes still running, so ones evicted or expired from _pages are not garbage-collected.
+        self._running = set()
+        self.stats = {"prefetched": 0, "hits": 0, "expired": 0, "failed": 0}
+
+    def prefetch(self, urls: List[str]) -> List[asyncio.Task]:
+        """Start scraping urls in the background; returns the scrape of each URL, which yields None on failure."""
+        tasks = []
+        for url in urls:
+            key = normalize_url(url)
+            entry = self._pages.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                task = asyncio.create_task(self._scrape(key, url))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+                entry = self._pages[key] = (time.time(), task)
+                self.stats["prefetched"] += 1
+            tasks.append(entry[1])
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return tasks
+
+    async def _scrape(self, key: str, url: str) -> Optional[dict]:
+        async with self._semaphore:
+            try:
+                return await _scrape_and_extract(url)
+            except Exception as e:
+                print(f"Error prefetching {url}: {e}")
+                self.stats["failed"] += 1
+                # Only drop our own entry: the URL may have been prefetched again since this scrape began.
+                entry = self._pages.get(key)
+                if entry is not None and entry[1] is asyncio.current_task():
+                    del self._pages[key]
+                return None
+
+    def get(self, url: str) -> Optional[asyncio.Task]:
+        key = normalize_url(url)
+        entry = self._pages.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > self.ttl:
+            del self._pages[key]
+            self.stats["expired"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "pages": len(self._pages), "running": len(self._running)}
+
+page_prefetcher = PagePrefetcher()
+
+async def scrape_and_extract(url: str) -> dict:
+    prefetched = page_prefetcher.get(url)
+    if prefetched is not None:
+        # Shielded: the prefetch is shared, so a cancelled caller must not cancel it.
+        result = await asyncio.shield(prefetched)
+        if result is not None:
+            return result
+    return await _scrape_and_extract(url)
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from config_all.config_project import create_c
+from deep_research.page_scraper import scrape_and_extract
+from deep_research.serp_processor import process_serp_result
+from deep_research.utils.progress_tracker import track_step
+from deep_research.utils.url_registry import current_url_registry
+
+c = create_c()
+
+_DONE = object()
+
+# Background harvests of pages that arrived after the straggler deadline, per research run.
+current_late_harvests: ContextVar[Optional[Set[asyncio.Task]]] = ContextVar("current_late_harvests", default=None)
+
+
+async def _scrape_worker(urls: asyncio.Queue, pages: asyncio.Queue, scrape_fn):
+    registry = current_url_registry.get()
+    while (url := await urls.get()) is not _DONE:
+        try:
+            # URLs already scraped by another branch are skipped; in-flight ones are shared.
+            result = await registry.scrape(url, scrape_fn) if registry else await scrape_fn(url)
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+            result = None
+        await pages.put((url, result))
+    await pages.put(_DONE)
+
+
+async def _synthesise(query: str, pages: List[Dict], num_follow_up_questions: int) -> Dict[str, List[str]]:
+    start = time.monotonic()
+    result = await process_serp_result(query=query, search_result={"data": pages},
+                                       num_follow_up_questions=num_follow_up_questions)
+    track_step("synthesis", time.monotonic() - start)
+    return result
+
+
+async def _harvest_late(query: str, page_queue: asyncio.Queue, workers_left: int, stages: List[asyncio.Task],
+                        on_late: Callable[[List[str], List[str]], None]):
+    """Collect the pages still being scraped after the straggler deadline and learn from them in the background."""
+    pages, page_urls = [], []
+    try:
+        while workers_left:
+            item = await page_queue.get()
+            if item is _DONE:
+                workers_left -= 1
+                continue
+            url, result = item
+            if result and result.get("markdown"):
+                pages.append({"url": url, **result})
+                page_urls.append(url)
+        if pages:
+            result = await _synthesise(query, pages, 0)
+            on_late(result["learnings"], page_urls)
+    except Exception as e:
+        print(f"Error learning from late pages for query: {query}: {e}")
+    finally:
+        for task in stages:
+            task.cancel()
+
+
+async def harvest_learnings(query: str, urls: List[str], num_follow_up_questions: int, scrape_fn=None,
+                            on_late: Optional[Callable[[List[str], List[str]], None]] = None
+                            ) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Scrape a query's search results and learn from them as a pipeline:
+    URLs -> scrape workers (fetch and extract) -> good pages -> synthesis.
+
+    Queues between the stages are bounded, so scraping stays just ahead of what is consumed.
+    Synthesis of the first c.pipeline_first_pages good pages starts while the remaining pages
+    are still being fetched. c.pipeline_straggler_deadline seconds after the first good page,
+    the pages collected so far are synthesised and the function returns without waiting for
+    slower ones. When on_late is given, those are still scraped in the background and their
+    learnings and page URLs are passed to on_late; the task doing so is added to the run's
+    current_late_harvests. Otherwise they are dropped.
+
+    Returns the learnings and follow-up questions, and the URLs of the pages they came from.
+    """
+    scrape_fn = scrape_fn or scrape_and_extract
+    loop = asyncio.get_running_loop()
+    deadline = None
+    url_queue = asyncio.Queue(maxsize=c.pipeline_queue_size)
+    page_queue = asyncio.Queue(maxsize=c.pipeline_queue_size)
+    num_workers = max(1, min(c.fetches_per_query, len(urls)))
+
+    async def feed():
+        for url in urls:
+            await url_queue.put(url)
+        for _ in range(num_workers):
+            await url_queue.put(_DONE)
+
+    stages = [asyncio.create_task(feed())]
+    stages += [asyncio.create_task(_scrape_worker(url_queue, page_queue, scrape_fn)) for _ in range(num_workers)]
+    batches, batch, page_urls = [], [], []
+    workers_left = num_workers
+    handed_off = False
+
+    def flush():
+        nonlocal batch
+        # Follow-up questions come from the first batch; later ones only add learnings.
+        batches.append(asyncio.create_task(
+            _synthesise(query, batch, num_follow_up_questions if not batches else 0)))
+        batch = []
+
+    try:
+        while workers_left:
+            # No timeout until the first good page: there is nothing to synthesise before it.
+            timeout = max(0.0, deadline - loop.time()) if deadline is not None else None
+            try:
+                item = await asyncio.wait_for(page_queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                late_harvests = current_late_harvests.get()
+                if on_late is not None and late_harvests is not None:
+                    print(f"Continuing with {len(page_urls)} of {len(urls)} pages for query: {query}; "
+                          f"the rest are learned from in the background")
+                    late = asyncio.create_task(_harvest_late(query, page_queue, workers_left, stages, on_late))
+                    late_harvests.add(late)
+                    late.add_done_callback(late_harvests.discard)
+                    handed_off = True
+                else:
+                    print(f"Continuing with {len(page_urls)} of {len(urls)} pages for query: {query}")
+                break
+            if item is _DONE:
+                workers_left -= 1
+                continue
+            url, result = item
+            if not result or not result.get("markdown"):
+                continue
+            batch.append({"url": url, **result})
+            page_urls.append(url)
+            if deadline is None:
+                deadline = loop.time() + c.pipeline_straggler_deadline
+            if not batches and len(batch) >= c.pipeline_first_pages:
+                flush()
+        if batch or not batches:
+            flush()
+        results = await asyncio.gather(*batches)
+    finally:
+        for task in ([] if handed_off else stages) + batches:
+            task.cancel()
+
+    learnings = [learning for result in results for learning in result["learnings"]]
+    follow_ups = [question for result in results for question in result["followUpQuestions"]]
+    return {"learnings": list(dict.fromkeys(learnings)),
+            "followUpQuestions": follow_ups[:num_follow_up_questions]}, page_urls
+
+
+async def settle_late_harvests(late_harvests: Set[asyncio.Task], timeout: float = c.pipeline_straggler_deadline):
+    """Give background harvests still running when the tree is done up to timeout seconds, then stop them."""
+    if not late_harvests:
+        return
+    done, pending = await asyncio.wait(set(late_harvests), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        print(f"Stopped {len(pending)} background page harvests at the end of the run")
@@ -1,68 +1,43 @@
+import asyncio
+import time
+from dataclasses import asdict, dataclass, field
 from deep_research.utils.prompt import system_prompt
 from deep_research.api_client import ApiClient
-from pydantic import BaseModel
-from typing import List
+from deep_research.utils.tokens import context_window, token_budget, JOIN_TOKENS
+from deep_research.utils.client_pool import model_name
+from deep_research.condenser import learning_condenser, with_sources
+from config_all.config_project import create_c
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-# Define Pydantic models for structured outputs at each stage.
-class ReportStage1Response(BaseModel):
-    introduction: str
-    problem_statement: str
+c = create_c()
 
-class ReportStage2Response(BaseModel):
-    in_depth_answer: str
+# Headings the model writes between the two parts of the introduction section.
+PROBLEM_STATEMENT_HEADING = "## Problem Statement"
 
-class ReportStage3Response(BaseModel):
-    conclusion: str
-    references: str
 
-async def write_final_report(prompt: str, learnings: List[str], visited_urls: List[str]) -> str:
-    # Format the research learnings by wrapping each in XML-like tags.
-    learnings_array = [f"<learning>\n{learning}\n</learning>" for learning in learnings]
-    learnings_string = "\n".join(learnings_array)
-    
-    # You may also include visited URLs as part of the research context if desired.
-    urls_string = "\n".join(f"- {url}" for url in visited_urls) if visited_urls else ""
-    retrieved_urls = f"Retrieved URLs:\n{urls_string}" if urls_string else ""
-    
-    api_client = ApiClient()
-    
-    # ------------------
-    # Stage 1: Introduction and Problem Statement
-    # ------------------
-    stage1_prompt = (
-        f"Given the following user prompt:\n<prompt>{prompt}</prompt>\n\n"
-        f"And these research learnings:\n<learnings>\n{learnings_string}\n</learnings>\n\n"
-        f"{retrieved_urls}\n\n"
+@dataclass(frozen=True)
+class ReportSection:
+    name: str
+    heading: str
+    instructions: str
+    # Sections whose text is shown to the model before it writes this one.
+    depends_on: Tuple[str, ...] = ()
+
+
+# In report order. Sections without a dependency path between them are generated concurrently;
+# later sections are buffered and streamed once the ones before them are complete.
+REPORT_SECTIONS = (
+    ReportSection(
+        "introduction", "## Introduction\n",
         "Please write the report's Introduction and Problem Statement in markdown format. "
         "Aim for approximately half a page for each section. "
-        "Do not include a headers for these sections. "
+        "Start directly with the Introduction text, without a header. "
+        f"Then write a line containing only '{PROBLEM_STATEMENT_HEADING}', followed by the Problem Statement. "
         "Do not write about the process of research. Write as if you are writing the final report basing it on the research findings. "
-        "Return a JSON object with the fields 'introduction' and 'problem_statement'."
-    )
-    stage1_response = await api_client.llm_complete(
-        system_instruction=system_prompt(),
-        prompt=stage1_prompt,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": ReportStage1Response,
-        }
-    )
-    try:
-        stage1_result: ReportStage1Response = stage1_response.parsed
-    except Exception as e:
-        print(f"Error parsing Stage 1 response: {e}")
-        return "Error generating report at stage 1"
-
-    # ------------------
-    # Stage 2: In-Depth Answer
-    # ------------------
-    # Include stage 1 output along with the full learnings so that the model bases its output on all available info.
-    stage2_prompt = (
-        f"The report so far includes the following sections:\n"
-        f"## Introduction\n{stage1_result.introduction}\n\n"
-        f"## Problem Statement\n{stage1_result.problem_statement}\n\n"
-        f"Additionally, here are the research learnings:\n<learnings>\n{learnings_string}\n</learnings>\n\n"
-        f"{retrieved_urls}\n\n"
+        "Return only the markdown text of these sections.",
+    ),
+    ReportSection(
+        "in_depth_answer", "## In-Depth Answer\n",
         "Based on all of the above, please provide an In-Depth Answer that comprehensively addresses the research question. "
         "In other words, write the body of the report that answers the question in detail and based on the facts retrieved. "
         "Do not write about the process of research. Write as if you are writing the final report basing it on the research findings. "
@@ -70,65 +45,160 @@ async def write_final_report(prompt: str, learnings: List[str], visited_urls: Li
         "Do not include a conclusion or references at this stage, just the main content. "
         "Do not include a header for this section. "
         "Aim for at least two pages of content in markdown format. "
-        "Return a JSON object with the field 'in_depth_answer'."
-    )
-    stage2_response = await api_client.llm_complete(
-        system_instruction=system_prompt(),
-        prompt=stage2_prompt,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": ReportStage2Response,
-        }
-    )
-    try:
-        stage2_result: ReportStage2Response = stage2_response.parsed
-    except Exception as e:
-        print(f"Error parsing Stage 2 response: {e}")
-        return "Error generating report at stage 2"
-
-    # ------------------
-    # Stage 3: Conclusion and References
-    # ------------------
-    # Provide all previously generated content along with the learnings as context.
-    stage3_prompt = (
-        f"The report so far includes the following sections:\n"
-        f"## Introduction\n{stage1_result.introduction}\n\n"
-        f"## Problem Statement\n{stage1_result.problem_statement}\n\n"
-        f"## In-Depth Answer\n{stage2_result.in_depth_answer}\n\n"
-        f"Also included are the complete set of research learnings:\n<learnings>\n{learnings_string}\n</learnings>\n\n"
-        f"{retrieved_urls}\n\n"
-        "Now, please write a Conclusion that summarizes the findings and provide a References section based on the research. "
+        "Return only the markdown text of this section.",
+        depends_on=("introduction",),
+    ),
+    ReportSection(
+        "conclusion", "## Conclusion\n",
+        "Now, please write a Conclusion that summarizes the findings. "
         "Do not write about the process of research. Write as if you are writing the final report basing it on the research findings. "
-        "Aim for approximately half a page for the Conclusion and include a list of references which follow the APA7 guidelines, both in markdown format. "
-        "Return a JSON object with the fields 'conclusion' and 'references'."
-    )
-    stage3_response = await api_client.llm_complete(
-        system_instruction=system_prompt(),
-        prompt=stage3_prompt,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": ReportStage3Response,
-        }
-    )
+        "Aim for approximately half a page, in markdown format, without a header. "
+        "Return only the markdown text of this section.",
+        depends_on=("introduction", "in_depth_answer"),
+    ),
+    ReportSection(
+        "references", "## References\n",
+        "Please write a References section based on the research learnings and retrieved URLs above: "
+        "a list of references which follow the APA7 guidelines, in markdown format, without a header. "
+        "Return only the markdown list.",
+    ),
+)
+REPORT_SECTIONS_BY_NAME = {section.name: section for section in REPORT_SECTIONS}
+
+
+@dataclass
+class StageAccounting:
+    depends_on: List[str]
+    prompt_tokens: int
+    started: float = 0.0
+    time_to_first_delta: float = 0.0
+    seconds: float = 0.0
+    output_tokens: int = 0
+    provider_usage: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        result = asdict(self)
+        for key in ("started", "time_to_first_delta", "seconds"):
+            result[key] = round(result[key], 3)
+        return result
+
+
+async def stream_final_report(prompt: str, learnings: List[str], visited_urls: List[str],
+                              learning_sources: Optional[Dict[str, List[str]]] = None) -> AsyncIterator[dict]:
+    """
+    Write the report section by section, yielding {"stage": ..., "delta": ...} events in report order.
+    Concatenating every delta gives the full markdown report. A last {"stage": "accounting", "data": ...}
+    event carries timing and token accounting per stage.
+
+    Every section prompt opens with the same prefix (date-only system prompt, learnings, sources,
+    user prompt), so providers that cache prompt prefixes only bill the learnings once at full price.
+    Learnings that do not fit the model's context window are condensed first, keeping their sources.
+    """
+    api_client = ApiClient()
+    condense_start = time.monotonic()
+    learnings_budget = context_window(model_name(api_client.api_provider)) - c.report_prompt_reserve_tokens
+    sourced = await learning_condenser.condense(with_sources(learnings, learning_sources), learnings_budget)
+
+    # Format the research learnings by wrapping each in XML-like tags.
+    learnings_array = [f"<learning>\n{learning.render()}\n</learning>" for learning in sourced]
+    learnings_string = "\n".join(learnings_array)
+
+    # You may also include visited URLs as part of the research context if desired.
+    urls_string = "\n".join(f"- {url}" for url in visited_urls) if visited_urls else ""
+    retrieved_urls = f"Retrieved URLs:\n{urls_string}" if urls_string else ""
+
+    system_instruction = system_prompt(with_time=False)
+    prompt_block = f"The report answers the following user prompt:\n<prompt>{prompt}</prompt>\n\n"
+    shared_prefix = f"Research learnings:\n<learnings>\n{learnings_string}\n</learnings>\n\n{retrieved_urls}\n\n{prompt_block}"
+    # Count the shared prefix once; each section only adds the tokens of its own suffix.
+    prefix_tokens = (token_budget.count_many(learnings_array) + len(learnings_array)
+                     + token_budget.count_many((retrieved_urls, prompt_block)) + JOIN_TOKENS)
+
+    start = time.monotonic()
+    accounting: Dict[str, StageAccounting] = {}
+    queues = {section.name: asyncio.Queue() for section in REPORT_SECTIONS}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run_section(section: ReportSection) -> str:
+        queue = queues[section.name]
+        try:
+            dependencies = [await tasks[name] for name in section.depends_on]
+            suffix = ""
+            if dependencies:
+                so_far = "".join(f"{REPORT_SECTIONS_BY_NAME[name].heading}{text}\n\n"
+                                 for name, text in zip(section.depends_on, dependencies))
+                suffix = f"The report so far includes the following sections:\n{so_far}"
+            suffix += section.instructions
+            prompt_tokens = prefix_tokens + token_budget.count(suffix) + JOIN_TOKENS
+            stage = accounting[section.name] = StageAccounting(
+                depends_on=list(section.depends_on),
+                prompt_tokens=prompt_tokens + token_budget.count(system_instruction),
+            )
+            stage.started = time.monotonic() - start
+            parts = []
+            async for delta in api_client.llm_stream(
+                system_instruction=system_instruction,
+                prompt=f"{shared_prefix}{suffix}",
+                prompt_tokens=prompt_tokens,
+                usage=stage.provider_usage,
+            ):
+                if not parts:
+                    stage.time_to_first_delta = time.monotonic() - start - stage.started
+                parts.append(delta)
+                queue.put_nowait(delta)
+            text = "".join(parts)
+            stage.seconds = time.monotonic() - start - stage.started
+            stage.output_tokens = token_budget.count(text)
+            return text
+        finally:
+            queue.put_nowait(None)
+
+    for section in REPORT_SECTIONS:
+        tasks[section.name] = asyncio.create_task(run_section(section))
+
     try:
-        stage3_result: ReportStage3Response = stage3_response.parsed
-    except Exception as e:
-        print(f"Error parsing Stage 3 response: {e}")
-        return "Error generating report at stage 3"
-
-    # ------------------
-    # Combine all sections into one markdown-formatted report.
-    # ------------------
-    markdown_report = (
-        f"## Introduction\n{stage1_result.introduction}\n\n"
-        f"## Problem Statement\n{stage1_result.problem_statement}\n\n"
-        f"## In-Depth Answer\n{stage2_result.in_depth_answer}\n\n"
-        f"## Conclusion\n{stage3_result.conclusion}\n\n"
-        f"## References\n{stage3_result.references}\n\n"
-    )
+        for section in REPORT_SECTIONS:
+            yield {"stage": section.name, "delta": section.heading}
+            queue = queues[section.name]
+            while (delta := await queue.get()) is not None:
+                yield {"stage": section.name, "delta": delta}
+            await tasks[section.name]  # re-raise if the section failed
+            yield {"stage": section.name, "delta": "\n\n"}
+    finally:
+        for task in tasks.values():
+            task.cancel()
 
     # Optionally, append the visited URLs as a sources section if not already included.
     if urls_string:
-        markdown_report += "\n## Sources\n" + urls_string
+        yield {"stage": "sources", "delta": "\n## Sources\n" + urls_string}
+
+    yield {"stage": "accounting", "data": {
+        "total_seconds": round(time.monotonic() - start, 3),
+        "condense_seconds": round(start - condense_start, 3),
+        "shared_prefix_tokens": prefix_tokens,
+        "prompt_tokens": sum(stage.prompt_tokens for stage in accounting.values()),
+        "output_tokens": sum(stage.output_tokens for stage in accounting.values()),
+        "stages": {name: stage.to_dict() for name, stage in accounting.items()},
+    }}
+
+
+async def collect_final_report(prompt: str, learnings: List[str], visited_urls: List[str],
+                               learning_sources: Optional[Dict[str, List[str]]] = None) -> Tuple[str, dict]:
+    """Run the report pipeline to completion; returns the markdown report and its accounting."""
+    parts = []
+    accounting = {}
+    async for event in stream_final_report(prompt, learnings, visited_urls, learning_sources):
+        if event["stage"] == "accounting":
+            accounting = event["data"]
+        else:
+            parts.append(event["delta"])
+    return "".join(parts), accounting
+
 
-    return markdown_report
+async def write_final_report(prompt: str, learnings: List[str], visited_urls: List[str],
+                             learning_sources: Optional[Dict[str, List[str]]] = None) -> str:
+    report, accounting = await collect_final_report(prompt, learnings, visited_urls, learning_sources)
+    print(f"Report written in {accounting.get('total_seconds')}s: "
+          f"{accounting.get('prompt_tokens')} prompt tokens "
+          f"({accounting.get('shared_prefix_tokens')} shared prefix), {accounting.get('output_tokens')} output tokens")
+    return report
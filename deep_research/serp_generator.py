@@ -3,6 +3,8 @@ from dataclasses import dataclass
 from config_all.config_project import create_c
 from deep_research.utils.prompt import system_prompt
 from deep_research.api_client import ApiClient
+from deep_research.utils.tokens import token_budget, JOIN_TOKENS
+from deep_research.condenser import learning_condenser, with_sources
 from pydantic import BaseModel
 
 c = create_c()
@@ -20,12 +22,18 @@ async def generate_serp_queries(query: str, num_queries: int = 3, learnings: Opt
     prompt_str = (f"Given the following prompt: '{query}', generate a list of SERP queries to research the topic. "
                   f"Return a JSON object with a 'queries' array field containing up to {num_queries} unique queries. "
                   "Each query object should have 'query' and 'research_goal' fields.")
+    prompt_tokens = token_budget.count(prompt_str)
     if learnings:
+        # Condensed rather than cut off when the accumulated learnings outgrow the budget.
+        condensed = await learning_condenser.condense(with_sources(learnings), c.serp_learnings_token_budget)
+        learnings = [item.text for item in condensed]
         prompt_str += f" Use these learnings for additional context: {' '.join(learnings)}"
+        prompt_tokens += token_budget.count_many(learnings) + len(learnings) + JOIN_TOKENS
     api_client = ApiClient()
     response = await api_client.llm_complete(
         system_instruction=system_prompt(),
         prompt=prompt_str,
+        prompt_tokens=prompt_tokens,
         config={
             "response_mime_type": "application/json",
             "response_schema": list[SerpQueryModel],
@@ -1,6 +1,7 @@
 from typing import Dict, List
 from deep_research.utils.prompt import system_prompt
 from deep_research.api_client import ApiClient
+from deep_research.utils.tokens import token_budget, JOIN_TOKENS
 from pydantic import BaseModel
 
 # Restored schema as in the original combined file
@@ -21,18 +22,22 @@ async def process_serp_result(query: str, search_result: dict, num_learnings: in
             contents.append(markdown)
 
     # Create the contents string separately
-    contents_str = "".join(f"<content>\n{content}\n</content>" for content in contents)
+    content_blocks = [f"<content>\n{content}\n</content>" for content in contents]
+    contents_str = "".join(content_blocks)
 
-    prompt_str = (
+    prompt_head = (
         f"Given the following contents for the query <query>{query}</query>, generate learnings and follow-up questions. "
         f"Return a JSON object with up to {num_learnings} unique learnings and {num_follow_up_questions} follow-up questions. "
-        f"<contents>{contents_str}</contents>"
     )
+    prompt_str = f"{prompt_head}<contents>{contents_str}</contents>"
+    # Page token counts are memoised, so pages seen before are not re-tokenized.
+    prompt_tokens = token_budget.count(prompt_head) + token_budget.count_many(content_blocks) + JOIN_TOKENS
 
     api_client = ApiClient()
     response = await api_client.llm_complete(
         system_instruction=system_prompt(),
         prompt=prompt_str,
+        prompt_tokens=prompt_tokens,
         config={
             "response_mime_type": "application/json",
             "response_schema": SerpResultResponse,
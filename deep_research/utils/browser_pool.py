@@ -0,0 +1,150 @@
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Optional
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from config_all.config_project import create_c
+
+c = create_c()
+
+
+def chrome_driver_factory():
+    """Headless Chrome with logging muted."""
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--log-level=3")  # Added to minimize logging
+    service = Service(log_path=os.devnull)  # Mute ChromeDriver logs
+    return webdriver.Chrome(options=options, service=service)
+
+
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+class BrowserPool:
+    """
+    Bounded pool of warm headless browsers driven from dedicated worker threads.
+    Fetches queue on the pool's own executor, so a slow page never blocks the event loop.
+    Instances are recycled after pages_per_browser pages or after any error.
+    """
+
+    def __init__(self, size: int = c.browser_pool_size,
+                 pages_per_browser: int = c.browser_pages_per_instance,
+                 page_timeout: float = c.browser_page_timeout,
+                 driver_factory: Callable = chrome_driver_factory):
+        self.size = size
+        self.pages_per_browser = pages_per_browser
+        self.page_timeout = page_timeout
+        self.driver_factory = driver_factory
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="browser")
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"launched": 0, "recycled": 0, "pages": 0, "errors": 0}
+
+    def _launch(self) -> _PooledDriver:
+        driver = self.driver_factory()
+        driver.set_page_load_timeout(self.page_timeout)
+        with self._lock:
+            self.stats["launched"] += 1
+        return _PooledDriver(driver)
+
+    def _quit(self, pooled: _PooledDriver):
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+    def checkout(self) -> _PooledDriver:
+        """Take a warm browser, launching one if none is idle. Call from a worker thread."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._launch()
+
+    def checkin(self, pooled: _PooledDriver, broken: bool = False):
+        """Return a browser; it is quit instead when broken, worn out or the pool is closed."""
+        pooled.pages += 1
+        if broken or self._closed or pooled.pages >= self.pages_per_browser:
+            with self._lock:
+                self.stats["recycled"] += 1
+            self._quit(pooled)
+        else:
+            self._idle.put(pooled)
+
+    @contextmanager
+    def browser(self):
+        pooled = self.checkout()
+        broken = False
+        try:
+            yield pooled.driver
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.checkin(pooled, broken=broken)
+
+    def _fetch_sync(self, url: str) -> str:
+        with self.browser() as driver:
+            driver.get(url)
+            html = driver.page_source
+        with self._lock:
+            self.stats["pages"] += 1
+        return html
+
+    async def fetch(self, url: str) -> str:
+        """Load url in a pooled browser and return the rendered HTML."""
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._fetch_sync, url)
+        except Exception:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {**self.stats, "idle": self._idle.qsize(), "size": self.size}
+
+    def close(self):
+        self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """The process-wide browser pool, created on first use."""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+    return _browser_pool
+
+
+def set_browser_pool(pool: Optional[BrowserPool]):
+    """Replace the shared pool, e.g. with one built around a fake driver factory."""
+    global _browser_pool
+    _browser_pool = pool
+
+
+def close_browser_pool():
+    global _browser_pool
+    if _browser_pool is not None:
+        _browser_pool.close()
+        _browser_pool = None
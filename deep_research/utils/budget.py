@@ -0,0 +1,220 @@
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+from config_all.config_project import create_c
+from .dedup import near_duplicate_groups
+from .progress_bus import publish_progress
+from .progress_tracker import subtree_size
+from .scheduler import Branch
+from .urls import normalize_url
+
+c = create_c()
+
+
+@dataclass
+class ResearchBudget:
+    """Limits for one research run; None means unlimited."""
+    max_seconds: Optional[float] = None
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None  # USD, priced with c.llm_prices and c.search_price
+    max_searches: Optional[int] = None
+
+    @property
+    def limited(self) -> bool:
+        return any(value is not None for value in asdict(self).values())
+
+
+@dataclass
+class BranchDecision:
+    branch: str
+    query: str
+    action: str  # "pruned", "narrowed" or "deepened"
+    reason: str
+    novelty: Optional[float] = None
+    # The level below the node: as pruned, or as narrowed or deepened to.
+    breadth: int = 0
+    depth: int = 0
+
+
+class BudgetPlanner:
+    """
+    Spends a research run's budget where it still finds new information.
+
+    Every finished query node is scored by its novelty: the share of its learnings that are not
+    near-duplicates of earlier ones, together with its URLs not seen before. Before a node expands,
+    the planner prunes it when the budget is spent or its novelty is below c.planner_min_novelty,
+    narrows it when the level below would not fit the remaining budget at the cost measured per node
+    so far, and lets a leaf with novelty of at least c.planner_deepen_novelty research one level
+    deeper than asked while the budget allows. Every decision is kept for the run's report.
+    """
+
+    def __init__(self, budget: ResearchBudget, depth: int, min_novelty: float = c.planner_min_novelty,
+                 deepen_novelty: float = c.planner_deepen_novelty, max_extra_depth: int = c.planner_max_extra_depth):
+        self.budget = budget
+        self.depth = depth
+        self.min_novelty = min_novelty
+        self.deepen_novelty = deepen_novelty
+        self.max_extra_depth = max_extra_depth
+        self.start = time.monotonic()
+        self.usage = {"tokens": 0, "cost": 0.0, "searches": 0}
+        self.nodes = 0
+        self.started = 0                    # nodes searched in this run, including unfinished ones
+        self.reserved = 0                   # nodes of approved expansions not searched yet
+        self.decisions: List[BranchDecision] = []
+        self.novelty: Dict[str, float] = {}
+        self._learnings: List[str] = []
+        self._urls = set()
+
+    def snapshot(self) -> dict:
+        """What the run has spent so far, to be checkpointed and restored when the run resumes."""
+        return {"usage": dict(self.usage), "seconds": time.monotonic() - self.start, "nodes": self.nodes}
+
+    def restore(self, state: dict):
+        """Continue from the spending of an earlier attempt of the run, so a resume does not get a fresh budget."""
+        self.usage.update(state["usage"])
+        self.start = time.monotonic() - state["seconds"]
+        self.nodes = self.started = state["nodes"]
+
+    def charge_llm(self, model: str, prompt_tokens: int, output_tokens: int):
+        input_price, output_price = c.llm_prices.get(model, (0.0, 0.0))
+        self.usage["tokens"] += prompt_tokens + output_tokens
+        self.usage["cost"] += (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def charge_search(self):
+        self.usage["searches"] += 1
+        self.usage["cost"] += c.search_price
+
+    def _spent(self) -> Dict[str, float]:
+        return {"seconds": time.monotonic() - self.start, "tokens": self.usage["tokens"],
+                "cost": self.usage["cost"], "searches": self.usage["searches"]}
+
+    def _limits(self) -> Dict[str, Optional[float]]:
+        return {"seconds": self.budget.max_seconds, "tokens": self.budget.max_tokens,
+                "cost": self.budget.max_cost, "searches": self.budget.max_searches}
+
+    def exhausted(self) -> Optional[str]:
+        """Reason the budget is spent, or None while some of every limit is left."""
+        spent = self._spent()
+        for resource, limit in self._limits().items():
+            if limit is not None and spent[resource] >= limit:
+                return f"{resource} budget of {limit:g} spent"
+        return None
+
+    def _overrun(self, nodes: int) -> Optional[str]:
+        """
+        The first limit that nodes more query nodes would exceed at the cost per node so far,
+        after the nodes already reserved by other branches' expansions.
+        """
+        if not self.nodes:
+            return None
+        spent = self._spent()
+        # Unfinished nodes have already spent part of their cost, so it is averaged over all started ones.
+        started = max(self.nodes, self.started)
+        for resource, limit in self._limits().items():
+            if limit is None:
+                continue
+            per_node = spent[resource] / started
+            left = limit - spent[resource] - per_node * self.reserved
+            if per_node * nodes > left:
+                return f"{nodes} more queries would need about {per_node * nodes:.4g} {resource}, {max(0, left):.4g} left"
+        return None
+
+    def observe(self, branch: Branch, learnings: Sequence[str], urls: Sequence[str], replayed: bool = False) -> float:
+        """
+        Score a finished node by the share of its learnings and URLs that are new to the run.
+        Nodes replayed from a checkpoint cost nothing, so they do not count toward the cost per node.
+        """
+        if not replayed:
+            self.nodes += 1
+        new_urls = {normalize_url(url) for url in urls} - self._urls
+        self._urls |= new_urls
+        candidates = list(dict.fromkeys(learnings))
+        leader = near_duplicate_groups(self._learnings + candidates)
+        offset = len(self._learnings)
+        new_learnings = [text for index, text in enumerate(candidates, offset) if leader[index] == index]
+        self._learnings.extend(new_learnings)
+        total = len(candidates) + len(urls)
+        novelty = (len(new_learnings) + len(new_urls)) / total if total else 0.0
+        self.novelty[branch.path] = round(novelty, 3)
+        return novelty
+
+    def _decide(self, decision: BranchDecision):
+        self.decisions.append(decision)
+        publish_progress("budget", query=decision.query, action=decision.action, reason=decision.reason,
+                         novelty=decision.novelty, breadth=decision.breadth, levels=decision.depth)
+
+    def skip(self, branch: Branch, query: str) -> bool:
+        """Whether a query should not be searched at all because the budget is spent."""
+        self.reserved = max(0, self.reserved - 1)
+        reason = self.exhausted()
+        if reason:
+            self._decide(BranchDecision(branch.path, query, "pruned", reason))
+        else:
+            self.started += 1
+        return reason is not None
+
+    def plan_expansion(self, branch: Branch, query: str, novelty: float, breadth: int, depth: int) -> Tuple[int, int]:
+        """
+        Breadth and depth of the level to research below a finished node, given the breadth and
+        depth deep_research would use; depth 0 means the node is not expanded.
+        """
+        decision = BranchDecision(branch.path, query, "", "", round(novelty, 3), breadth, depth)
+        exhausted = self.exhausted()
+        if depth <= 0:
+            # Levels this leaf already is below the depth asked for.
+            extra_depth = branch.level - self.depth
+            if (novelty < self.deepen_novelty or extra_depth >= self.max_extra_depth or exhausted
+                    or self._overrun(subtree_size(breadth, 1)[1])):
+                return breadth, 0
+            decision.action, decision.depth = "deepened", 1
+            decision.reason = f"novelty {novelty:.2f} and budget left for one more level"
+            self._decide(decision)
+            self.reserved += breadth
+            return breadth, 1
+
+        if exhausted:
+            decision.action, decision.reason = "pruned", exhausted
+        elif novelty < self.min_novelty:
+            decision.action, decision.reason = "pruned", f"novelty {novelty:.2f} below {self.min_novelty:g}"
+        else:
+            overrun = None
+            for narrowed in range(breadth, 0, -1):
+                overrun = self._overrun(subtree_size(narrowed, depth)[1])
+                if overrun is None:
+                    if narrowed < breadth:
+                        decision.action, decision.breadth = "narrowed", narrowed
+                        decision.reason = f"breadth {breadth} would not fit the budget left"
+                        self._decide(decision)
+                    self.reserved += subtree_size(narrowed, depth)[1]
+                    return narrowed, depth
+            decision.action, decision.reason = "pruned", overrun
+        self._decide(decision)
+        return breadth, 0
+
+    def report(self) -> dict:
+        spent = self._spent()
+        return {
+            "budget": asdict(self.budget),
+            "usage": {"seconds": round(spent["seconds"], 2), "tokens": spent["tokens"],
+                      "cost": round(spent["cost"], 4), "searches": spent["searches"]},
+            "queries": self.nodes,
+            "novelty": self.novelty,
+            "decisions": [asdict(decision) for decision in self.decisions],
+        }
+
+
+current_planner: ContextVar[Optional[BudgetPlanner]] = ContextVar("current_planner", default=None)
+
+
+def charge_llm(model: str, prompt_tokens: int, output_tokens: int):
+    """Charge an LLM call to the active run's budget; a no-op outside a budgeted run."""
+    planner = current_planner.get()
+    if planner is not None:
+        planner.charge_llm(model, prompt_tokens, output_tokens)
+
+
+def charge_search():
+    planner = current_planner.get()
+    if planner is not None:
+        planner.charge_search()
@@ -0,0 +1,175 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Optional
+from config_all.config_project import create_c
+from .scheduler import Branch
+
+c = create_c()
+
+
+class RunInProgress(Exception):
+    """Raised when a run is started or resumed while it is still running in this process."""
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class RunCheckpoint:
+    """Checkpointed nodes of one research run, loaded once when the run starts or resumes."""
+
+    def __init__(self, store: "CheckpointStore", run_id: str, nodes: Dict[str, dict], resumed: bool):
+        self.store = store
+        self.run_id = run_id
+        self.nodes = nodes
+        self.resumed = resumed
+        self.replayed = 0
+
+    def get_node(self, key: str) -> Optional[dict]:
+        """A node completed by an earlier attempt of this run; nodes that failed are run again."""
+        data = self.nodes.get(key)
+        if data is None or "error" in data:
+            return None
+        self.replayed += 1
+        return data
+
+    def save_node(self, key: str, branch: Branch, data: dict):
+        self.nodes[key] = data
+        self.store.save_node(self.run_id, key, branch, data)
+
+
+class CheckpointStore:
+    """
+    SQLite store of research runs and of every completed node of their trees: the queries
+    generated for a level, and each query's URLs, learnings, follow-up questions or error.
+    Old runs are pruned whenever a run starts: completed ones after retention seconds,
+    failed and interrupted ones after resumable_retention seconds.
+    """
+
+    def __init__(self, path: Optional[str] = c.checkpoint_path, retention: float = c.checkpoint_retention,
+                 resumable_retention: float = c.checkpoint_resumable_retention):
+        self.path = path
+        self.retention = retention
+        self.resumable_retention = resumable_retention
+        self._active = set()                # runs started in this process and not finished yet
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, params TEXT NOT NULL, status TEXT NOT NULL, "
+                "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS nodes ("
+                "run_id TEXT NOT NULL, node_key TEXT NOT NULL, branch TEXT NOT NULL, depth INTEGER NOT NULL, "
+                "data TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (run_id, node_key))"
+            )
+            self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def is_active(self, run_id: str) -> bool:
+        """Whether run_id is running in this process; a 'running' status alone may be a crashed run."""
+        return run_id in self._active
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT params, status, result, error, created_at, updated_at FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            nodes = self._conn.execute("SELECT COUNT(*) FROM nodes WHERE run_id = ?", (run_id,)).fetchone()[0]
+        if row is None:
+            return None
+        return {
+            "run_id": run_id,
+            "params": json.loads(row[0]),
+            "status": row[1],
+            "result": json.loads(row[2]) if row[2] else None,
+            "error": row[3],
+            "created_at": row[4],
+            "updated_at": row[5],
+            "nodes": nodes,
+        }
+
+    def start_run(self, run_id: str, params: dict) -> RunCheckpoint:
+        """Open run_id with params, resuming its saved nodes if it exists."""
+        if run_id in self._active:
+            raise RunInProgress(f"Research run {run_id} is still running")
+        self._active.add(run_id)
+        if not self.enabled:
+            return RunCheckpoint(self, run_id, {}, resumed=False)
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            exists = self._conn.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is not None
+            if exists:
+                # Params may gain settings on resume, e.g. a budget the run did not have.
+                self._conn.execute(
+                    "UPDATE runs SET params = ?, status = 'running', error = NULL, updated_at = ? WHERE run_id = ?",
+                    (json.dumps(params), now, run_id),
+                )
+                rows = self._conn.execute("SELECT node_key, data FROM nodes WHERE run_id = ?", (run_id,)).fetchall()
+            else:
+                self._conn.execute(
+                    "INSERT INTO runs (run_id, params, status, created_at, updated_at) VALUES (?, ?, 'running', ?, ?)",
+                    (run_id, json.dumps(params), now, now),
+                )
+                rows = []
+            self._conn.commit()
+        return RunCheckpoint(self, run_id, {key: json.loads(data) for key, data in rows}, resumed=exists)
+
+    def _prune(self, now: float):
+        expired = self._conn.execute(
+            "SELECT run_id FROM runs WHERE (status = 'completed' AND updated_at < ?) OR updated_at < ?",
+            (now - self.retention, now - self.resumable_retention),
+        ).fetchall()
+        if expired:
+            self._conn.executemany("DELETE FROM nodes WHERE run_id = ?", expired)
+            self._conn.executemany("DELETE FROM runs WHERE run_id = ?", expired)
+            print(f"Pruned {len(expired)} expired research checkpoints")
+
+    def save_node(self, run_id: str, key: str, branch: Branch, data: dict):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO nodes (run_id, node_key, branch, depth, data, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, key, branch.path, branch.level, json.dumps(data), now),
+            )
+            self._conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+            self._conn.commit()
+
+    def finish_run(self, run_id: str, result: Optional[dict] = None, error: Optional[str] = None):
+        self._active.discard(run_id)
+        if not self.enabled:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, result = ?, error = ?, updated_at = ? WHERE run_id = ?",
+                ("failed" if error else "completed", json.dumps(result) if result is not None else None,
+                 error, time.time(), run_id),
+            )
+            self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+checkpoint_store = CheckpointStore()
+
+current_checkpoint: ContextVar[Optional[RunCheckpoint]] = ContextVar("current_checkpoint", default=None)
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import httpx
+from openai import AsyncOpenAI
+from google import genai
+from config_all.config_project import create_c
+
+c = create_c()
+
+XAI_BASE_URL = "https://api.x.ai/v1"
+
+
+def model_name(provider: str) -> str:
+    """Configured model for an LLM provider."""
+    return {"openai": c.openai_model, "gemini": c.gemini_model, "xai": c.xai_model}.get(provider, provider)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of long-lived async LLM provider clients.
+    One client (and one keep-alive HTTP pool) is kept per (provider, model) and shared by every ApiClient.
+    """
+
+    def __init__(self, max_connections: int = c.llm_max_connections,
+                 max_keepalive_connections: int = c.llm_max_keepalive_connections,
+                 keepalive_expiry: float = c.llm_keepalive_expiry):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._http_clients = {}
+        self._stats = {}
+
+    def _key_stats(self, key: tuple) -> dict:
+        return self._stats.setdefault(key, {
+            "client_hits": 0,
+            "requests": 0,
+            "new_connections": 0,
+        })
+
+    def _make_trace(self, key: tuple):
+        # httpcore reports every new TCP connection through the "trace" extension;
+        # requests that never trigger it were served from a kept-alive connection.
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                self._stats[key]["new_connections"] += 1
+        return trace
+
+    def _make_http_client(self, key: tuple) -> httpx.AsyncClient:
+        trace = self._make_trace(key)
+
+        async def on_request(request: httpx.Request):
+            self._stats[key]["requests"] += 1
+            request.extensions["trace"] = trace
+
+        return httpx.AsyncClient(
+            limits=self.limits,
+            timeout=c.llm_timeout,
+            event_hooks={"request": [on_request]},
+        )
+
+    def _create(self, provider: str, model: str, key: tuple):
+        if provider == "openai":
+            http_client = self._make_http_client(key)
+            self._http_clients[key] = http_client
+            # Retries are handled by utils.resilience, so the SDK's own retries are off.
+            return AsyncOpenAI(api_key=c.OPENAI_API_KEY, http_client=http_client, max_retries=0)
+        elif provider == "xai":
+            http_client = self._make_http_client(key)
+            self._http_clients[key] = http_client
+            return AsyncOpenAI(api_key=c.XAI_API_KEY, base_url=XAI_BASE_URL, http_client=http_client, max_retries=0)
+        elif provider == "gemini":
+            # The genai SDK manages its own HTTP session; keeping the client alive keeps that session alive.
+            # Callers use its native async surface (client.aio).
+            return genai.Client(api_key=c.GEMINI_API_KEY)
+        raise ValueError(f"Unknown API provider: {provider}")
+
+    def get(self, provider: str, model: str):
+        """Return the shared client for provider/model, creating it on first use."""
+        key = (provider, model)
+        with self._lock:
+            stats = self._key_stats(key)
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create(provider, model, key)
+                self._clients[key] = client
+            else:
+                stats["client_hits"] += 1
+            return client
+
+    def set(self, provider: str, model: str, client):
+        """Use client for provider/model, e.g. one pointed at a local stub server."""
+        key = (provider, model)
+        with self._lock:
+            self._key_stats(key)
+            self._clients[key] = client
+
+    def _open_connections(self, key: tuple):
+        http_client = self._http_clients.get(key)
+        if http_client is None:
+            return None
+        try:
+            return len(http_client._transport._pool.connections)
+        except AttributeError:
+            return None
+
+    def get_stats(self) -> dict:
+        """Return pool sizes and connection-reuse counters per provider/model."""
+        stats = {}
+        with self._lock:
+            for key, s in self._stats.items():
+                reused = max(0, s["requests"] - s["new_connections"])
+                stats[f"{key[0]}:{key[1]}"] = {
+                    **s,
+                    "reused_connections": reused,
+                    "open_connections": self._open_connections(key),
+                    "max_connections": self.limits.max_connections,
+                    "max_keepalive_connections": self.limits.max_keepalive_connections,
+                }
+        return stats
+
+    async def close(self):
+        """Close every pooled client. New clients are created lazily if used again."""
+        with self._lock:
+            clients = list(self._clients.items())
+            http_clients = list(self._http_clients.values())
+            self._clients.clear()
+            self._http_clients.clear()
+        for key, client in clients:
+            close = getattr(client, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"Error closing client for {key}: {e}")
+        for http_client in http_clients:
+            await http_client.aclose()
+
+
+client_registry = ClientRegistry()
@@ -0,0 +1,156 @@
+import itertools
+import re
+import zlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+import numpy as np
+from config_all.config_project import create_c
+
+c = create_c()
+
+_word_re = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be been by for from has have in is it its of on or that the their this to was "
+    "were which with will can also than into over about more most such these those they".split()
+)
+_suffix_re = re.compile(r"(?<=[a-z]{3})(?:ing|ed|es|s)$")
+_negation_re = re.compile(r"\b(?:not|no|never|none|nor|neither|cannot|without)\b|n't\b", re.IGNORECASE)
+_fact_re = re.compile(
+    r"\d+(?:[.,]\d+)*|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=200000)
+def _word_hash(word: str) -> int:
+    """crc32 of the word with a crude suffix strip, or -1 for stopwords. Vocabulary repeats, so this is memoised."""
+    if word in STOPWORDS:
+        return -1
+    return zlib.crc32(_suffix_re.sub("", word).encode("utf-8"))
+
+
+@lru_cache(maxsize=200000)
+def _merge_guard(text: str) -> Tuple[bool, FrozenSet[str]]:
+    """
+    Whether text is negated, and its numbers and months. Similar wording does not make two
+    learnings the same finding when only one is negated or their figures or dates differ.
+    """
+    return bool(_negation_re.search(text)), frozenset(match.lower()[:3] if match[0].isalpha() else match
+                                                      for match in _fact_re.findall(text))
+
+
+def _feature_hashes(text: str) -> List[int]:
+    """Hashed content words; word order is ignored, so reworded facts still match."""
+    return [h for h in map(_word_hash, _word_re.findall(text.lower())) if h >= 0]
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of content words with IDF weights fitted on the batch.
+    No model and no state, so it embeds thousands of learnings in milliseconds.
+    """
+
+    def __init__(self, dim: int = c.dedup_hashing_dim):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        features = [_feature_hashes(text) for text in texts]
+        counts = np.fromiter(map(len, features), dtype=np.int64, count=len(texts))
+        hashes = np.fromiter(itertools.chain.from_iterable(features), dtype=np.int64, count=int(counts.sum()))
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), counts)
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+        matrix = np.bincount(rows * self.dim + hashes % self.dim, weights=signs,
+                             minlength=len(texts) * self.dim).reshape(len(texts), self.dim).astype(np.float32)
+        # IDF fitted on this batch, so words shared by every learning carry little weight.
+        df = np.count_nonzero(matrix, axis=0)
+        matrix *= (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        return matrix
+
+
+class SentenceTransformerEmbedder:
+    """Local CPU embeddings via the optional sentence-transformers package."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(list(texts), batch_size=64, show_progress_bar=False), dtype=np.float32)
+
+
+@lru_cache(maxsize=None)
+def get_embedder(name: str = c.dedup_embedder):
+    """"hashing", or "sentence-transformers:<model>" when that package is installed."""
+    if name.startswith("sentence-transformers:"):
+        try:
+            return SentenceTransformerEmbedder(name.split(":", 1)[1])
+        except ImportError:
+            print("sentence-transformers is not installed; using hashing embeddings for deduplication")
+    return HashingEmbedder()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def near_duplicate_groups(texts: Sequence[str], threshold: float = c.dedup_similarity_threshold,
+                          embedder=None, block_size: int = 1024) -> List[int]:
+    """
+    For each text, the index of the text it duplicates (itself if it is kept).
+    A text joins the earliest kept text it is at least threshold cosine-similar to, so kept
+    texts are never chained through a third one and the earliest wording wins. Texts are never
+    merged when only one of them is negated or their numbers or dates differ.
+    """
+    n = len(texts)
+    if n < 2:
+        return list(range(n))
+    vectors = _normalize((embedder or get_embedder()).embed(texts))
+    guards = [_merge_guard(text) for text in texts]
+    # Candidate pairs (i < j) above threshold, computed in row blocks to bound memory.
+    earlier = [[] for _ in range(n)]
+    for start in range(0, n, block_size):
+        block = vectors[start:start + block_size] @ vectors.T
+        i, j = np.nonzero(block >= threshold)
+        i = i + start
+        mask = j > i
+        for a, b in zip(i[mask].tolist(), j[mask].tolist()):
+            if guards[a] == guards[b]:
+                earlier[b].append(a)
+
+    leader = list(range(n))
+    for index, candidates in enumerate(earlier):
+        for candidate in candidates:  # ascending, so the earliest kept text wins
+            if leader[candidate] == candidate:
+                leader[index] = candidate
+                break
+    return leader
+
+
+@dataclass
+class DedupResult:
+    learnings: List[str]
+    learning_sources: Dict[str, List[str]]
+    # Kept learning -> paraphrases folded into it.
+    merged: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def dedupe_learnings(learnings: Sequence[str], learning_sources: Optional[Dict[str, List[str]]] = None,
+                     threshold: float = c.dedup_similarity_threshold) -> DedupResult:
+    """
+    Drop exact and near-duplicate learnings, keeping the first wording in input order.
+    Sources of every merged paraphrase are added to the learning that was kept.
+    """
+    learning_sources = learning_sources or {}
+    unique = list(dict.fromkeys(learnings))
+    leader = near_duplicate_groups(unique, threshold)
+    kept, sources, merged = [], {}, {}
+    for index, text in enumerate(unique):
+        keep = unique[leader[index]]
+        if leader[index] == index:
+            kept.append(text)
+            sources[text] = list(learning_sources.get(text, []))
+        else:
+            merged.setdefault(keep, []).append(text)
+            sources[keep] = list(dict.fromkeys(sources[keep] + learning_sources.get(text, [])))
+    return DedupResult(kept, {text: urls for text, urls in sources.items() if urls}, merged)
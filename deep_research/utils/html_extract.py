@@ -0,0 +1,197 @@
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+
+# Elements whose content is never part of the article.
+SKIP_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "svg",
+             "iframe", "template", "button", "select", "canvas", "object", "head"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+             "param", "source", "track", "wbr"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "li", "pre", "blockquote", "td", "th",
+              "h1", "h2", "h3", "h4", "h5", "h6", "dd", "dt", "figcaption", "tr", "table", "ul", "ol"}
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+# class/id/role tokens that mark navigation, ads and other page chrome, matched at the start of
+# a whole token ("nav", "nav-links", "menu_top"), not inside words like "unavailable" or "shared".
+BOILERPLATE_RE = re.compile(
+    r"^(nav|navbar|navigation|menu|footer|sidebar|cookie|consent|banner|comments?|share|social|"
+    r"advert|promo|breadcrumbs?|popup|modal|subscribe|newsletter|related|recommend|masthead|toolbar)"
+    r"([-_]|$)",
+    re.IGNORECASE,
+)
+# Page wrappers often carry site-wide classes; marking them as chrome would skip the whole page.
+CONTAINER_TAGS = {"html", "body", "main", "article"}
+
+MIN_BLOCK_CHARS = 40
+MAX_LINK_DENSITY = 0.5
+
+_whitespace_re = re.compile(r"[ \t\r\f\v]+")
+_strip_re = re.compile(r"<(script|style|noscript|svg)\b.*?</\1\s*>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+
+
+@dataclass
+class ExtractedPage:
+    heading: str
+    markdown: str
+    confidence: float
+    text_chars: int
+
+
+@dataclass
+class _Block:
+    tag: str
+    text: str = ""
+    link_chars: int = 0
+
+
+def _is_boilerplate(attrs) -> bool:
+    attrs = dict(attrs)
+    tokens = f"{attrs.get('class') or ''} {attrs.get('id') or ''} {attrs.get('role') or ''}".split()
+    return any(BOILERPLATE_RE.match(token) for token in tokens)
+
+
+class _ContentParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks = []
+        self.title = ""
+        self._in_title = False
+        self._skip_depth = 0
+        self._stack = []
+        self._link_depth = 0
+        self._pre_depth = 0
+        self._current = _Block("p")
+
+    def _flush(self, tag: str = "p"):
+        if self._current.text.strip():
+            self.blocks.append(self._current)
+        self._current = _Block(tag)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "br" and not self._skip_depth:
+                self._current.text += "\n"
+            return
+        if tag == "title":
+            self._in_title = True
+        skip = self._skip_depth > 0 or tag in SKIP_TAGS or (tag not in CONTAINER_TAGS and _is_boilerplate(attrs))
+        self._stack.append((tag, skip))
+        if skip:
+            self._skip_depth += 1
+            return
+        if tag == "a":
+            self._link_depth += 1
+        elif tag == "pre":
+            self._pre_depth += 1
+        if tag in BLOCK_TAGS:
+            self._flush(tag)
+
+    def handle_endtag(self, tag):
+        # Pop up to the matching start tag; html.parser does not repair unclosed elements.
+        if not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        while self._stack:
+            open_tag, skip = self._stack.pop()
+            if open_tag == "title":
+                self._in_title = False
+            if skip:
+                self._skip_depth -= 1
+            elif open_tag == "a":
+                self._link_depth = max(0, self._link_depth - 1)
+            elif open_tag == "pre":
+                self._pre_depth = max(0, self._pre_depth - 1)
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS and not self._skip_depth:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip_depth:
+            return
+        if not self._pre_depth:
+            data = _whitespace_re.sub(" ", data.replace("\n", " "))
+        self._current.text += data
+        if self._link_depth:
+            self._current.link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def _to_markdown(block: _Block) -> str:
+    text = block.text if block.tag == "pre" else block.text.strip()
+    if block.tag in HEADING_TAGS:
+        return f"{'#' * HEADING_TAGS[block.tag]} {text}"
+    if block.tag == "li":
+        return f"- {text}"
+    if block.tag == "pre":
+        return f"```\n{text.strip(chr(10))}\n```"
+    if block.tag == "blockquote":
+        return f"> {text}"
+    return text
+
+
+def extract_main_content(html: str) -> ExtractedPage:
+    """
+    Readability-style extraction: drop page chrome, keep text-dense blocks and
+    render them as markdown. confidence (0-1) says how likely this is the article body.
+    """
+    parser = _ContentParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        return ExtractedPage("", "", 0.0, 0)
+
+    kept = []
+    heading = ""
+    total_chars = 0
+    link_chars = 0
+    paragraphs = 0
+    for block in parser.blocks:
+        text = block.text.strip()
+        if not text:
+            continue
+        if block.tag == "h1" and not heading:
+            heading = text
+            continue
+        link_density = block.link_chars / max(1, len(text))
+        if link_density > MAX_LINK_DENSITY:
+            continue
+        is_heading = block.tag in HEADING_TAGS
+        if not is_heading and block.tag not in ("li", "pre") and len(text) < MIN_BLOCK_CHARS:
+            continue
+        kept.append(block)
+        total_chars += len(text)
+        link_chars += block.link_chars
+        if not is_heading and len(text) >= MIN_BLOCK_CHARS * 2:
+            paragraphs += 1
+
+    # Headings left dangling at the end carry no content.
+    while kept and kept[-1].tag in HEADING_TAGS:
+        total_chars -= len(kept.pop().text.strip())
+
+    heading = heading or parser.title.strip()
+    parts = []
+    for i, block in enumerate(kept):
+        # Consecutive list items stay in one list.
+        if i and block.tag == "li" and kept[i - 1].tag == "li":
+            parts.append("\n")
+        elif i:
+            parts.append("\n\n")
+        parts.append(_to_markdown(block))
+    markdown = "".join(parts)
+    text_score = min(1.0, total_chars / 1500)
+    paragraph_score = min(1.0, paragraphs / 3)
+    link_penalty = link_chars / max(1, total_chars)
+    confidence = round(max(0.0, (0.6 * text_score + 0.4 * paragraph_score) * (1 - link_penalty)), 2)
+    return ExtractedPage(heading, markdown, confidence, total_chars)
+
+
+def strip_noise(html: str) -> str:
+    """Remove scripts, styles, SVG and comments, which never help an LLM extractor."""
+    return _strip_re.sub("", html)
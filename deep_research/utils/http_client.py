@@ -0,0 +1,158 @@
+import asyncio
+import importlib.util
+import ipaddress
+import os
+import urllib.request
+from typing import Dict, Optional
+import httpx
+from config_all.config_project import create_c
+
+c = create_c()
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that frees the per-host slot once the body is closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class ConnectionSlots:
+    """
+    Global and per-host caps on concurrent requests, shared by every transport of a client so
+    direct and proxied requests to the same host count against the same limits.
+    """
+
+    def __init__(self, max_connections: int = c.fetch_max_connections,
+                 max_per_host: int = c.fetch_max_connections_per_host):
+        self.max_per_host = max_per_host
+        self._global = asyncio.Semaphore(max_connections)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+
+    async def acquire(self, host: str):
+        """Wait for a slot for host; returns the function that frees it."""
+        semaphore = self._hosts.setdefault(host, asyncio.Semaphore(self.max_per_host))
+        await semaphore.acquire()
+        try:
+            await self._global.acquire()
+        except BaseException:
+            semaphore.release()
+            raise
+
+        def release():
+            self._global.release()
+            semaphore.release()
+        return release
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Holds a slot from ConnectionSlots for each request until its response body is closed."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, slots: ConnectionSlots):
+        self._transport = transport
+        self.slots = slots
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        release = await self.slots.acquire(request.url.host)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _no_proxy_pattern(host: str) -> str:
+    if "://" in host:
+        return host
+    try:
+        address = ipaddress.ip_address(host)
+        return f"all://[{host}]" if address.version == 6 else f"all://{host}"
+    except ValueError:
+        pass
+    return f"all://{host}" if host.lower() == "localhost" else f"all://*{host.lstrip('.')}"
+
+
+def proxy_mounts() -> Dict[str, Optional[str]]:
+    """
+    URL pattern -> proxy URL from HTTP_PROXY/HTTPS_PROXY/ALL_PROXY, with None for NO_PROXY hosts.
+    httpx only reads these itself when the client builds its own transport.
+    """
+    proxies = urllib.request.getproxies()
+    no_proxy = proxies.pop("no", "") or os.environ.get("NO_PROXY", os.environ.get("no_proxy", ""))
+    mounts = {f"{scheme}://": url for scheme, url in proxies.items() if scheme in ("http", "https", "all") and url}
+    hosts = [host.strip() for host in no_proxy.split(",") if host.strip()]
+    if "*" in hosts:
+        return {}
+    mounts.update({_no_proxy_pattern(host): None for host in hosts})
+    return mounts
+
+
+def build_http_client(max_connections: int = c.fetch_max_connections,
+                      max_per_host: int = c.fetch_max_connections_per_host, **kwargs) -> httpx.AsyncClient:
+    """
+    Tuned AsyncClient for outbound fetching: keep-alive, HTTP/2 when h2 is installed, global and
+    per-host connection caps and separate connect/read timeouts. Proxies from the environment
+    are honoured as with a default client.
+    """
+    http2 = c.fetch_http2 and importlib.util.find_spec("h2") is not None
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(max_connections, c.fetch_max_keepalive_connections),
+        keepalive_expiry=c.fetch_keepalive_expiry,
+    )
+
+    # One set of slots for all mounts: each mount has its own connection pool, so the caps are kept here.
+    slots = ConnectionSlots(max_connections, max_per_host)
+
+    def transport(proxy: Optional[str] = None) -> httpx.AsyncBaseTransport:
+        return HostLimitedTransport(httpx.AsyncHTTPTransport(http2=http2, limits=limits, proxy=proxy), slots)
+
+    # NO_PROXY patterns map to None, which routes them through the direct transport.
+    mounts = {pattern: transport(proxy) if proxy else None for pattern, proxy in proxy_mounts().items()}
+    timeout = httpx.Timeout(c.fetch_read_timeout, connect=c.fetch_connect_timeout, pool=c.fetch_total_timeout)
+    return httpx.AsyncClient(transport=transport(), mounts=mounts, timeout=timeout, follow_redirects=True, **kwargs)
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The process-wide outbound client, created on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = build_http_client()
+    return _http_client
+
+
+def set_http_client(client: Optional[httpx.AsyncClient]):
+    """Replace the shared client, e.g. with one pointed at a local stub server."""
+    global _http_client
+    _http_client = client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def fetch(method: str, url: str, total_timeout: float = c.fetch_total_timeout, **kwargs) -> httpx.Response:
+    """Request through the shared client with an overall deadline on top of the per-phase timeouts."""
+    return await asyncio.wait_for(get_http_client().request(method, url, **kwargs), timeout=total_timeout)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+from pydantic import TypeAdapter
+from config_all.config_project import create_c
+
+c = create_c()
+
+# system_prompt() embeds datetime.now().isoformat(), which would make every key unique.
+_timestamp_re = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?")
+
+
+@dataclass
+class CachedResponse:
+    """Stand-in for an SDK response rebuilt from the cache; exposes the attributes callers read."""
+    parsed: Any = None
+    text: Optional[str] = None
+
+    @property
+    def content(self) -> Optional[str]:
+        return self.text
+
+
+def normalize_system_instruction(system_instruction: str) -> str:
+    return _timestamp_re.sub("<timestamp>", system_instruction or "")
+
+
+def _schema_repr(schema) -> str:
+    if schema is None:
+        return ""
+    try:
+        return json.dumps(TypeAdapter(schema).json_schema(), sort_keys=True)
+    except Exception:
+        return repr(schema)
+
+
+def make_key(provider: str, model: str, system_instruction: str, prompt: str, schema=None, messages=None) -> str:
+    payload = json.dumps([
+        provider,
+        model,
+        normalize_system_instruction(system_instruction),
+        prompt,
+        _schema_repr(schema),
+        messages,
+    ], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class LLMCache:
+    """
+    Content-addressed SQLite cache of LLM responses with TTL and size-bounded LRU eviction.
+    Only the parsed payload and text are stored; hits come back as CachedResponse.
+    """
+
+    def __init__(self, path: Optional[str] = c.llm_cache_path, ttl: float = c.llm_cache_ttl,
+                 max_entries: int = c.llm_cache_max_entries, max_bytes: int = c.llm_cache_max_bytes):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+            self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def get(self, key: str, schema=None) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        value = json.loads(row[0])
+        parsed = value.get("parsed")
+        if parsed is not None and schema is not None:
+            parsed = TypeAdapter(schema).validate_python(parsed)
+        return CachedResponse(parsed=parsed, text=value.get("text"))
+
+    def put(self, key: str, response, schema=None):
+        """Store response unless it failed to parse; errors are never cached."""
+        if not self.enabled:
+            return
+        parsed = getattr(response, "parsed", None)
+        if schema is not None and parsed is None:
+            return
+        text = getattr(response, "text", None) or getattr(response, "content", None)
+        try:
+            value = json.dumps({
+                "parsed": TypeAdapter(schema).dump_python(parsed, mode="json") if schema is not None else None,
+                "text": text if isinstance(text, str) else None,
+            })
+        except Exception as e:
+            print(f"Could not serialise LLM response for caching: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self.writes += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        while count > self.max_entries or size > self.max_bytes:
+            # Drop least recently used entries; over the byte limit, a tenth of the table at a time.
+            excess = max(1, count - self.max_entries, count // 10 if size > self.max_bytes else 0)
+            cur = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += cur.rowcount
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+
+    def get_stats(self) -> dict:
+        stats = {"enabled": self.enabled, "hits": self.hits, "misses": self.misses,
+                 "writes": self.writes, "evictions": self.evictions}
+        if self.enabled:
+            with self._lock:
+                count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            stats.update({"entries": count, "bytes": size})
+        return stats
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+llm_cache = LLMCache()
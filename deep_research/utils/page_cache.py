@@ -0,0 +1,139 @@
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+from config_all.config_project import create_c
+from .urls import normalize_url, url_domain
+
+c = create_c()
+
+
+@dataclass
+class CachedPage:
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+def freshness_for(url: str, policy: dict = c.page_cache_freshness) -> float:
+    """Freshness lifetime for url's domain; the longest matching domain suffix wins."""
+    domain = url_domain(url)
+    while domain:
+        if domain in policy:
+            return policy[domain]
+        if "." not in domain:
+            break
+        domain = domain.split(".", 1)[1]
+    return policy.get("default", 0)
+
+
+class PageCache:
+    """
+    Persistent store of fetched pages keyed by normalised URL.
+    Bodies are zlib-compressed and kept with their ETag and Last-Modified validators,
+    so stale pages can be revalidated with a conditional GET instead of re-downloaded.
+    """
+
+    def __init__(self, path: Optional[str] = c.page_cache_path, max_age: float = c.page_cache_max_age):
+        self.path = path
+        self.max_age = max_age
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT, "
+                "fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        if not self.enabled:
+            return None
+        key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM pages WHERE url = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        page = CachedPage(key, zlib.decompress(row[0]).decode("utf-8"), row[1], row[2], row[3])
+        if page.age > self.max_age:
+            return None
+        return page
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return page.age <= freshness_for(page.url)
+
+    def conditional_headers(self, page: Optional[CachedPage]) -> dict:
+        """Validators to send with a revalidation request."""
+        headers = {}
+        if page is None:
+            return headers
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def serve(self, page: CachedPage) -> str:
+        """Return a fresh page's body without touching the network."""
+        self.hits += 1
+        self.bytes_saved += len(page.body)
+        return page.body
+
+    def put(self, url: str, body: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        if not self.enabled:
+            return
+        self.misses += 1
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, body, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (normalize_url(url), zlib.compress(body.encode("utf-8"), 6), etag, last_modified, time.time()),
+            )
+            self._conn.commit()
+
+    def touch(self, page: CachedPage) -> str:
+        """Mark a page as just revalidated (304 Not Modified) and return its body."""
+        self.revalidated += 1
+        self.bytes_saved += len(page.body)
+        with self._lock:
+            self._conn.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), page.url))
+            self._conn.commit()
+        return page.body
+
+    def get_stats(self) -> dict:
+        stats = {"enabled": self.enabled, "hits": self.hits, "revalidated": self.revalidated,
+                 "misses": self.misses, "bytes_saved": self.bytes_saved}
+        if self.enabled:
+            with self._lock:
+                count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM pages").fetchone()
+            stats.update({"pages": count, "compressed_bytes": size})
+        return stats
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+page_cache = PageCache()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from config_all.config_project import create_c
+from .checkpoint import RunInProgress
+from .scheduler import current_branch
+
+c = create_c()
+
+
+class ProgressBus:
+    """
+    Progress events of one research run, fanned out to any number of subscribers.
+    The last max_events events are kept, so a subscriber that reconnects with the ID of
+    the last event it saw resumes where it stopped instead of missing events.
+    """
+
+    def __init__(self, run_id: str, max_events: int = c.progress_replay_events):
+        self.run_id = run_id
+        self.events: deque = deque(maxlen=max_events)
+        self.last_id = 0
+        self.closed_at: Optional[float] = None
+        self._listeners: List[Callable[[dict], None]] = []
+        self._changed = asyncio.Event()
+
+    @property
+    def closed(self) -> bool:
+        return self.closed_at is not None
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Call listener synchronously with every event published from now on."""
+        self._listeners.append(listener)
+
+    def publish(self, event_type: str, data) -> int:
+        if self.closed:
+            return self.last_id
+        self.last_id += 1
+        event = {"type": event_type, "data": data}
+        self.events.append((self.last_id, event))
+        for listener in self._listeners:
+            listener(event)
+        self._wake()
+        return self.last_id
+
+    def close(self):
+        """No more events; subscribers stop once they have read the buffered ones."""
+        if not self.closed:
+            self.closed_at = time.time()
+            self._wake()
+
+    def close_when_done(self, task: asyncio.Future):
+        task.add_done_callback(lambda _: self.close())
+
+    def _wake(self):
+        # Every waiting subscriber holds the old event; the next wait gets a fresh one.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, after: Optional[str] = None,
+                        heartbeat: float = c.sse_heartbeat_seconds) -> AsyncIterator[Optional[Tuple[int, dict]]]:
+        """
+        (event ID, event) for every event after the event ID after, until the bus is closed.
+        Yields None when heartbeat seconds pass without an event, so the caller can keep its
+        connection alive. Events that already left the buffer are skipped.
+        """
+        last_seen = int(after) if after and after.isdigit() else 0
+        while True:
+            changed = self._changed
+            pending = [(event_id, event) for event_id, event in self.events if event_id > last_seen]
+            for event_id, event in pending:
+                last_seen = event_id
+                yield event_id, event
+            if pending:
+                continue
+            if self.closed:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+
+class ProgressBusRegistry:
+    """Buses of running and recently finished runs by run ID, for subscribers that attach later."""
+
+    def __init__(self, linger: float = c.progress_bus_linger):
+        self.linger = linger
+        self._buses: Dict[str, ProgressBus] = {}
+
+    def _prune(self):
+        cutoff = time.time() - self.linger
+        for run_id in [run_id for run_id, bus in self._buses.items() if bus.closed and bus.closed_at < cutoff]:
+            del self._buses[run_id]
+
+    def create(self, run_id: str) -> ProgressBus:
+        """A new bus for run_id; an open bus is never replaced, as that would cut off its subscribers."""
+        self._prune()
+        existing = self._buses.get(run_id)
+        if existing is not None and not existing.closed:
+            raise RunInProgress(f"Research run {run_id} is still running")
+        bus = self._buses[run_id] = ProgressBus(run_id)
+        return bus
+
+    def get(self, run_id: str) -> Optional[ProgressBus]:
+        self._prune()
+        return self._buses.get(run_id)
+
+    def is_open(self, run_id: str) -> bool:
+        bus = self._buses.get(run_id)
+        return bus is not None and not bus.closed
+
+    def get_stats(self) -> dict:
+        return {"buses": len(self._buses), "open": sum(not bus.closed for bus in self._buses.values())}
+
+
+progress_buses = ProgressBusRegistry()
+
+current_progress_bus: ContextVar[Optional[ProgressBus]] = ContextVar("current_progress_bus", default=None)
+
+
+def publish_progress(event_type: str, **data):
+    """Publish an event to the active run's bus, tagged with the current branch; a no-op outside a run."""
+    bus = current_progress_bus.get()
+    if bus is None:
+        return
+    branch = current_branch.get()
+    bus.publish(event_type, {"branch": branch.path, "depth": branch.level, **data})
+
+
+def format_sse(item: Optional[Tuple[int, dict]]) -> str:
+    """One (event ID, event) as a server-sent event; None is a comment line that keeps the connection alive."""
+    if item is None:
+        return ": heartbeat\n\n"
+    event_id, event = item
+    return f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
@@ -1,27 +1,160 @@
 # deep_research/utils/progress_tracker.py
 
 import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from .scheduler import Branch, current_branch
+
+# Step kinds: generating a level's SERP queries, and per query node its search,
+# page fetches, page extractions and the synthesis of learnings.
+NODE_STEPS = ("search", "fetch", "extract", "synthesis")
+STEP_KINDS = ("plan",) + NODE_STEPS
+
+# Steps per query node and seconds per step assumed until real ones are measured.
+PRIOR_STEPS_PER_NODE = {"search": 1, "fetch": 10, "extract": 10, "synthesis": 1}
+PRIOR_STEP_SECONDS = {"plan": 5.0, "search": 1.0, "fetch": 2.0, "extract": 0.5, "synthesis": 8.0}
+
+
+def subtree_size(breadth: int, depth: int) -> Tuple[int, int]:
+    """(levels, query nodes) of a research level with breadth queries and depth levels left, as deep_research expands it."""
+    if depth <= 1:
+        return 1, breadth
+    levels, nodes = subtree_size(max(1, breadth // 2), depth - 1)
+    return 1 + breadth * levels, breadth + breadth * nodes
+
 
 class ProgressTracker:
-    def __init__(self, total: int):
-        self.total = total              # estimated total number of tasks
-        self.completed = 0              # tasks completed so far
-        self.start_time = time.time()   # timestamp when tracking began
+    """
+    Progress of a research run in steps of every kind, with an ETA from measured step costs.
+
+    The expected tree starts from breadth and depth and is revised as it grows: when a level
+    generates fewer queries than asked for, or a branch fails before expanding. Steps per query
+    node and seconds per step are averaged over what has completed so far, and the run's
+    parallelism is measured as step-seconds per wall-second, so the ETA follows the real mix of
+    fast searches and slow LLM calls. The ETA is smoothed so it does not jump on every update.
+    """
+
+    def __init__(self, breadth: int, depth: int, smoothing: float = 0.3):
+        self.start_time = time.time()       # timestamp when tracking began
+        self.smoothing = smoothing
+        self.expected_levels, self.expected_nodes = subtree_size(breadth, depth)
+        self.finished_nodes = 0
+        self.measured_nodes = 0             # finished nodes whose steps ran in this run (not replayed)
+        self.steps = Counter()              # steps done per kind
+        self.step_seconds = Counter()       # measured seconds per kind
+        self.finished_node_steps = Counter()
+        self._node_steps: Dict[str, Counter] = defaultdict(Counter)
+        self._eta: Optional[float] = None
+        self._eta_at = self.start_time
+
+    @property
+    def completed(self) -> int:
+        return self.finished_nodes
+
+    @property
+    def total(self) -> int:
+        return max(self.expected_nodes, self.finished_nodes)
+
+    def record_step(self, kind: str, seconds: float, branch: Branch):
+        self.steps[kind] += 1
+        self.step_seconds[kind] += seconds
+        if kind in NODE_STEPS:
+            self._node_steps[branch.path][kind] += 1
+
+    def level_planned(self, breadth: int, depth: int, queries: int):
+        """A level asked for breadth queries got queries of them; revise the expected tree."""
+        child_levels, child_nodes = subtree_size(max(1, breadth // 2), depth - 1) if depth > 1 else (0, 0)
+        missing = breadth - queries
+        self.expected_nodes -= missing * (1 + child_nodes)
+        self.expected_levels -= missing * child_levels
 
-    def update(self, count: int = 1):
-        """Increment the count of completed tasks."""
-        self.completed += count
+    def branch_stopped(self, breadth: int, depth: int):
+        """A node will not expand the level of breadth queries and depth expected below it."""
+        levels, nodes = subtree_size(breadth, depth)
+        self.expected_levels -= levels
+        self.expected_nodes -= nodes
+
+    def branch_added(self, breadth: int, depth: int):
+        """A node will expand a level of breadth queries and depth that was not expected below it."""
+        levels, nodes = subtree_size(breadth, depth)
+        self.expected_levels += levels
+        self.expected_nodes += nodes
+
+    def node_finished(self, branch: Branch, replayed: bool = False):
+        self.finished_nodes += 1
+        steps = self._node_steps.pop(branch.path, Counter())
+        if not replayed:
+            self.measured_nodes += 1
+            self.finished_node_steps.update(steps)
+
+    def _avg_seconds(self, kind: str) -> float:
+        return self.step_seconds[kind] / self.steps[kind] if self.steps[kind] else PRIOR_STEP_SECONDS[kind]
+
+    def _expected_steps(self) -> Dict[str, float]:
+        nodes = max(self.expected_nodes, self.finished_nodes)
+        expected = {"plan": max(self.expected_levels, self.steps["plan"])}
+        for kind in NODE_STEPS:
+            per_node = (self.finished_node_steps[kind] / self.measured_nodes if self.measured_nodes
+                        else PRIOR_STEPS_PER_NODE[kind])
+            # Steps of unfinished nodes already done count toward their share.
+            in_flight = self.steps[kind] - self.finished_node_steps[kind]
+            remaining = max(0.0, (nodes - self.finished_nodes) * per_node - in_flight)
+            expected[kind] = self.steps[kind] + remaining
+        return expected
 
     def get_progress(self):
-        """Return a dict with percentage complete, elapsed time, and estimated remaining time."""
-        elapsed = time.time() - self.start_time
-        percent = (self.completed / self.total) * 100 if self.total > 0 else 100
-        estimated_total = (elapsed / self.completed * self.total) if self.completed > 0 else 0
-        remaining = estimated_total - elapsed if self.completed > 0 else 0
+        """Return a dict with percentage complete, elapsed time, smoothed remaining time, per-step counts and throughput."""
+        now = time.time()
+        elapsed = now - self.start_time
+        expected = self._expected_steps()
+        costs = {kind: self._avg_seconds(kind) for kind in STEP_KINDS}
+        done_work = sum(self.steps[kind] * costs[kind] for kind in STEP_KINDS)
+        remaining_work = sum(max(0.0, expected[kind] - self.steps[kind]) * costs[kind] for kind in STEP_KINDS)
+        # Step-seconds completed per wall-second: how many steps effectively run at once.
+        measured = sum(self.step_seconds.values())
+        parallelism = max(1.0, measured / elapsed) if elapsed > 0 else 1.0
+
+        raw_eta = remaining_work / parallelism
+        if self._eta is None:
+            self._eta = raw_eta
+        else:
+            predicted = max(0.0, self._eta - (now - self._eta_at))
+            self._eta = predicted + self.smoothing * (raw_eta - predicted)
+        self._eta_at = now
+        if remaining_work == 0:
+            self._eta = 0.0
+
+        total_work = done_work + remaining_work
+        percent = (done_work / total_work) * 100 if total_work > 0 else 100
+        minutes = elapsed / 60 if elapsed > 0 else 0
         return {
             "completed": self.completed,
             "total": self.total,
             "percentage": round(percent, 2),
             "elapsed": round(elapsed, 2),
-            "remaining": round(remaining, 2),
+            "remaining": round(self._eta, 2),
+            "steps": {
+                kind: {
+                    "done": self.steps[kind],
+                    "expected": round(expected[kind]),
+                    "avg_seconds": round(costs[kind], 3),
+                }
+                for kind in STEP_KINDS
+            },
+            "throughput": {
+                "steps_per_minute": round(sum(self.steps.values()) / minutes, 1) if minutes else 0.0,
+                "queries_per_minute": round(self.finished_nodes / minutes, 2) if minutes else 0.0,
+                "parallelism": round(parallelism, 2),
+            },
         }
+
+
+current_tracker: ContextVar[Optional[ProgressTracker]] = ContextVar("current_tracker", default=None)
+
+
+def track_step(kind: str, seconds: float):
+    """Record a completed step with the active run's tracker; a no-op outside a tracked run."""
+    tracker = current_tracker.get()
+    if tracker is not None:
+        tracker.record_step(kind, seconds, current_branch.get())
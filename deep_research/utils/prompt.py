@@ -1,9 +1,13 @@
 from datetime import datetime
 
 
-def system_prompt() -> str:
-    """Creates the system prompt with current timestamp."""
-    now = datetime.now().isoformat()
+def system_prompt(with_time: bool = True) -> str:
+    """
+    Creates the system prompt with current timestamp.
+    with_time=False only states the date, so the prompt stays byte-identical across calls
+    and can open a prefix that providers cache.
+    """
+    now = datetime.now().isoformat() if with_time else datetime.now().date().isoformat()
     return f"""You are an expert researcher. Today is {now}. Follow these instructions when responding:
     - You may be asked to research subjects that is after your knowledge cutoff, assume the user is right when presented with news.
     - The user is a highly experienced analyst, no need to simplify it, be as detailed as possible and make sure your response is correct.
@@ -1,18 +1,149 @@
 import asyncio
 import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from config_all.config_project import create_c
 
-class RateLimiter:
-    def __init__(self, interval: float):
-        self.interval = interval
-        self.lock = asyncio.Lock()
-        self.last_called = 0.0
-
-    async def wait(self):
-        async with self.lock:
-            now = time.monotonic()
-            wait_time = self.interval - (now - self.last_called)
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-            self.last_called = time.monotonic()
-
-global_rate_limiter = RateLimiter(2)
+c = create_c()
+
+
+class TokenBucket:
+    """
+    Token bucket that refills at rate tokens per second up to capacity.
+    Callers reserve tokens up front and sleep off any deficit, so no lock is held while waiting
+    and a large cost (e.g. a long prompt) simply waits longer.
+    On 429 the rate is halved and the bucket blocked until Retry-After; it recovers on success.
+    """
+
+    def __init__(self, rate: float, capacity: float, min_rate_fraction: float = 0.1):
+        self.base_rate = rate
+        self.rate = rate
+        self.min_rate = rate * min_rate_fraction
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        self.rate_limited = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost: float = 1.0) -> float:
+        """Take cost tokens, sleeping until they are available. Returns the seconds waited."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= cost
+        wait = max(self.blocked_until - now, -self.tokens / self.rate if self.tokens < 0 else 0.0)
+        self.acquired += 1
+        if wait > 0:
+            self.waited += 1
+            self.wait_seconds += wait
+            self.max_wait = max(self.max_wait, wait)
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        now = time.monotonic()
+        self._refill(now)
+        self.rate_limited += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+        self.blocked_until = max(self.blocked_until, now + (retry_after if retry_after is not None else 1 / self.rate))
+
+    def on_success(self):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+    def get_stats(self) -> dict:
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "max_wait": round(self.max_wait, 3),
+            "rate_limited": self.rate_limited,
+        }
+
+
+class RateLimiterRegistry:
+    """Token buckets per key (search API, LLM provider/model, scraped domain), configured in c.rate_limits."""
+
+    def __init__(self, limits: Dict[str, dict] = c.rate_limits):
+        self.limits = limits
+        self._buckets = {}
+
+    def _config_for(self, key: str) -> Optional[dict]:
+        candidate = key
+        while True:
+            if candidate in self.limits:
+                return self.limits[candidate]
+            if ":" not in candidate:
+                return self.limits.get("default")
+            candidate = candidate.rsplit(":", 1)[0]
+
+    def bucket(self, key: str) -> Optional[TokenBucket]:
+        """The bucket for key, or None when the key is not rate limited."""
+        if key not in self._buckets:
+            config = self._config_for(key)
+            self._buckets[key] = TokenBucket(config["per_minute"] / 60, config["burst"]) if config else None
+        return self._buckets[key]
+
+    async def acquire(self, key: str, cost: float = 1.0) -> float:
+        bucket = self.bucket(key)
+        if bucket is None:
+            return 0.0
+        waited = await bucket.acquire(cost)
+        if waited > 1:
+            print(f"Rate limiter '{key}' delayed a call by {waited:.2f}s")
+        return waited
+
+    def on_rate_limited(self, key: str, retry_after: Optional[float] = None):
+        bucket = self.bucket(key)
+        if bucket is not None:
+            bucket.on_rate_limited(retry_after)
+
+    def on_success(self, key: str):
+        bucket = self.bucket(key)
+        if bucket is not None:
+            bucket.on_success()
+
+    def get_stats(self) -> dict:
+        return {key: bucket.get_stats() for key, bucket in self._buckets.items() if bucket is not None}
+
+
+def error_status(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an httpx, OpenAI or genai exception, if any."""
+    response = getattr(exc, "response", None)
+    for value in (getattr(exc, "status_code", None), getattr(exc, "code", None),
+                  getattr(response, "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def retry_after_seconds(source) -> Optional[float]:
+    """
+    Seconds from the Retry-After header of an HTTP response, or of the response attached
+    to an exception, in either delta-seconds or HTTP-date form.
+    """
+    response = getattr(source, "response", source)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+rate_limiters = RateLimiterRegistry()
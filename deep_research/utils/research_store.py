@@ -0,0 +1,100 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from .scheduler import Branch
+
+
+@dataclass(frozen=True)
+class LearningEntry:
+    text: str
+    depth: int
+    branch: str
+    source_urls: Tuple[str, ...]
+    timestamp: float
+
+
+@dataclass(frozen=True)
+class UrlEntry:
+    url: str
+    depth: int
+    branch: str
+    timestamp: float
+
+
+@dataclass(frozen=True)
+class BranchView:
+    """
+    What one node of the research tree has seen: its parent's view plus the entries the node
+    appended itself, held as offset ranges into the store. Creating a child view is O(1);
+    the lists are only materialised when a prompt needs them.
+    """
+    store: "ResearchStore"
+    parent: Optional["BranchView"] = None
+    learnings_range: Tuple[int, int] = (0, 0)
+    urls_range: Tuple[int, int] = (0, 0)
+
+    def _chain(self) -> List["BranchView"]:
+        chain, view = [], self
+        while view is not None:
+            chain.append(view)
+            view = view.parent
+        return chain[::-1]
+
+    def learning_entries(self) -> List[LearningEntry]:
+        return [entry for view in self._chain() for entry in self.store.learnings[slice(*view.learnings_range)]]
+
+    def learnings(self) -> List[str]:
+        return [entry.text for entry in self.learning_entries()]
+
+    def urls(self) -> List[str]:
+        return [entry.url for view in self._chain() for entry in self.store.urls[slice(*view.urls_range)]]
+
+
+class ResearchStore:
+    """
+    Append-only learnings and URLs of one research run. Each node appends its entries in one
+    call, so they are contiguous and a branch is a chain of offset ranges instead of a copied list.
+    """
+
+    def __init__(self):
+        self.learnings: List[LearningEntry] = []
+        self.urls: List[UrlEntry] = []
+
+    def root(self, learnings: Iterable[str] = (), urls: Iterable[str] = (),
+             learning_sources: Optional[Dict[str, List[str]]] = None) -> BranchView:
+        """View of the run's starting point, seeded with learnings and URLs from earlier research."""
+        return self.extend(BranchView(self), Branch(), learnings, urls, learning_sources)
+
+    def extend(self, parent: BranchView, branch: Branch, learnings: Iterable[str] = (), urls: Iterable[str] = (),
+               learning_sources: Optional[Dict[str, List[str]]] = None, source_urls: Sequence[str] = ()) -> BranchView:
+        """Append a node's entries and return its view. source_urls applies to learnings without their own sources."""
+        learning_sources = learning_sources or {}
+        now = time.time()
+        learnings_start, urls_start = len(self.learnings), len(self.urls)
+        self.learnings.extend(
+            LearningEntry(text, branch.level, branch.path, tuple(learning_sources.get(text, source_urls)), now)
+            for text in learnings
+        )
+        self.urls.extend(UrlEntry(url, branch.level, branch.path, now) for url in urls)
+        return BranchView(self, parent, (learnings_start, len(self.learnings)), (urls_start, len(self.urls)))
+
+    def result(self) -> Dict:
+        """learnings, visited_urls and learning_sources of the whole run, built in one pass over the entries."""
+        learnings, sources = {}, {}
+        for entry in self.learnings:
+            learnings.setdefault(entry.text, None)
+            if entry.source_urls:
+                sources[entry.text] = list(dict.fromkeys(sources.get(entry.text, []) + list(entry.source_urls)))
+        return {
+            "learnings": list(learnings),
+            "visited_urls": list(dict.fromkeys(entry.url for entry in self.urls)),
+            "learning_sources": sources,
+        }
+
+    def get_stats(self) -> dict:
+        return {"learnings": len(self.learnings), "urls": len(self.urls),
+                "max_depth": max((entry.depth for entry in self.learnings), default=0)}
+
+
+current_research_store: ContextVar[Optional[ResearchStore]] = ContextVar("current_research_store", default=None)
@@ -0,0 +1,182 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from typing import AsyncContextManager, Awaitable, Callable, Optional, TypeVar
+import httpx
+import openai
+from config_all.config_project import create_c
+from .rate_limiter import error_status, retry_after_seconds
+
+c = create_c()
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = (httpx.TransportError, openai.APIConnectionError, asyncio.TimeoutError, ConnectionError)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while its circuit breaker is open."""
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The call's overall deadline ran out, including retries and backoff."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Transient errors worth retrying: timeouts, connection failures, 429 and 5xx responses."""
+    if isinstance(exc, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    status = error_status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(exc, RETRYABLE_ERRORS)
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = c.retry_max_attempts
+    base_delay: float = c.retry_base_delay
+    max_delay: float = c.retry_max_delay
+    deadline: Optional[float] = None
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive transient failures and rejects calls for reset_timeout.
+    Then a single probe call is let through: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = c.breaker_failure_threshold,
+                 reset_timeout: float = c.breaker_reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuit open, retry in {self.reset_timeout - (time.monotonic() - self.opened_at):.1f}s")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError("Circuit half-open, probe in flight")
+            self._probing = True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call ended without telling us anything about the provider (e.g. a 400)."""
+        self._probing = False
+
+    def get_stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures,
+                "times_opened": self.times_opened, "rejected": self.rejected}
+
+
+class Resilience:
+    """Circuit breakers and retry counters per provider key ("brave", "gemini", "openai", ...)."""
+
+    def __init__(self):
+        self._breakers = {}
+        self.stats = defaultdict(lambda: {"calls": 0, "retries": 0, "failures": 0, "deadline_exceeded": 0})
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker()
+        return self._breakers[key]
+
+    async def call(self, key: str, fn: Callable[[], Awaitable[T]], policy: RetryPolicy = None,
+                   queue: Optional[Callable[[], AsyncContextManager]] = None) -> T:
+        """
+        Run fn with retries for transient errors, within policy.deadline overall.
+        Non-retryable errors are raised at once, and nothing is attempted while key's circuit is open.
+
+        queue is entered around every attempt, for local waits such as scheduler slots and rate
+        limits. Time spent waiting to enter it does not count toward the deadline, so contention
+        in this process is never mistaken for a slow provider.
+        """
+        policy = policy or RetryPolicy()
+        breaker = self.breaker(key)
+        stats = self.stats[key]
+        stats["calls"] += 1
+        deadline_at = None
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                async with AsyncExitStack() as stack:
+                    queued_at = time.monotonic()
+                    if queue is not None:
+                        await stack.enter_async_context(queue())
+                    if policy.deadline:
+                        deadline_at = (deadline_at or queued_at + policy.deadline) + time.monotonic() - queued_at
+                    remaining = deadline_at - time.monotonic() if deadline_at else None
+                    if remaining is None:
+                        result = await fn()
+                    elif remaining <= 0:
+                        raise DeadlineExceeded()
+                    else:
+                        result = await asyncio.wait_for(fn(), remaining)
+            except Exception as e:
+                if deadline_at and time.monotonic() >= deadline_at and not isinstance(e, DeadlineExceeded):
+                    e = DeadlineExceeded(f"{key} call exceeded its {policy.deadline:g}s deadline")
+                retryable = is_retryable(e) or isinstance(e, DeadlineExceeded)
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                attempt += 1
+                delay = policy.backoff(attempt)
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                out_of_time = deadline_at is not None and time.monotonic() + delay >= deadline_at
+                if isinstance(e, DeadlineExceeded) or not retryable or attempt >= policy.max_attempts or out_of_time:
+                    stats["failures"] += 1
+                    if isinstance(e, DeadlineExceeded):
+                        stats["deadline_exceeded"] += 1
+                        raise e from None
+                    raise
+                stats["retries"] += 1
+                print(f"Retrying {key} call in {delay:.2f}s (attempt {attempt + 1}/{policy.max_attempts}) after: {e}")
+                await asyncio.sleep(delay)
+            except BaseException:
+                # A cancelled call says nothing about the provider, but must not keep holding the probe.
+                breaker.release()
+                raise
+            else:
+                breaker.record_success()
+                return result
+
+    def get_stats(self) -> dict:
+        return {key: {**self.stats[key], "breaker": breaker.get_stats()} for key, breaker in self._breakers.items()}
+
+
+resilience = Resilience()
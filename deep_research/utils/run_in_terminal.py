@@ -3,12 +3,15 @@ from deep_research.utils.logger import Tee
 
 import asyncio
 import typer
+from typing import Optional
 from functools import wraps
 from prompt_toolkit import PromptSession
 
 from deep_research.deep_research import deep_research
 from deep_research.report_writer import write_final_report
 from deep_research.follow_up import generate_follow_up
+from deep_research.utils.checkpoint import checkpoint_store, new_run_id
+from deep_research.utils.budget import ResearchBudget
 
 # Redirect all prints to terminal and log file.
 log_file = open("execution_log.txt", "w")
@@ -31,13 +34,8 @@ async def async_prompt(message: str, default: str = "") -> str:
     return await session.prompt_async(message)
 
 
-@app.command()
-@coro
-async def main(
-    concurrency: int = typer.Option(
-        default=2, help="Number of concurrent tasks, depending on your API rate limits."
-    ),
-):
+async def collect_research_inputs():
+    """Ask for the query, breadth, depth and answers to the follow-up questions."""
     # Get initial inputs with clear formatting
     query = await async_prompt("\nWhat would you like to research? ")
     print()
@@ -69,6 +67,51 @@ async def main(
     Follow-up Questions and Answers:
     {chr(10).join(f"Q: {q} A: {a}" for q, a in zip(follow_up_questions, answers))}
     """
+    return combined_query, breadth, depth
+
+
+def print_progress(progress: dict):
+    throughput = progress["throughput"]
+    print(f"Progress: {progress['percentage']}% | {progress['completed']}/{progress['total']} queries | "
+          f"ETA {progress['remaining']:.0f}s | {throughput['steps_per_minute']} steps/min, "
+          f"{throughput['parallelism']}x parallel")
+
+
+@app.command()
+@coro
+async def main(
+    concurrency: int = typer.Option(
+        default=2, help="Number of concurrent tasks, depending on your API rate limits."
+    ),
+    resume: Optional[str] = typer.Option(
+        default=None, help="Run ID of an interrupted research run to resume from its last completed nodes."
+    ),
+    max_minutes: Optional[float] = typer.Option(
+        default=None, help="Wall-time budget for the research; low-novelty branches are pruned to fit it."
+    ),
+    max_searches: Optional[int] = typer.Option(default=None, help="Budget of search calls for the research."),
+    max_cost: Optional[float] = typer.Option(default=None, help="Budget in USD for the research's LLM and search calls."),
+    max_tokens: Optional[int] = typer.Option(default=None, help="Budget of LLM tokens for the research."),
+):
+    if resume:
+        saved_run = checkpoint_store.get_run(resume)
+        if saved_run is None:
+            print(f"No checkpointed research run with ID {resume}")
+            raise typer.Exit(code=1)
+        combined_query = saved_run["params"]["query"]
+        breadth = saved_run["params"]["breadth"]
+        depth = saved_run["params"]["depth"]
+        run_id = resume
+    else:
+        combined_query, breadth, depth = await collect_research_inputs()
+        run_id = new_run_id()
+    print(f"\nRun ID: {run_id} (resume an interrupted run with --resume {run_id})")
+    budget = ResearchBudget(
+        max_seconds=max_minutes * 60 if max_minutes is not None else None,
+        max_tokens=max_tokens,
+        max_cost=max_cost,
+        max_searches=max_searches,
+    )
 
     # Now use Progress for the research phase
     print("\nResearching your topic...")
@@ -77,7 +120,12 @@ async def main(
         breadth=breadth,
         depth=depth,
         concurrency=concurrency,
+        run_id=run_id,
+        progress_callback=print_progress,
+        budget=budget,
     )
+    for decision in research_results.get("planner", {}).get("decisions", []):
+        print(f"Branch {decision['branch']} {decision['action']}: {decision['reason']}")
 
     # Generate report
     print("\nWriting final report...")
@@ -85,6 +133,7 @@ async def main(
         prompt=combined_query,
         learnings=research_results["learnings"],
         visited_urls=research_results["visited_urls"],
+        learning_sources=research_results.get("learning_sources"),
     )
 
     print("\nResearch Complete!")
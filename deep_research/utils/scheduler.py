@@ -0,0 +1,143 @@
+import asyncio
+import itertools
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class Branch:
+    """Position of the running task in the research tree: level 0 is the root query."""
+    level: int = 0
+    path: str = ""
+
+    def child(self, index: int) -> "Branch":
+        return Branch(self.level + 1, f"{self.path}.{index}" if self.path else str(index))
+
+
+current_scheduler: ContextVar[Optional["ResearchScheduler"]] = ContextVar("current_scheduler", default=None)
+current_branch: ContextVar[Branch] = ContextVar("current_branch", default=Branch())
+
+
+class _ResourcePool:
+    """
+    Counting limiter that hands free slots to the shallowest waiter first and,
+    within a level, to the branch currently holding the fewest slots.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._branch_in_use = defaultdict(int)
+        self._branch_served = defaultdict(int)
+        self.granted = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.peak_waiting = 0
+
+    def _grant(self, branch: Branch):
+        self.in_use += 1
+        self.granted += 1
+        self._branch_in_use[branch.path] += 1
+        self._branch_served[branch.path] += 1
+
+    def _priority(self, entry):
+        branch, seq = entry[0], entry[1]
+        return (branch.level, self._branch_in_use[branch.path], self._branch_served[branch.path], seq)
+
+    def _wake(self):
+        while self.in_use < self.limit and self._waiters:
+            entry = min(self._waiters, key=self._priority)
+            self._waiters.remove(entry)
+            future = entry[2]
+            if future.done():
+                continue
+            self._grant(entry[0])
+            future.set_result(None)
+
+    async def acquire(self, branch: Branch):
+        if self.in_use < self.limit and not self._waiters:
+            self._grant(branch)
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (branch, next(self._seq), future)
+        self._waiters.append(entry)
+        self.peak_waiting = max(self.peak_waiting, len(self._waiters))
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            elif future.done() and not future.cancelled():
+                # Granted just as we were cancelled; hand the slot on.
+                self.release(branch)
+            raise
+        self.waited += 1
+        self.wait_seconds += time.monotonic() - start
+
+    def release(self, branch: Branch):
+        self.in_use -= 1
+        self._branch_in_use[branch.path] -= 1
+        self._wake()
+
+    def get_stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "waiting": len(self._waiters),
+            "granted": self.granted,
+            "waited": self.waited,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "peak_waiting": self.peak_waiting,
+        }
+
+
+class ResearchScheduler:
+    """
+    One scheduler per research run, with separate budgets for search calls,
+    page fetches and LLM calls shared by every branch of the recursion tree.
+    """
+
+    def __init__(self, budgets: Dict[str, int]):
+        self._pools = {kind: _ResourcePool(limit) for kind, limit in budgets.items()}
+
+    @classmethod
+    def for_concurrency(cls, concurrency: int, fetches_per_query: int) -> "ResearchScheduler":
+        return cls({
+            "search": concurrency,
+            "fetch": concurrency * fetches_per_query,
+            "llm": concurrency,
+        })
+
+    @asynccontextmanager
+    async def slot(self, kind: str):
+        pool = self._pools.get(kind)
+        if pool is None:
+            yield
+            return
+        branch = current_branch.get()
+        await pool.acquire(branch)
+        try:
+            yield
+        finally:
+            pool.release(branch)
+
+    def get_stats(self) -> dict:
+        return {kind: pool.get_stats() for kind, pool in self._pools.items()}
+
+
+@asynccontextmanager
+async def scheduled(kind: str):
+    """Hold a slot of kind from the active run's scheduler; a no-op outside a research run."""
+    scheduler = current_scheduler.get()
+    if scheduler is None:
+        yield
+        return
+    async with scheduler.slot(kind):
+        yield
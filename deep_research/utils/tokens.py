@@ -0,0 +1,151 @@
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, Optional
+import tiktoken
+from config_all.config_project import create_c
+from .client_pool import client_registry, model_name
+
+c = create_c()
+
+# Conservative average for ASCII text (prose, markdown, HTML); non-ASCII characters
+# are counted as one token each, which over-estimates rather than under-estimates.
+ASCII_CHARS_PER_TOKEN = 3.5
+
+# Only look this far back from the cut point for a clean boundary.
+BOUNDARY_WINDOW = 2000
+
+# Allowance for the separators and tags that join separately counted prompt fragments.
+JOIN_TOKENS = 8
+
+_boundary_re = re.compile(r"\n\n|\n|\s")
+
+# Context windows are resolved once and reused for every completion.
+_context_windows = dict(c.context_windows)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of text without a tokenizer or network call.
+    Runs in C over the string, so it stays cheap on multi-megabyte HTML.
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / ASCII_CHARS_PER_TOKEN) + other_chars
+
+
+def context_window(model: str) -> int:
+    """Usable input budget for model, after the configured safety margin."""
+    window = _context_windows.get(model, c.default_context_window)
+    return max(0, window - c.context_window_margin)
+
+
+def _safe_cut(text: str, cut: int) -> int:
+    """Move cut back to the nearest paragraph, line or whitespace boundary."""
+    if cut >= len(text):
+        return len(text)
+    start = max(0, cut - BOUNDARY_WINDOW)
+    window = text[start:cut]
+    for boundary in ("\n\n", "\n"):
+        idx = window.rfind(boundary)
+        if idx != -1:
+            return start + idx
+    matches = list(_boundary_re.finditer(window))
+    if matches:
+        return start + matches[-1].start()
+    return cut
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim text to at most max_tokens estimated tokens, cutting on a whitespace boundary."""
+    if max_tokens <= 0:
+        return ""
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    cut = int(len(text) * max_tokens / total)
+    trimmed = text[:_safe_cut(text, cut)]
+    # The estimate is not uniform across the text, so shrink until it fits.
+    while trimmed and estimate_tokens(trimmed) > max_tokens:
+        cut = int(len(trimmed) * 0.95)
+        trimmed = trimmed[:_safe_cut(trimmed, cut)]
+    return trimmed
+
+
+async def load_context_windows():
+    """
+    Refresh Gemini context windows from the model metadata endpoint.
+    Called once at startup; the static table in config stays as the fallback.
+    """
+    if not c.GEMINI_API_KEY:
+        return
+    try:
+        gemini_client = client_registry.get("gemini", c.gemini_model)
+        model_info = await gemini_client.aio.models.get(model=c.gemini_model)
+        if model_info.input_token_limit:
+            _context_windows[c.gemini_model] = model_info.input_token_limit
+    except Exception as e:
+        print(f"Could not load context window for {c.gemini_model}, using configured value: {e}")
+
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str) -> tiktoken.Encoding:
+    """tiktoken encoder for model, built once per process."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+class TokenBudget:
+    """
+    Token counting service with a bounded memo of counts for reused fragments
+    (system prompts, individual learnings, scraped pages).
+    Counts are exact (tiktoken) for openai and estimated for other providers.
+    """
+
+    def __init__(self, max_entries: int = c.token_memo_max_entries):
+        self.max_entries = max_entries
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _count_uncached(self, text: str, provider: str) -> int:
+        if provider == "openai":
+            return len(get_encoder(model_name(provider)).encode(text, disallowed_special=()))
+        return estimate_tokens(text)
+
+    def count(self, text: str, provider: Optional[str] = None) -> int:
+        """Token count of a single fragment, memoised by content hash."""
+        if not text:
+            return 0
+        provider = provider or c.llm_provider
+        key = (provider, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return self._memo[key]
+        tokens = self._count_uncached(text, provider)
+        with self._lock:
+            self.misses += 1
+            self._memo[key] = tokens
+            if len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return tokens
+
+    def count_many(self, fragments: Iterable[str], provider: Optional[str] = None) -> int:
+        """Sum of the cached counts of fragments, for prompts assembled from reused parts."""
+        return sum(self.count(fragment, provider) for fragment in fragments)
+
+    def get_stats(self) -> dict:
+        return {"entries": len(self._memo), "hits": self.hits, "misses": self.misses}
+
+
+token_budget = TokenBudget()
@@ -0,0 +1,68 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+from .urls import normalize_url
+
+
+class UrlRegistry:
+    """
+    Run-wide registry of scraped URLs, keyed by canonical URL.
+    URLs already scraped by another branch are skipped, and concurrent requests
+    for a URL still being fetched or extracted await the same task. The scrape runs
+    in its own task, so a branch that stops waiting for it (e.g. a straggler past
+    its deadline) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self.stats = {"requested": 0, "scraped": 0, "skipped_done": 0, "coalesced_in_flight": 0}
+
+    async def scrape(self, url: str, scrape_fn: Callable[[str], Awaitable[dict]]) -> Optional[dict]:
+        """Scrape url once per run; returns None when another branch already harvested it."""
+        self.stats["requested"] += 1
+        key = normalize_url(url)
+        future = self._futures.get(key)
+        if future is not None:
+            if future.done():
+                self.stats["skipped_done"] += 1
+                return None
+            self.stats["coalesced_in_flight"] += 1
+            return await asyncio.shield(future)
+
+        task = asyncio.ensure_future(scrape_fn(url))
+        self._futures[key] = task
+        task.add_done_callback(lambda done: self._forget_failed(key, done))
+        self.stats["scraped"] += 1
+        return await asyncio.shield(task)
+
+    def _forget_failed(self, key: str, task: asyncio.Future):
+        # Let a later branch retry this URL rather than reuse the failure.
+        if task.cancelled() or task.exception() is not None:
+            if self._futures.get(key) is task:
+                del self._futures[key]
+
+    def mark_scraped(self, urls):
+        """Record URLs harvested by an earlier attempt of the run (e.g. replayed from a checkpoint)."""
+        loop = asyncio.get_running_loop()
+        for url in urls:
+            key = normalize_url(url)
+            if key not in self._futures:
+                future = loop.create_future()
+                future.set_result(None)
+                self._futures[key] = future
+
+    def cancel_pending(self):
+        """Stop scrapes nobody waits for any more, e.g. stragglers still running when the run ends."""
+        for future in self._futures.values():
+            if not future.done():
+                future.cancel()
+
+    def is_known(self, url: str) -> bool:
+        return normalize_url(url) in self._futures
+
+    def get_stats(self) -> dict:
+        saved = self.stats["skipped_done"] + self.stats["coalesced_in_flight"]
+        return {**self.stats, "fetches_saved": saved, "extractions_saved": saved}
+
+
+current_url_registry: ContextVar[Optional[UrlRegistry]] = ContextVar("current_url_registry", default=None)
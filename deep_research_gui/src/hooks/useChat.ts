@@ -16,6 +16,12 @@ interface UseChatReturn {
   finalReport: string | null;
 }
 
+// Payload of one server-sent event, skipping its id line and keep-alive comments.
+function sseData(block: string): any | null {
+  const dataLine = block.split("\n").find(line => line.startsWith("data: "));
+  return dataLine ? JSON.parse(dataLine.slice("data: ".length)) : null;
+}
+
 export function useChat(initialPrompt: string, computeMode: 'low' | 'medium' | 'high'): UseChatReturn {
   const [messages, setMessages] = useState<ChatMessageData[]>([]);
   const [questionQueue, setQuestionQueue] = useState<string[]>([]);
@@ -46,6 +52,20 @@ export function useChat(initialPrompt: string, computeMode: 'low' | 'medium' | '
     });
   };
 
+  // Helper: append a streamed report delta to the report message, creating it on the first delta.
+  const appendReportDelta = (delta: string) => {
+    setMessages(prev => {
+      const withoutProgress = prev.filter(m => m.type !== 'update');
+      const index = withoutProgress.findIndex(m => m.type === 'finalReport');
+      if (index !== -1) {
+        const updated = [...withoutProgress];
+        updated[index] = { ...updated[index], content: updated[index].content + delta };
+        return updated;
+      }
+      return [...withoutProgress, { role: 'system', type: 'finalReport', content: delta }];
+    });
+  };
+
   // Fetch follow-up questions via streaming.
   useEffect(() => {
     if (!initialPrompt || hasFetchedRef.current) return;
@@ -73,9 +93,8 @@ export function useChat(initialPrompt: string, computeMode: 'low' | 'medium' | '
           const lines = buffer.split("\n\n");
           buffer = lines.pop() || "";
           for (let line of lines) {
-            if (line.startsWith("data: ")) {
-              const jsonStr = line.replace("data: ", "");
-              const eventData = JSON.parse(jsonStr);
+            const eventData = sseData(line);
+            if (eventData) {
               if (eventData.type === 'progress') {
                 const content = `${eventData.data.stage}: ${eventData.data.message}`;
                 updateProgressMessage(content);
@@ -152,16 +171,17 @@ export function useChat(initialPrompt: string, computeMode: 'low' | 'medium' | '
         const lines = buffer.split("\n\n");
         buffer = lines.pop() || "";
         for (let line of lines) {
-          if (line.startsWith("data: ")) {
-            const jsonStr = line.replace("data: ", "");
-            const eventData = JSON.parse(jsonStr);
+          const eventData = sseData(line);
+          if (eventData) {
             if (eventData.type === 'progress') {
-              const content = `Progress: ${eventData.data.percentage}% | Elapsed: ${eventData.data.elapsed}s | Remaining: ${eventData.data.remaining}s`;
+              const content = `Progress: ${eventData.data.percentage}% | Queries: ${eventData.data.completed}/${eventData.data.total} | Elapsed: ${eventData.data.elapsed}s | Remaining: ${eventData.data.remaining}s`;
               updateProgressMessage(content);
+            } else if (eventData.type === 'report_delta') {
+              appendReportDelta(eventData.data.delta);
             } else if (eventData.type === 'final') {
-              setMessages(prev => prev.filter(m => m.type !== 'update'));
+              // Replace the streamed report with the complete one from the server.
               setMessages(prev => [
-                ...prev,
+                ...prev.filter(m => m.type !== 'update' && m.type !== 'finalReport'),
                 { role: 'system', type: 'finalReport', content: eventData.data.final_report },
                 { role: 'system', type: 'text', content: 'Done' },
               ]);
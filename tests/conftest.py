@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep the module-level checkpoint store out of the working tree.
+os.environ.setdefault("CHECKPOINT_PATH", os.path.join(tempfile.mkdtemp(prefix="deep_research_tests_"), "checkpoints.db"))
@@ -0,0 +1,60 @@
+from fastapi.testclient import TestClient
+
+import deep_research.api_server as api_server
+
+
+def _fake_research(monkeypatch, prompts):
+    async def deep_research(query, breadth, depth, concurrency, run_id=None, budget=None):
+        return {"run_id": run_id, "query": query or "saved query", "learnings": ["a"], "visited_urls": ["u"],
+                "learning_sources": {}}
+
+    async def collect_final_report(prompt, learnings, visited_urls, learning_sources):
+        prompts.append(prompt)
+        return "report", {}
+
+    monkeypatch.setattr(api_server, "deep_research", deep_research)
+    monkeypatch.setattr(api_server, "collect_final_report", collect_final_report)
+
+
+def test_research_requires_query_or_run_id():
+    response = TestClient(api_server.app).post("/api/research", json={"breadth": 2})
+    assert response.status_code == 422
+
+
+def test_resumed_research_reports_on_the_saved_query(monkeypatch):
+    prompts = []
+    _fake_research(monkeypatch, prompts)
+    response = TestClient(api_server.app).post("/api/research", json={"run_id": "abc"})
+    assert response.status_code == 200
+    assert prompts == ["saved query"]
+
+
+def test_resuming_a_live_run_conflicts_and_keeps_its_bus():
+    bus = api_server.progress_buses.create("live-run")
+    try:
+        client = TestClient(api_server.app)
+        for path in ("/api/research", "/api/research_stream", "/api/jobs"):
+            assert client.post(path, json={"run_id": "live-run"}).status_code == 409
+        assert api_server.progress_buses.get("live-run") is bus
+    finally:
+        bus.close()
+
+
+def test_resuming_a_run_active_in_this_process_conflicts():
+    api_server.checkpoint_store.start_run("active-run", {"query": "q"})
+    try:
+        response = TestClient(api_server.app).post("/api/research", json={"run_id": "active-run"})
+        assert response.status_code == 409
+    finally:
+        api_server.checkpoint_store.finish_run("active-run", result={})
+
+
+def test_run_events_replay_after_last_event_id():
+    bus = api_server.progress_buses.create("replayed-run")
+    for step in range(3):
+        bus.publish("progress", {"step": step})
+    bus.close()
+    response = TestClient(api_server.app).get("/api/runs/replayed-run/events", headers={"Last-Event-ID": "1"})
+    assert response.status_code == 200
+    assert response.text == ('id: 2\ndata: {"type": "progress", "data": {"step": 1}}\n\n'
+                             'id: 3\ndata: {"type": "progress", "data": {"step": 2}}\n\n')
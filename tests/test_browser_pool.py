@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from deep_research.utils.browser_pool import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self, fail_on=()):
+        self.fail_on = fail_on
+        self.page_source = ""
+        self.quit_called = False
+
+    def set_page_load_timeout(self, seconds):
+        self.timeout = seconds
+
+    def get(self, url):
+        if url in self.fail_on:
+            raise RuntimeError("page load timed out")
+        self.page_source = f"<html>{url}</html>"
+
+    def quit(self):
+        self.quit_called = True
+
+
+def make_pool(**kwargs):
+    drivers = []
+
+    def factory():
+        drivers.append(FakeDriver(fail_on={"https://broken.example/"}))
+        return drivers[-1]
+
+    return BrowserPool(driver_factory=factory, page_timeout=5, **kwargs), drivers
+
+
+def test_browsers_are_reused_and_recycled_after_their_page_quota():
+    pool, drivers = make_pool(size=1, pages_per_browser=2)
+
+    async def run():
+        return [await pool.fetch(f"https://example.com/{i}") for i in range(3)]
+
+    assert asyncio.run(run()) == [f"<html>https://example.com/{i}</html>" for i in range(3)]
+    assert len(drivers) == 2
+    assert drivers[0].quit_called and not drivers[1].quit_called
+    assert pool.get_stats() == {"launched": 2, "recycled": 1, "pages": 3, "errors": 0, "idle": 1, "size": 1}
+    pool.close()
+    assert drivers[1].quit_called
+
+
+def test_a_browser_that_fails_is_quit_instead_of_returned():
+    pool, drivers = make_pool(size=1, pages_per_browser=10)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await pool.fetch("https://broken.example/")
+        return await pool.fetch("https://example.com/")
+
+    assert asyncio.run(run()) == "<html>https://example.com/</html>"
+    assert len(drivers) == 2 and drivers[0].quit_called
+    assert pool.get_stats()["errors"] == 1
+    pool.close()
+
+
+def test_a_closed_pool_refuses_fetches_and_quits_returned_browsers():
+    pool, drivers = make_pool(size=1, pages_per_browser=10)
+    pooled = pool.checkout()
+    pool.close()
+    pool.checkin(pooled)
+    assert drivers[0].quit_called
+    with pytest.raises(RuntimeError):
+        asyncio.run(pool.fetch("https://example.com/"))
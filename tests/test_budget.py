@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+import deep_research.deep_research as deep_research_module
+from deep_research.serp_generator import SerpQuery
+from deep_research.utils.budget import BudgetPlanner, ResearchBudget, charge_search
+from deep_research.utils.checkpoint import CheckpointStore
+from deep_research.utils.scheduler import Branch
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def test_planner_prunes_low_novelty_and_stops_when_spent():
+    planner = BudgetPlanner(ResearchBudget(max_searches=3), depth=2)
+    first, second = Branch().child(0), Branch().child(1)
+    assert not planner.skip(first, "q1")
+    planner.charge_search()
+    novelty = planner.observe(first, ["Solar capacity doubled in 2023."], ["https://a.com/1"])
+    assert novelty == 1.0
+    assert not planner.skip(second, "q2")
+    planner.charge_search()
+    novelty = planner.observe(second, ["Solar capacity doubled in 2023."], ["https://a.com/1"])
+    assert novelty == 0.0
+    assert planner.plan_expansion(second, "q2", novelty, 2, 1) == (2, 0)
+    assert planner.decisions[-1].action == "pruned"
+    planner.charge_search()
+    assert planner.skip(Branch().child(2), "q3")
+    assert planner.decisions[-1].reason == "searches budget of 3 spent"
+
+
+def test_planner_restores_spending():
+    planner = BudgetPlanner(ResearchBudget(max_cost=1.0), depth=1)
+    planner.charge_llm("o3-mini", 1000, 500)
+    planner.charge_search()
+    restored = BudgetPlanner(ResearchBudget(max_cost=1.0), depth=1)
+    restored.restore(planner.snapshot())
+    assert restored.usage == planner.usage
+    assert restored.report()["usage"]["seconds"] >= 0
+
+
+def test_resumed_run_keeps_the_budget_already_spent(monkeypatch, tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    monkeypatch.setattr(deep_research_module, "checkpoint_store", store)
+    searches, interrupt = [], {"pending": True}
+
+    async def generate_serp_queries(query, num_queries, learnings):
+        if query != "topic" and interrupt["pending"]:
+            interrupt["pending"] = False
+            raise Interrupted()
+        return [SerpQuery(query=f"q{len(searches)}-{i}", research_goal="goal") for i in range(num_queries)]
+
+    class FakeClient:
+        async def brave_search(self, query, offset=0):
+            searches.append(query)
+            charge_search()
+            return {"web": {"results": [{"url": f"https://example.com/{query}"}]}}
+
+    async def harvest_learnings(query, urls, num_follow_up_questions, on_late=None):
+        return {"learnings": [f"finding about {query}"], "followUpQuestions": []}, urls
+
+    monkeypatch.setattr(deep_research_module, "generate_serp_queries", generate_serp_queries)
+    monkeypatch.setattr(deep_research_module, "ApiClient", FakeClient)
+    monkeypatch.setattr(deep_research_module, "harvest_learnings", harvest_learnings)
+
+    with pytest.raises(Interrupted):
+        asyncio.run(deep_research_module.deep_research("topic", 2, 2, 1, run_id="run",
+                                                       budget=ResearchBudget(max_searches=3)))
+    assert len(searches) >= 1
+
+    result = asyncio.run(deep_research_module.deep_research("", 0, 0, 1, run_id="run"))
+    # The searches of the interrupted attempt count toward the budget of the resumed one.
+    assert len(searches) == 3
+    assert result["planner"]["usage"]["searches"] == 3
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import deep_research.deep_research as deep_research_module
+from deep_research.serp_generator import SerpQuery
+from deep_research.utils.checkpoint import CheckpointStore, RunInProgress
+from deep_research.utils.scheduler import Branch
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def test_resumed_run_skips_the_nodes_it_completed(monkeypatch, tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    monkeypatch.setattr(deep_research_module, "checkpoint_store", store)
+    generated, searches, interrupt = [], [], {"pending": True}
+
+    async def generate_serp_queries(query, num_queries, learnings):
+        generated.append(query)
+        return [SerpQuery(query=f"q-{i}", research_goal="goal") for i in range(num_queries)]
+
+    class FakeClient:
+        async def brave_search(self, query, offset=0):
+            searches.append(query)
+            return {"web": {"results": [{"url": f"https://example.com/{query}"}]}}
+
+    async def harvest_learnings(query, urls, num_follow_up_questions, on_late=None):
+        if query == "q-1" and interrupt["pending"]:
+            interrupt["pending"] = False
+            raise Interrupted()
+        return {"learnings": [f"finding about {query}"], "followUpQuestions": []}, urls
+
+    monkeypatch.setattr(deep_research_module, "generate_serp_queries", generate_serp_queries)
+    monkeypatch.setattr(deep_research_module, "ApiClient", FakeClient)
+    monkeypatch.setattr(deep_research_module, "harvest_learnings", harvest_learnings)
+
+    with pytest.raises(Interrupted):
+        asyncio.run(deep_research_module.deep_research("topic", 2, 1, 1, run_id="run"))
+    assert store.get_run("run")["status"] == "failed"
+    generated.clear()
+    searches.clear()
+
+    result = asyncio.run(deep_research_module.deep_research("", 0, 0, 1, run_id="run"))
+    assert generated == []
+    assert searches == ["q-1"]
+    assert result["query"] == "topic"
+    assert sorted(result["learnings"]) == ["finding about q-0", "finding about q-1"]
+    assert store.get_run("run")["status"] == "completed"
+
+
+def test_failed_nodes_are_run_again_and_live_runs_cannot_be_reopened(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.db"))
+    checkpoint = store.start_run("run", {"query": "topic"})
+    checkpoint.save_node("done", Branch(), {"learnings": ["a"]})
+    checkpoint.save_node("failed", Branch(), {"error": "timeout"})
+    with pytest.raises(RunInProgress):
+        store.start_run("run", {"query": "topic"})
+    store.finish_run("run", error="interrupted")
+
+    resumed = store.start_run("run", {"query": "topic"})
+    assert resumed.resumed
+    assert resumed.get_node("done") == {"learnings": ["a"]}
+    assert resumed.get_node("failed") is None
+    assert resumed.replayed == 1
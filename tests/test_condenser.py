@@ -0,0 +1,69 @@
+import asyncio
+
+from deep_research.condenser import LearningCondenser, SourcedLearning
+
+
+def learnings(n, words=40):
+    return [SourcedLearning(f"Learning {i}: " + "detail " * words, (f"https://example.com/{i}",)) for i in range(n)]
+
+
+def condenser_with(summarise, **kwargs):
+    condenser = LearningCondenser(**kwargs)
+    condenser._summarise = summarise
+    return condenser
+
+
+def test_learnings_that_fit_are_returned_without_llm_calls():
+    async def summarise(batch):
+        raise AssertionError("nothing to condense")
+
+    items = learnings(3)
+    assert asyncio.run(condenser_with(summarise).condense(items, budget=10_000)) == items
+
+
+def test_batches_are_condensed_until_they_fit_and_keep_their_sources():
+    calls = []
+
+    async def summarise(batch):
+        calls.append(len(batch))
+        sources = tuple(source for item in batch for source in item.sources)
+        return [SourcedLearning(f"Summary of {len(batch)} learnings", sources)]
+
+    condenser = condenser_with(summarise, batch_tokens=200)
+    items = learnings(8)
+    condensed = asyncio.run(condenser.condense(items, budget=150))
+    assert len(calls) > 1
+    assert sorted(source for item in condensed for source in item.sources) == sorted(
+        item.sources[0] for item in items)
+    assert condenser._tokens(condensed) <= 150
+
+
+def test_identical_batches_share_one_summary():
+    calls = []
+
+    async def summarise(batch):
+        calls.append(batch)
+        await asyncio.sleep(0.01)
+        return [SourcedLearning("Summary", batch[0].sources)]
+
+    condenser = condenser_with(summarise, batch_tokens=10_000)
+    items = learnings(6)
+
+    async def run():
+        return await asyncio.gather(condenser.condense(items, budget=20), condenser.condense(items, budget=20))
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(calls) == 1
+    assert condenser.get_stats()["cache_hits"] == 1
+
+
+def test_a_failed_batch_is_kept_and_the_excess_dropped():
+    async def summarise(batch):
+        raise RuntimeError("provider down")
+
+    condenser = condenser_with(summarise, batch_tokens=10_000)
+    items = learnings(6)
+    kept = asyncio.run(condenser.condense(items, budget=120))
+    assert kept == items[:len(kept)] and 0 < len(kept) < len(items)
+    assert condenser.get_stats()["dropped"] == len(items) - len(kept)
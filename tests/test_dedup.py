@@ -0,0 +1,24 @@
+from deep_research.utils.dedup import dedupe_learnings
+
+
+def test_paraphrases_merge_with_their_sources():
+    result = dedupe_learnings(
+        ["Solar panel prices fell sharply in 2023 because of polysilicon oversupply.",
+         "Because of polysilicon oversupply, solar panel prices fell sharply in 2023."],
+        {"Solar panel prices fell sharply in 2023 because of polysilicon oversupply.": ["https://a.com"],
+         "Because of polysilicon oversupply, solar panel prices fell sharply in 2023.": ["https://b.com"]},
+    )
+    assert result.learnings == ["Solar panel prices fell sharply in 2023 because of polysilicon oversupply."]
+    assert result.learning_sources == {result.learnings[0]: ["https://a.com", "https://b.com"]}
+
+
+def test_negation_is_never_merged():
+    learnings = ["The EU AI Act was adopted in March 2024.", "The EU AI Act was not adopted in March 2024."]
+    assert dedupe_learnings(learnings).learnings == learnings
+
+
+def test_different_numbers_or_dates_are_never_merged():
+    figures = ["Global EV sales reached 14 million in 2023.", "Global EV sales reached 10 million in 2023."]
+    dates = ["The EU AI Act was adopted in March 2024.", "The EU AI Act was adopted in May 2024."]
+    assert dedupe_learnings(figures).learnings == figures
+    assert dedupe_learnings(dates).learnings == dates
@@ -0,0 +1,58 @@
+import asyncio
+
+import httpx
+
+from deep_research.utils.http_client import ConnectionSlots, HostLimitedTransport, build_http_client
+
+
+def test_proxy_mounts_share_the_connection_caps(monkeypatch):
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.internal:3128")
+    monkeypatch.setenv("NO_PROXY", "localhost")
+    client = build_http_client(max_connections=8, max_per_host=2)
+    transports = [client._transport] + [t for t in client._mounts.values() if t is not None]
+    assert len(transports) == 2
+    assert len({id(t.slots) for t in transports}) == 1
+    asyncio.run(client.aclose())
+
+
+def test_requests_through_different_mounts_wait_for_the_same_host_slot():
+    active, peak = [0], [0]
+
+    # Unread streams, as from a real transport, so the slot is freed when the client closes the body.
+    async def handler(request):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.02)
+        active[0] -= 1
+        return httpx.Response(200, stream=httpx.ByteStream(b"ok"))
+
+    async def run():
+        slots = ConnectionSlots(max_connections=4, max_per_host=1)
+        direct = HostLimitedTransport(httpx.MockTransport(handler), slots)
+        proxied = HostLimitedTransport(httpx.MockTransport(handler), slots)
+        async with httpx.AsyncClient(transport=direct, mounts={"https://": proxied}) as client:
+            responses = await asyncio.gather(client.get("http://example.com/a"), client.get("https://example.com/b"),
+                                             client.get("http://example.com/c"))
+        assert [r.text for r in responses] == ["ok"] * 3
+        assert peak[0] == 1
+
+    asyncio.run(run())
+
+
+def test_global_cap_spans_hosts():
+    active, peak = [0], [0]
+
+    async def handler(request):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.02)
+        active[0] -= 1
+        return httpx.Response(200, stream=httpx.ByteStream(b""))
+
+    async def run():
+        slots = ConnectionSlots(max_connections=2, max_per_host=4)
+        async with httpx.AsyncClient(transport=HostLimitedTransport(httpx.MockTransport(handler), slots)) as client:
+            await asyncio.gather(*(client.get(f"http://host{i}.example/") for i in range(6)))
+        assert peak[0] == 2
+
+    asyncio.run(run())
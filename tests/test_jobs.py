@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from deep_research.jobs import CANCELLED, COMPLETED, InProcessJobBackend, JobManager, JobQueueFull
+
+
+async def collect(manager, job_id, after=None):
+    return [(event_id, event["type"]) async for event_id, event in manager.events(job_id, after)]
+
+
+async def wait_for_status(manager, job_id, status):
+    while (await manager.get(job_id)).status != status:
+        await asyncio.sleep(0.001)
+
+
+def test_jobs_run_in_the_background_and_their_events_replay_from_any_point():
+    async def runner(record, emit):
+        emit("progress", {"done": 1})
+        emit("learn", {"learning": "finding"})
+        return {"final_report": f"report on {record.params['query']}"}
+
+    async def run():
+        manager = JobManager(InProcessJobBackend(), workers=1, runner=runner)
+        record = await manager.submit({"query": "topic"})
+        events = await collect(manager, record.job_id)
+        replayed = await collect(manager, record.job_id, after="2")
+        job = await manager.get(record.job_id)
+        await manager.close()
+        return events, replayed, job
+
+    events, replayed, job = asyncio.run(run())
+    assert events == [("1", "progress"), ("2", "learn"), ("3", "final")]
+    assert replayed == [("3", "final")]
+    assert job.status == COMPLETED and job.result == {"final_report": "report on topic"}
+    assert job.progress == {"done": 1}
+
+
+def test_cancelling_queued_and_running_jobs():
+    async def run():
+        running = asyncio.Event()
+
+        async def runner(record, emit):
+            running.set()
+            await asyncio.sleep(10)
+
+        manager = JobManager(InProcessJobBackend(), workers=1, runner=runner)
+        first = await manager.submit({"query": "first"})
+        second = await manager.submit({"query": "second"})
+        await running.wait()
+        await manager.cancel(second.job_id)
+        await manager.cancel(first.job_id)
+        first_events = await collect(manager, first.job_id)
+        second_events = await collect(manager, second.job_id)
+        await wait_for_status(manager, first.job_id, CANCELLED)
+        stats = manager.get_stats()
+        await manager.close()
+        return first_events, second_events, stats
+
+    first_events, second_events, stats = asyncio.run(run())
+    assert first_events == [("1", "cancelled")]
+    assert second_events == [("1", "cancelled")]
+    assert stats["cancelled"] == 2 and stats["running"] == 0
+
+
+def test_submissions_are_rejected_when_the_queue_is_full():
+    async def run():
+        running = asyncio.Event()
+
+        async def runner(record, emit):
+            running.set()
+            await asyncio.sleep(10)
+
+        manager = JobManager(InProcessJobBackend(), workers=1, max_queued=1, runner=runner)
+        await manager.submit({"query": "running"})
+        await running.wait()
+        await manager.submit({"query": "queued"})
+        with pytest.raises(JobQueueFull):
+            await manager.submit({"query": "rejected"})
+        stats = manager.get_stats()
+        await manager.close()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["submitted"] == 2 and stats["rejected"] == 1
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import deep_research.page_scraper as page_scraper
+from deep_research.page_scraper import PagePrefetcher
+from deep_research.utils.rate_limiter import RateLimiterRegistry
+
+
+def test_failed_prefetch_keeps_a_newer_prefetch_of_the_url(monkeypatch):
+    first_attempt = asyncio.Event()
+    calls = []
+
+    async def scrape(url):
+        calls.append(url)
+        if len(calls) == 1:
+            await first_attempt.wait()
+            raise RuntimeError("connection reset")
+        return {"url": url, "content": "page"}
+
+    monkeypatch.setattr(page_scraper, "_scrape_and_extract", scrape)
+
+    async def run():
+        prefetcher = PagePrefetcher(ttl=0, concurrency=2)
+        [stale] = prefetcher.prefetch(["https://example.com/a"])
+        await asyncio.sleep(0.01)
+        # Expired, so the URL is prefetched again while the first scrape is still running.
+        [fresh] = prefetcher.prefetch(["https://example.com/a"])
+        first_attempt.set()
+        assert await stale is None
+        assert await fresh == {"url": "https://example.com/a", "content": "page"}
+        prefetcher.ttl = 60
+        assert prefetcher.get("https://example.com/a") is fresh
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttled_fetch_skips_selenium_and_cools_the_domain_down(monkeypatch, status):
+    limiters = RateLimiterRegistry({"domain": {"per_minute": 60, "burst": 4}})
+
+    async def fetch(method, url, headers=None):
+        return httpx.Response(status, headers={"retry-after": "30"}, request=httpx.Request(method, url))
+
+    def get_browser_pool():
+        raise AssertionError("Selenium must not be tried on a throttled site")
+
+    monkeypatch.setattr(page_scraper, "rate_limiters", limiters)
+    monkeypatch.setattr(page_scraper, "fetch", fetch)
+    monkeypatch.setattr(page_scraper, "get_browser_pool", get_browser_pool)
+
+    assert asyncio.run(page_scraper._fetch_page(f"https://throttled.example/{status}")) == ""
+    bucket = limiters.bucket("domain:throttled.example")
+    assert bucket.rate_limited == 1
+    assert bucket.blocked_until - time.monotonic() > 25
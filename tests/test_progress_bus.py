@@ -0,0 +1,44 @@
+import asyncio
+
+from deep_research.utils.progress_bus import ProgressBus, ProgressBusRegistry
+
+
+def test_subscribers_get_live_events_and_heartbeats_until_the_bus_closes():
+    async def run():
+        bus = ProgressBus("run")
+        received = []
+
+        async def subscriber():
+            async for item in bus.subscribe(heartbeat=0.02):
+                received.append(item and item[0])
+
+        task = asyncio.create_task(subscriber())
+        bus.publish("search", {"query": "q"})
+        await asyncio.sleep(0.05)
+        bus.publish("learn", {"learning": "a"})
+        bus.close()
+        await task
+        return received
+
+    received = asyncio.run(run())
+    assert received[0] == 1 and received[-1] == 2
+    assert None in received
+
+
+def test_reconnecting_subscriber_skips_events_that_left_the_buffer():
+    async def run():
+        bus = ProgressBus("run", max_events=2)
+        for step in range(5):
+            bus.publish("progress", {"step": step})
+        bus.close()
+        return [event_id async for event_id, _ in bus.subscribe(after="1")]
+
+    assert asyncio.run(run()) == [4, 5]
+
+
+def test_closed_buses_linger_for_late_subscribers():
+    registry = ProgressBusRegistry(linger=60)
+    bus = registry.create("run")
+    bus.close()
+    assert registry.get("run") is bus and not registry.is_open("run")
+    assert registry.create("run") is not bus
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import deep_research.query_pipeline as query_pipeline
+from deep_research.query_pipeline import current_late_harvests, harvest_learnings, settle_late_harvests
+
+
+def _fake_synthesis(monkeypatch, calls):
+    async def process_serp_result(query, search_result, num_follow_up_questions):
+        urls = [page["url"] for page in search_result["data"]]
+        calls.append(urls)
+        return {"learnings": [f"learned from {url}" for url in urls],
+                "followUpQuestions": ["next?"][:num_follow_up_questions]}
+    monkeypatch.setattr(query_pipeline, "process_serp_result", process_serp_result)
+
+
+def _scraper(delays):
+    async def scrape(url):
+        await asyncio.sleep(delays[url])
+        return {"markdown": f"page {url}"}
+    return scrape
+
+
+def test_hung_page_does_not_delay_past_deadline(monkeypatch):
+    monkeypatch.setattr(query_pipeline.c, "pipeline_straggler_deadline", 0.3)
+    calls = []
+    _fake_synthesis(monkeypatch, calls)
+    scrape = _scraper({"a": 0.05, "b": 0.1, "hung": 3600})
+
+    async def run():
+        start = time.monotonic()
+        result, page_urls = await harvest_learnings("q", ["a", "b", "hung"], 1, scrape_fn=scrape)
+        return time.monotonic() - start, result, page_urls
+
+    elapsed, result, page_urls = asyncio.run(run())
+    assert elapsed < 1.0
+    assert page_urls == ["a", "b"]
+    assert result == {"learnings": ["learned from a", "learned from b"], "followUpQuestions": ["next?"]}
+
+
+def test_late_pages_are_learned_from_in_background(monkeypatch):
+    monkeypatch.setattr(query_pipeline.c, "pipeline_straggler_deadline", 0.2)
+    calls, late = [], []
+    _fake_synthesis(monkeypatch, calls)
+    scrape = _scraper({"a": 0.05, "slow": 0.5})
+
+    async def run():
+        late_harvests = set()
+        current_late_harvests.set(late_harvests)
+        start = time.monotonic()
+        result, page_urls = await harvest_learnings(
+            "q", ["a", "slow"], 1, scrape_fn=scrape, on_late=lambda learnings, urls: late.append((learnings, urls)))
+        returned_after = time.monotonic() - start
+        assert late == [] and len(late_harvests) == 1
+        await settle_late_harvests(late_harvests, timeout=2)
+        return returned_after, page_urls
+
+    returned_after, page_urls = asyncio.run(run())
+    assert returned_after < 0.45
+    assert page_urls == ["a"]
+    assert late == [(["learned from slow"], ["slow"])]
+
+
+def test_waits_for_first_page_instead_of_synthesising_nothing(monkeypatch):
+    monkeypatch.setattr(query_pipeline.c, "pipeline_straggler_deadline", 0.1)
+    calls = []
+    _fake_synthesis(monkeypatch, calls)
+    result, page_urls = asyncio.run(harvest_learnings("q", ["a"], 1, scrape_fn=_scraper({"a": 0.3})))
+    assert page_urls == ["a"]
+    assert calls == [["a"]]
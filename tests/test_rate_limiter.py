@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from deep_research.utils.rate_limiter import RateLimiterRegistry, TokenBucket, retry_after_seconds
+
+
+def test_bucket_serves_the_burst_then_paces_callers():
+    async def run():
+        bucket = TokenBucket(rate=100, capacity=2)
+        waits = [await bucket.acquire() for _ in range(3)]
+        return bucket, waits
+
+    bucket, waits = asyncio.run(run())
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.01, abs=0.005)
+    assert bucket.get_stats()["waited"] == 1
+
+
+def test_rate_limited_bucket_halves_its_rate_blocks_and_recovers():
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.on_rate_limited(retry_after=30)
+    assert bucket.rate == 5
+    assert bucket.blocked_until - time.monotonic() == pytest.approx(30, abs=1)
+    for _ in range(25):
+        bucket.on_success()
+    assert bucket.rate == 10
+
+
+def test_registry_falls_back_to_shorter_keys():
+    registry = RateLimiterRegistry({"llm:gemini": {"per_minute": 60, "burst": 1}, "llm": {"per_minute": 6, "burst": 1}})
+    assert registry.bucket("llm:gemini:models/gemini-2.0-flash").rate == 1
+    assert registry.bucket("llm:openai:o3-mini").rate == 0.1
+    assert registry.bucket("brave") is None
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert retry_after_seconds(httpx.Response(429, headers={"retry-after": "7"})) == 7
+    assert retry_after_seconds(httpx.Response(429, headers={"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0
+    assert retry_after_seconds(httpx.Response(429)) is None
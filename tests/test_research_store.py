@@ -0,0 +1,30 @@
+from deep_research.utils.research_store import ResearchStore
+from deep_research.utils.scheduler import Branch
+
+
+def test_branch_views_see_their_ancestors_but_not_their_siblings():
+    store = ResearchStore()
+    root = store.root(["prior finding"], ["https://prior.example/"])
+    left = store.extend(root, Branch().child(0), ["left finding"], ["https://left.example/"])
+    right = store.extend(root, Branch().child(1), ["right finding"], ["https://right.example/"])
+    grandchild = store.extend(left, Branch().child(0).child(0), ["deep finding"])
+
+    assert right.learnings() == ["prior finding", "right finding"]
+    assert grandchild.learnings() == ["prior finding", "left finding", "deep finding"]
+    assert grandchild.urls() == ["https://prior.example/", "https://left.example/"]
+    assert [entry.branch for entry in grandchild.learning_entries()] == ["", "0", "0.0"]
+    assert store.get_stats() == {"learnings": 4, "urls": 3, "max_depth": 2}
+
+
+def test_result_merges_the_whole_run_and_its_sources():
+    store = ResearchStore()
+    root = store.root(["shared"], learning_sources={"shared": ["https://a.example/"]})
+    store.extend(root, Branch().child(0), ["shared", "own"], ["https://b.example/", "https://a.example/"],
+                 source_urls=["https://b.example/"])
+    store.extend(root, Branch().child(1), urls=["https://b.example/"])
+
+    assert store.result() == {
+        "learnings": ["shared", "own"],
+        "visited_urls": ["https://b.example/", "https://a.example/"],
+        "learning_sources": {"shared": ["https://a.example/", "https://b.example/"], "own": ["https://b.example/"]},
+    }
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from deep_research.utils.resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceeded, Resilience,
+                                            RetryPolicy)
+
+
+def transient():
+    request = httpx.Request("GET", "https://api.example/")
+    return httpx.HTTPStatusError("unavailable", request=request, response=httpx.Response(503, request=request))
+
+
+def test_breaker_opens_then_lets_one_probe_through_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.opened_at -= 30
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError, match="probe in flight"):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 2
+
+    breaker.opened_at -= 30
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert breaker.get_stats()["rejected"] == 2
+
+
+def test_a_cancelled_probe_frees_the_half_open_breaker():
+    resilience = Resilience()
+    breaker = resilience.breaker("brave")
+    breaker.state, breaker.opened_at = "open", time.monotonic() - breaker.reset_timeout
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def run():
+        probe = asyncio.create_task(resilience.call("brave", hang, RetryPolicy(max_attempts=1)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "ok"
+        return await resilience.call("brave", ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_transient_errors_are_retried_and_others_raised_at_once():
+    resilience = Resilience()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise transient()
+        return "ok"
+
+    async def bad_request():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001)
+    assert asyncio.run(resilience.call("gemini", flaky, policy)) == "ok"
+    assert resilience.get_stats()["gemini"]["retries"] == 2
+
+    attempts.clear()
+    with pytest.raises(ValueError):
+        asyncio.run(resilience.call("gemini", bad_request, policy))
+    assert len(attempts) == 1
+    assert resilience.breaker("gemini").state == "closed"
+
+
+def test_deadline_covers_retries_but_not_queueing():
+    resilience = Resilience()
+
+    @asynccontextmanager
+    async def queue():
+        await asyncio.sleep(0.2)
+        yield
+
+    async def quick():
+        return "ok"
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    policy = RetryPolicy(max_attempts=5, base_delay=0.001, max_delay=0.001, deadline=0.1)
+    # Waiting 0.2s for the queue is longer than the deadline, yet the call succeeds.
+    assert asyncio.run(resilience.call("openai", quick, policy, queue)) == "ok"
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(resilience.call("openai", slow, policy))
+    assert time.monotonic() - start < 0.5
+    assert resilience.get_stats()["openai"]["deadline_exceeded"] == 1
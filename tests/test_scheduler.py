@@ -0,0 +1,62 @@
+import asyncio
+
+from deep_research.utils.scheduler import Branch, ResearchScheduler, current_branch, current_scheduler, scheduled
+
+
+def test_free_slots_go_to_the_shallowest_waiter_first():
+    order = []
+
+    async def task(scheduler, branch, gate):
+        current_branch.set(branch)
+        async with scheduler.slot("llm"):
+            order.append(branch.path)
+            await gate.wait()
+
+    async def run():
+        scheduler = ResearchScheduler({"llm": 1})
+        gate = asyncio.Event()
+        holder = asyncio.create_task(task(scheduler, Branch().child(0), gate))
+        await asyncio.sleep(0)
+        deep = Branch().child(0).child(0).child(0)
+        waiters = [asyncio.create_task(task(scheduler, branch, gate))
+                   for branch in (deep, Branch().child(0).child(1), Branch().child(1))]
+        await asyncio.sleep(0)
+        assert scheduler.get_stats()["llm"]["waiting"] == 3
+        gate.set()
+        await asyncio.gather(holder, *waiters)
+        assert scheduler.get_stats()["llm"]["in_use"] == 0
+
+    asyncio.run(run())
+    assert order == ["0", "1", "0.1", "0.0.0"]
+
+
+def test_limit_holds_and_cancelled_waiters_give_up_their_place():
+    async def run():
+        scheduler = ResearchScheduler({"fetch": 2})
+        active, peak = [0], [0]
+
+        async def fetch():
+            async with scheduler.slot("fetch"):
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                await asyncio.sleep(0.01)
+                active[0] -= 1
+
+        tasks = [asyncio.create_task(fetch()) for _ in range(6)]
+        await asyncio.sleep(0)
+        tasks[-1].cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        stats = scheduler.get_stats()["fetch"]
+        assert peak[0] == 2
+        assert stats["in_use"] == 0 and stats["waiting"] == 0 and stats["granted"] == 5
+
+    asyncio.run(run())
+
+
+def test_scheduled_is_a_no_op_outside_a_run():
+    async def run():
+        assert current_scheduler.get() is None
+        async with scheduled("llm"):
+            return True
+
+    assert asyncio.run(run())
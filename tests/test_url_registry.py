@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from deep_research.utils.url_registry import UrlRegistry
+
+
+def test_concurrent_requests_for_a_url_share_one_scrape():
+    calls = []
+
+    async def scrape(url):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return {"url": url, "markdown": "page"}
+
+    async def run():
+        registry = UrlRegistry()
+        results = await asyncio.gather(registry.scrape("https://Example.com/a?utm_source=x", scrape),
+                                       registry.scrape("https://example.com/a", scrape))
+        late = await registry.scrape("https://example.com/a", scrape)
+        return registry, results, late
+
+    registry, results, late = asyncio.run(run())
+    assert len(calls) == 1
+    assert results[0] == results[1] == {"url": "https://Example.com/a?utm_source=x", "markdown": "page"}
+    assert late is None
+    assert registry.get_stats()["coalesced_in_flight"] == 1
+    assert registry.get_stats()["skipped_done"] == 1
+
+
+def test_a_waiter_that_gives_up_does_not_cancel_the_shared_scrape():
+    async def scrape(url):
+        await asyncio.sleep(0.05)
+        return {"url": url}
+
+    async def run():
+        registry = UrlRegistry()
+        first = asyncio.create_task(registry.scrape("https://example.com/a", scrape))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(registry.scrape("https://example.com/a", scrape))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == {"url": "https://example.com/a"}
+
+
+def test_a_failed_scrape_can_be_retried_and_replayed_urls_are_skipped():
+    attempts = []
+
+    async def scrape(url):
+        attempts.append(url)
+        if len(attempts) == 1:
+            raise RuntimeError("connection reset")
+        return {"url": url}
+
+    async def run():
+        registry = UrlRegistry()
+        with pytest.raises(RuntimeError):
+            await registry.scrape("https://example.com/a", scrape)
+        retried = await registry.scrape("https://example.com/a", scrape)
+        registry.mark_scraped(["https://example.com/b"])
+        return retried, await registry.scrape("https://example.com/b", scrape)
+
+    assert asyncio.run(run()) == ({"url": "https://example.com/a"}, None)
+    assert attempts == ["https://example.com/a", "https://example.com/a"]